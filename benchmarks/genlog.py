@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+
+import os
+import sys
+import argparse
+import datetime
+
+import numpy as np
+import pytz
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BASE_PATH))
+
+from upslogger import binlog
+from upslogger.table import LogTable
+
+START_TS = 1483228800 # 2017-01-01 UTC
+TZ_NAME = 'US/Eastern'
+CHUNK_ROWS = 1000000
+
+def get_utc_offsets(timestamps, tz_name=TZ_NAME):
+    # per-row utc offset in seconds, including the DST changes
+    tz = pytz.timezone(tz_name)
+    transitions = getattr(tz, '_utc_transition_times', None)
+    if not transitions:
+        offset = tz.utcoffset(datetime.datetime(2017, 1, 1))
+        return np.full(timestamps.size, int(offset.total_seconds()), dtype=np.int64)
+    epoch = datetime.datetime(1970, 1, 1)
+    trans_ts = np.array(
+        [(t - epoch).total_seconds() for t in transitions[1:]], dtype=np.int64,
+    )
+    offsets = np.array(
+        [info[0].total_seconds() for info in tz._transition_info[1:]], dtype=np.int64,
+    )
+    idx = np.searchsorted(trans_ts, timestamps, side='right') - 1
+    return offsets[np.clip(idx, 0, offsets.size - 1)]
+
+def generate_table(num_rows, start_ts=START_TS, interval=1, gap_ratio=.001, seed=0):
+    rs = np.random.RandomState(seed)
+    timestamps = start_ts + np.arange(num_rows, dtype=np.int64) * interval
+    linev = np.round(120. + np.cumsum(rs.normal(0., .05, num_rows)) % 10. - 5., 1)
+    linefreq = np.round(60. + rs.normal(0., .05, num_rows), 1)
+    # occasional sags and spikes
+    events = rs.randint(0, max(num_rows, 1), max(num_rows // 100000, 1))
+    linev[events] = np.round(rs.uniform(80., 140., events.size), 1)
+    # missing values, written as '-'
+    for col in [linev, linefreq]:
+        col[rs.random_sample(num_rows) < gap_ratio] = np.nan
+    return LogTable(timestamps, {'LINEV':linev, 'LINEFREQ':linefreq}, ['LINEV', 'LINEFREQ'])
+
+def format_offsets(offsets):
+    sign = np.where(offsets < 0, '-', '+')
+    minutes = np.abs(offsets) // 60
+    return np.char.add(sign, np.char.zfill((minutes // 60 * 100 + minutes % 60).astype('U4'), 4))
+
+def format_values(values):
+    s = np.char.mod('%.1f', values)
+    return np.where(np.isnan(values), '-', s)
+
+def format_lines(table, tz_name=TZ_NAME):
+    offsets = get_utc_offsets(table.timestamps, tz_name)
+    local_dt = (table.timestamps + offsets).astype('datetime64[s]')
+    dt_strs = np.char.replace(np.datetime_as_string(local_dt, unit='s'), 'T', ' ')
+    dt_strs = np.char.add(np.char.add(dt_strs, ' '), format_offsets(offsets))
+    cols = [dt_strs] + [format_values(table[name]) for name in table.fields]
+    lines = cols[0]
+    for col in cols[1:]:
+        lines = np.char.add(np.char.add(lines, '\t'), col)
+    return lines
+
+def write_log(filename, num_rows, log_format='tsv', tz_name=TZ_NAME, chunk_rows=CHUNK_ROWS, **kwargs):
+    if os.path.exists(filename):
+        os.remove(filename)
+    fields = ['DATE', 'LINEV', 'LINEFREQ']
+    start_ts = kwargs.pop('start_ts', START_TS)
+    interval = kwargs.get('interval', 1)
+    with open(filename, 'wb') as f:
+        if log_format == 'tsv':
+            f.write('#fields:\t{}\n'.format('\t'.join(fields)).encode('UTF-8'))
+    for i0 in range(0, num_rows, chunk_rows):
+        n = min(chunk_rows, num_rows - i0)
+        table = generate_table(n, start_ts + i0 * interval, seed=i0, **kwargs)
+        if log_format == 'binary':
+            binlog.append_table(filename, table, fields)
+            continue
+        lines = format_lines(table, tz_name)
+        with open(filename, 'ab') as f:
+            f.write('\n'.join(lines.tolist()).encode('UTF-8'))
+            f.write(b'\n')
+    return filename
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Generate a synthetic apclinev log')
+    p.add_argument('filename')
+    p.add_argument('-n', '--rows', dest='rows', type=int, default=1000000)
+    p.add_argument('--log-format', dest='log_format', choices=['tsv', 'binary'], default='tsv')
+    p.add_argument('--interval', dest='interval', type=int, default=1)
+    p.add_argument('--gap-ratio', dest='gap_ratio', type=float, default=.001,
+                   help='Fraction of missing ("-") values')
+    p.add_argument('--timezone', dest='tz_name', default=TZ_NAME)
+    args = p.parse_args()
+    write_log(
+        args.filename, args.rows, args.log_format, args.tz_name,
+        interval=args.interval, gap_ratio=args.gap_ratio,
+    )
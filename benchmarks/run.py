@@ -0,0 +1,245 @@
+#! /usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import resource
+import subprocess
+import multiprocessing
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+ROOT_PATH = os.path.dirname(BASE_PATH)
+sys.path.insert(0, ROOT_PATH)
+sys.path.insert(0, os.path.join(ROOT_PATH, 'tests'))
+
+import numpy as np
+
+import genlog
+
+DEFAULT_ROWS = [1000000]
+# benchmarks building one dict per row are skipped above this size
+DEFAULT_MAX_ROW_DICTS = 2000000
+NUM_APPENDS = 2000
+NUM_POLLS = 500
+
+BENCHMARKS = {}
+
+def benchmark(name, appends=False, row_dicts=False):
+    # appends: the benchmark writes to the log, row_dicts: builds one dict
+    # per row (and is skipped for very large logs)
+    def decorator(f):
+        BENCHMARKS[name] = {'func':f, 'appends':appends, 'row_dicts':row_dicts}
+        return f
+    return decorator
+
+@benchmark('parse_logfile', row_dicts=True)
+def bench_parse_logfile(filename, num_rows):
+    from upslogger.logger import parse_logfile
+    return len(parse_logfile(filename))
+
+@benchmark('parse_logfile_table')
+def bench_parse_logfile_table(filename, num_rows):
+    from upslogger.logger import parse_logfile_table
+    return len(parse_logfile_table(filename))
+
+@benchmark('parse_logfile_parallel')
+def bench_parse_logfile_parallel(filename, num_rows):
+    from upslogger.parallel import parse_logfile_parallel
+    return len(parse_logfile_parallel(filename))
+
+@benchmark('prepare_js_data', row_dicts=True)
+def bench_prepare_js_data(filename, num_rows):
+    from upslogger.apcdata import prepare_js_data
+    js_data = prepare_js_data(filename)
+    return len(js_data['LINEV']['values'])
+
+@benchmark('prepare_js_data_columnar')
+def bench_prepare_js_data_columnar(filename, num_rows):
+    from upslogger.apcdata import prepare_js_data
+    js_data = prepare_js_data(filename, layout='columnar')
+    return len(js_data['LINEV']['values'])
+
+@benchmark('get_graph_objs')
+def bench_get_graph_objs(filename, num_rows):
+    from upslogger.plotlyutils import get_graph_objs, MAX_POINTS
+    get_graph_objs(filename, max_points=MAX_POINTS)
+    return num_rows
+
+@benchmark('log_linev', appends=True)
+def bench_log_linev(filename, num_rows):
+    # one open/append/close per sample onto the end of the large log
+    from upslogger.logger import iter_logfile, log_linev
+    rows = []
+    for d in iter_logfile(filename):
+        rows.append(d)
+        if len(rows) >= NUM_APPENDS:
+            break
+    for d in rows:
+        log_linev(d, filename)
+    return len(rows)
+
+@benchmark('log_writer', appends=True)
+def bench_log_writer(filename, num_rows):
+    from upslogger.logger import iter_logfile, LogWriter
+    rows = []
+    for d in iter_logfile(filename):
+        rows.append(d)
+        if len(rows) >= NUM_APPENDS:
+            break
+    with LogWriter(filename, flush_rows=100) as writer:
+        for d in rows:
+            writer.write(d)
+    return len(rows)
+
+@benchmark('nis_poll')
+def bench_nis_poll(filename, num_rows):
+    from conftest import ApcAccessGenerator
+    from upslogger.nis import NISClient
+    gen = ApcAccessGenerator()
+    try:
+        with NISClient(gen.hostname, gen.hostport) as client:
+            for i in range(NUM_POLLS):
+                client.get_status()
+    finally:
+        gen.stop()
+    return NUM_POLLS
+
+def _run_child(name, filename, num_rows, q):
+    start_ts = time.time()
+    count = BENCHMARKS[name]['func'](filename, num_rows)
+    duration = time.time() - start_ts
+    # kB on linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024
+    q.put({'seconds':duration, 'count':count, 'peak_rss_kb':peak_rss})
+
+def run_benchmark(name, filename, num_rows):
+    # each benchmark gets a fresh process so peak RSS isn't shared
+    q = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_run_child, args=(name, filename, num_rows, q))
+    p.start()
+    p.join()
+    if p.exitcode != 0:
+        return {'name':name, 'rows':num_rows, 'error':'exit code {}'.format(p.exitcode)}
+    r = q.get()
+    result = {
+        'name':name,
+        'rows':num_rows,
+        'count':r['count'],
+        'seconds':r['seconds'],
+        'peak_rss_mb':r['peak_rss_kb'] / 1024.,
+    }
+    if r['seconds'] > 0:
+        result['per_second'] = r['count'] / r['seconds']
+    return result
+
+def get_environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT_PATH, stderr=subprocess.DEVNULL,
+        ).decode('UTF-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python':platform.python_version(),
+        'numpy':np.__version__,
+        'platform':platform.platform(),
+        'commit':commit,
+        'time':int(time.time()),
+    }
+
+def compare_results(results, baseline, threshold):
+    # (name, rows, old, new) for every benchmark that got slower by more
+    # than `threshold` (as a fraction)
+    def get_key(r):
+        return (r['name'], r['rows'], r.get('log_format'))
+    old_results = {get_key(r):r for r in baseline['results'] if 'seconds' in r}
+    regressions = []
+    for r in results:
+        old = old_results.get(get_key(r))
+        if old is None or 'seconds' not in r:
+            continue
+        if r['seconds'] > old['seconds'] * (1 + threshold):
+            regressions.append((r['name'], r['rows'], old['seconds'], r['seconds']))
+    return regressions
+
+def format_result(r):
+    if 'error' in r:
+        return '{name:<26} {rows:>11,}  ERROR: {error}'.format(**r)
+    return '{name:<26} {rows:>11,}  {seconds:9.3f}s  {rate:>14}/s  {peak_rss_mb:8.1f} MB'.format(
+        rate='{:,.0f}'.format(r.get('per_second', 0)), **r
+    )
+
+def main(args):
+    names = args.benchmarks or sorted(BENCHMARKS.keys())
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError('Unknown benchmark: {}'.format(name))
+    tmp_dir = tempfile.mkdtemp(prefix='upslogger-bench-', dir=args.tmp_dir)
+    results = []
+    try:
+        for num_rows in args.rows:
+            for log_format in args.log_formats:
+                ext = '.bin' if log_format == 'binary' else '.log'
+                src_fn = os.path.join(tmp_dir, 'apclinev-{}{}'.format(num_rows, ext))
+                start_ts = time.time()
+                genlog.write_log(src_fn, num_rows, log_format, gap_ratio=args.gap_ratio)
+                print('generated {:,} {} rows in {:.1f}s'.format(
+                    num_rows, log_format, time.time() - start_ts,
+                ))
+                for name in names:
+                    bench = BENCHMARKS[name]
+                    if bench['row_dicts'] and num_rows > args.max_row_dicts:
+                        continue
+                    # appends modify the log, so those run on a copy
+                    fn = src_fn
+                    if bench['appends']:
+                        fn = os.path.join(tmp_dir, 'copy{}'.format(ext))
+                        shutil.copyfile(src_fn, fn)
+                    r = run_benchmark(name, fn, num_rows)
+                    r['log_format'] = log_format
+                    results.append(r)
+                    print(format_result(r))
+                    if fn != src_fn:
+                        os.remove(fn)
+                os.remove(src_fn)
+    finally:
+        shutil.rmtree(tmp_dir)
+    data = {'environment':get_environment(), 'results':results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(data, indent=2))
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.loads(f.read())
+        regressions = compare_results(results, baseline, args.threshold)
+        for name, num_rows, old, new in regressions:
+            print('REGRESSION {} ({:,} rows): {:.3f}s -> {:.3f}s'.format(name, num_rows, old, new))
+        if len(regressions):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Time upslogger against synthetic logs')
+    p.add_argument('benchmarks', nargs='*', help='Benchmarks to run (default: all)')
+    p.add_argument('-n', '--rows', dest='rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                   help='Log sizes to test, e.g. "-n 1000000 10000000 100000000"')
+    p.add_argument('--log-format', dest='log_formats', nargs='+', default=['tsv'],
+                   choices=['tsv', 'binary'])
+    p.add_argument('--gap-ratio', dest='gap_ratio', type=float, default=.001)
+    p.add_argument('--max-row-dicts', dest='max_row_dicts', type=int,
+                   default=DEFAULT_MAX_ROW_DICTS,
+                   help='Skip the per-row dict benchmarks above this many rows')
+    p.add_argument('--tmp-dir', dest='tmp_dir')
+    p.add_argument('-o', '--output', dest='output', help='Write results as JSON')
+    p.add_argument('--compare', dest='compare', help='Baseline JSON results to compare against')
+    p.add_argument('--threshold', dest='threshold', type=float, default=.2,
+                   help='Allowed slowdown before a benchmark counts as a regression')
+    args = p.parse_args()
+    sys.exit(main(args))
@@ -35,6 +35,7 @@ setup(
     license='GPLv3',
     packages=find_packages(exclude=['tests*']),
     install_requires=[
+        'numpy',
         'pytz',
         'tzlocal',
         'plotly',
@@ -59,5 +60,6 @@ setup(
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.4',
         'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.7',
     ],
 )
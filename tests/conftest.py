@@ -3,6 +3,7 @@ import sys
 import datetime
 import json
 import socket
+import struct
 import threading
 try:
     import socketserver
@@ -15,6 +16,11 @@ import pytest
 
 PY3 = sys.version_info.major >= 3
 
+collect_ignore = []
+if sys.version_info < (3, 7):
+    # upslogger.poller uses asyncio.run and async/await
+    collect_ignore.append('test_poller.py')
+
 BASE_PATH = os.path.dirname(os.path.abspath(__file__))
 DATA_PATH = os.path.join(BASE_PATH, 'data')
 
@@ -49,18 +55,37 @@ def existing_logfile():
 
 class NISHandler(socketserver.BaseRequestHandler):
     def handle(self):
-        data = self.request.recv(1024)
-        if b'\x00\x06status' in data:
-            self.send_status_response()
+        while True:
+            cmd = self.recv_frame()
+            if cmd is None:
+                break
+            if cmd == b'status':
+                self.send_status_response()
+    def recv_exact(self, num_bytes):
+        data = b''
+        while len(data) < num_bytes:
+            chunk = self.request.recv(num_bytes - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+    def recv_frame(self):
+        header = self.recv_exact(2)
+        if header is None:
+            return None
+        frame_len = struct.unpack('>H', header)[0]
+        return self.recv_exact(frame_len)
     def send_status_response(self):
+        self.server.num_requests += 1
         resp = self.server.apcaccess_generator.build_status_response()
-        if PY3:
-            resp = bytes(resp, 'UTF-8')
         self.request.sendall(resp)
 
 class NISServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    block_on_close = False
     def __init__(self, apcaccess_generator):
         self.apcaccess_generator = apcaccess_generator
+        self.num_requests = 0
         server_address = (apcaccess_generator.hostname, 0)
         socketserver.TCPServer.__init__(self, server_address, NISHandler)
 
@@ -112,19 +137,12 @@ class ApcAccessGenerator(object):
         for data_line in self.tmpl_data:
             line = data_line['value'].format(**d)
             line = ': '.join([data_line['field'], line])
-
-            # len + newline
-            line_len = len(line) + 1
-            line = ''.join(['\x00', chr(line_len), line])
+            line = '{}\n'.format(line).encode('UTF-8')
+            outlines.append(struct.pack('>H', len(line)))
             outlines.append(line)
-        response = '\n'.join(outlines)
-        return response
-    def send_status_request(self):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((self.hostname, self.hostport))
-        sock.sendall(b'\x00\x06status')
-        resp = sock.recv(1024)
-        return response
+        # zero-length record marks the end of the response
+        outlines.append(b'\x00\x00')
+        return b''.join(outlines)
 
 
 @pytest.fixture
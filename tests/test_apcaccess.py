@@ -25,3 +25,36 @@ def test_linev(tz_override, apcaccess_gen, apcaccess_available):
 
         apcaccess_gen.LINEV += .1
         apcaccess_gen.DATE += datetime.timedelta(minutes=1)
+
+def test_nis_client(tz_override, apcaccess_gen):
+    from upslogger.nis import NISClient, NISConnectionError
+
+    client = NISClient(apcaccess_gen.hostname, apcaccess_gen.hostport)
+    gen_data = apcaccess_gen.get_template_dict()
+    for i in range(5):
+        data = client.get_status()
+        # full response, not truncated at 1024 bytes
+        assert 'STATFLAG' in data
+        for key in gen_data:
+            assert data[key].value == gen_data[key]
+    # one connection reused for every poll
+    assert client.connected
+    assert apcaccess_gen.server.num_requests == 5
+
+    # reconnects after the connection is dropped
+    client.sock.close()
+    data = client.get_status()
+    assert data['LINEV'].value == gen_data['LINEV']
+    client.close()
+
+    apcaccess_gen.stop()
+    client = NISClient(apcaccess_gen.hostname, apcaccess_gen.hostport, min_backoff=10.)
+    for i in range(2):
+        try:
+            client.get_status()
+        except NISConnectionError:
+            pass
+        else:
+            raise AssertionError('NISConnectionError not raised')
+    assert client.backoff == 10.
+    assert client.next_connect_ts is not None
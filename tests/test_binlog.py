@@ -0,0 +1,53 @@
+import numpy as np
+
+def test_binlog(tz_override, existing_logfile, tmpdir):
+    from upslogger import logger, binlog
+
+    parsed = logger.parse_logfile(str(existing_logfile))
+    fn = str(tmpdir.join('apclinev.bin'))
+    for d in parsed:
+        logger.log_linev(d, fn)
+    assert binlog.is_binlog(fn)
+    assert logger.get_log_format(fn) == 'binary'
+
+    src_table = logger.parse_logfile_table(str(existing_logfile))
+    table = logger.parse_logfile_table(fn)
+    assert not table['LINEV'].flags.owndata
+    assert not table.timestamps.flags.owndata
+    assert table.timestamps.tolist() == src_table.timestamps.tolist()
+    for name in ['LINEV', 'LINEFREQ']:
+        assert np.allclose(table[name], src_table[name])
+
+    rows = logger.parse_logfile(fn)
+    assert len(rows) == len(parsed)
+    for d1, d2 in zip(parsed, rows):
+        assert d1['DATE'].value == d2['DATE'].value
+        assert round(d1['LINEV'].value, 1) == round(d2['LINEV'].value, 1)
+
+    ts = src_table.timestamps
+    table = logger.parse_logfile_table(fn, start=ts[10], end=ts[20])
+    assert table.timestamps.tolist() == ts[10:21].tolist()
+
+    # torn record is dropped on the next append
+    with open(fn, 'ab') as f:
+        f.write(b'\x00\x01\x02')
+    logger.log_linev(parsed[-1], fn)
+    table = logger.parse_logfile_table(fn)
+    assert len(table) == len(parsed) + 1
+    assert table.timestamps[-1] == table.timestamps[-2]
+
+def test_convert(tz_override, existing_logfile, tmpdir):
+    from upslogger import logger
+
+    bin_fn = str(tmpdir.join('converted.bin'))
+    tsv_fn = str(tmpdir.join('converted.log'))
+    logger.convert_logfile(str(existing_logfile), bin_fn)
+    assert logger.get_log_format(bin_fn) == 'binary'
+    logger.convert_logfile(bin_fn, tsv_fn)
+    assert logger.get_log_format(tsv_fn) == 'tsv'
+
+    with open(str(existing_logfile), 'r') as f:
+        src_lines = f.read().splitlines()
+    with open(tsv_fn, 'r') as f:
+        dst_lines = f.read().splitlines()
+    assert src_lines == dst_lines
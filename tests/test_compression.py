@@ -0,0 +1,120 @@
+import os
+import gzip
+import json
+import shutil
+import datetime
+
+import numpy as np
+import pytest
+
+@pytest.mark.parametrize('compression', ['gzip', 'xz'])
+def test_compress_file(tz_override, existing_logfile, tmpdir, monkeypatch, compression):
+    from upslogger import logger
+    from upslogger import compression as comp
+    from upslogger.logindex import LogIndex
+
+    fn = str(tmpdir.join('apclinev.log'))
+    shutil.copyfile(str(existing_logfile), fn)
+    with open(fn, 'rb') as f:
+        src_data = f.read()
+    src_table = logger.parse_logfile_table(fn)
+    src_rows = logger.parse_logfile(fn)
+
+    dst_fn = comp.compress_file(fn, compression, block_size=512)
+    assert dst_fn == fn + comp.COMPRESSION_EXTS[compression]
+    assert not os.path.exists(fn)
+    with comp.open_file(dst_fn) as f:
+        assert f.read() == src_data
+    if compression == 'gzip':
+        with gzip.open(dst_fn, 'rb') as f:
+            assert f.read() == src_data
+
+    entries = LogIndex(dst_fn).get_entries()
+    assert len(entries) > 4
+    assert entries[0][1] == 0
+
+    table = logger.parse_logfile_table(dst_fn)
+    assert table.timestamps.tolist() == src_table.timestamps.tolist()
+    for name in table.fields:
+        assert np.array_equal(table[name], src_table[name], equal_nan=True)
+    rows = logger.parse_logfile(dst_fn)
+    assert [d['DATE'].value for d in rows] == [d['DATE'].value for d in src_rows]
+
+    # range reads start decompressing at the block holding `start`
+    offsets = []
+    orig_open = comp.open_file
+    def open_file(filename, offset=0):
+        offsets.append(offset)
+        return orig_open(filename, offset)
+    monkeypatch.setattr(comp, 'open_file', open_file)
+    ts = src_table.timestamps
+    table = logger.parse_logfile_table(dst_fn, ts[80], ts[90])
+    assert table.timestamps.tolist() == ts[80:91].tolist()
+    assert offsets[-1] > 0
+    assert offsets[-1] in [offset for entry_ts, offset in entries]
+
+def test_background_compress(tz_override, tmpdir):
+    from test_segments import build_rows
+    from upslogger import logger
+    from upslogger.segments import SegmentedLog
+
+    dirname = str(tmpdir.join('segments'))
+    rows = build_rows(
+        tz_override['local'], datetime.datetime(2017, 8, 3, 12, 0, 0),
+        72, datetime.timedelta(hours=1),
+    )
+    seg_log = SegmentedLog(dirname, 'daily', compress=True, compression='xz', background=True)
+    for d in rows:
+        seg_log.write(d)
+    seg_log.close()
+    assert seg_log.compressor.num_compressed == 3
+
+    filenames = sorted(os.listdir(dirname))
+    segments = [fn for fn in filenames if fn.endswith('.xz')]
+    assert segments == [
+        'apclinev-20170803.log.xz', 'apclinev-20170804.log.xz', 'apclinev-20170805.log.xz',
+    ]
+    assert 'apclinev-20170803.log' not in filenames
+    with open(os.path.join(dirname, 'manifest.json'), 'r') as f:
+        manifest = json.loads(f.read())
+    assert set(manifest['segments'].keys()) == set(segments)
+
+    table = logger.parse_logfile_table(dirname)
+    assert len(table) == len(rows)
+
+    # a segment left uncompressed (e.g. by a shutdown) is picked up on the next rotate
+    src_fn = os.path.join(dirname, 'apclinev-20170803.log')
+    with open(src_fn, 'w') as f:
+        f.write('#fields:\tDATE\tLINEV\tLINEFREQ\n')
+    os.remove(os.path.join(dirname, segments[0]))
+    seg_log = SegmentedLog(dirname, compress=True, compression='xz', background=True)
+    seg_log.manifest['segments'].pop(segments[0])
+    seg_log.manifest['segments']['apclinev-20170803.log'] = {'rows':0, 'first':None, 'last':None}
+    seg_log.rotate()
+    seg_log.close()
+    assert os.path.exists(os.path.join(dirname, segments[0]))
+    assert not os.path.exists(src_fn)
+    assert segments[0] in seg_log.manifest['segments']
+
+def test_compress_while_reading(tz_override, tmpdir):
+    from test_segments import build_rows
+    from upslogger import compression as comp
+    from upslogger.segments import SegmentedLog
+
+    dirname = str(tmpdir.join('segments'))
+    rows = build_rows(
+        tz_override['local'], datetime.datetime(2017, 8, 3, 12, 0, 0),
+        72, datetime.timedelta(hours=1),
+    )
+    seg_log = SegmentedLog(dirname, 'daily')
+    for d in rows:
+        seg_log.write(d)
+    seg_log.close()
+
+    # a segment compressed (and removed) after the reader listed the
+    # directory is read from the compressed file
+    tables = SegmentedLog(dirname).iter_tables(chunk_rows=8)
+    num_rows = len(next(tables))
+    comp.compress_file(os.path.join(dirname, 'apclinev-20170804.log'))
+    num_rows += sum(len(t) for t in tables)
+    assert num_rows == len(rows)
@@ -0,0 +1,118 @@
+import os
+
+def test_shared_cache(tz_override, existing_logfile, tmpdir, monkeypatch):
+    from upslogger import logger
+    from upslogger import datacache
+
+    monkeypatch.setattr(datacache, 'CACHE_INITIAL_ROWS', 8)
+    monkeypatch.setattr(datacache, '_CACHES', {})
+
+    parsed = logger.parse_logfile(str(existing_logfile))
+    expected = logger.parse_logfile_table(str(existing_logfile))
+    log_fn = str(tmpdir.join('apclinev.log'))
+
+    with logger.LogWriter(log_fn) as writer:
+        for d in parsed[:10]:
+            writer.write(d)
+
+    cache = datacache.get_shared_cache(log_fn, refresh_interval=None)
+    assert datacache.get_shared_cache(log_fn, refresh_interval=None) is cache
+    assert cache.num_rows == 10
+    assert cache.first_ts == expected.timestamps[0]
+
+    # two sessions with their own cursors
+    cursor_a = cursor_b = (cache.generation, 0)
+    cursor_a, table = cache.get_since(cursor_a)
+    assert len(table) == 10
+
+    with logger.LogWriter(log_fn) as writer:
+        for d in parsed[10:]:
+            writer.write(d)
+    assert cache.refresh() == len(parsed) - 10
+    assert cache.num_rows == len(parsed)
+
+    cursor_a, delta = cache.get_since(cursor_a)
+    assert delta.timestamps.tolist() == expected.timestamps[10:].tolist()
+    cursor_b, table = cache.get_since(cursor_b)
+    assert len(table) == len(parsed)
+    for name in expected.fields:
+        assert table[name].tolist() == expected[name].tolist()
+    assert not len(cache.get_since(cursor_a)[1])
+
+    window = cache.get_table(expected.timestamps[20], expected.timestamps[29])
+    assert len(window) == 10
+
+    # a replaced log file invalidates every cursor
+    os.remove(log_fn)
+    with logger.LogWriter(log_fn) as writer:
+        for d in parsed[:5]:
+            writer.write(d)
+    cache.refresh()
+    assert cache.num_rows == 5
+    cursor_a, table = cache.get_since(cursor_a)
+    assert table is None
+    cursor_a, table = cache.get_since(cursor_a)
+    assert not len(table)
+
+def test_shared_cache_thread(tz_override, existing_logfile, tmpdir, monkeypatch):
+    import time
+    from upslogger import logger
+    from upslogger import datacache
+
+    monkeypatch.setattr(datacache, '_CACHES', {})
+    parsed = logger.parse_logfile(str(existing_logfile))
+    log_fn = str(tmpdir.join('apclinev.log'))
+    with logger.LogWriter(log_fn) as writer:
+        writer.write(parsed[0])
+
+    cache = datacache.get_shared_cache(log_fn, refresh_interval=.05)
+    try:
+        assert cache.running
+        with logger.LogWriter(log_fn) as writer:
+            writer.write(parsed[1])
+        end_ts = time.time() + 5
+        while cache.num_rows < 2 and time.time() < end_ts:
+            time.sleep(.01)
+        assert cache.num_rows == 2
+    finally:
+        cache.stop()
+    assert not cache.running
+
+def test_shared_cache_thread_error(tz_override, existing_logfile, tmpdir, monkeypatch):
+    import time
+    from upslogger import logger
+    from upslogger import datacache
+
+    parsed = logger.parse_logfile(str(existing_logfile))
+    log_fn = str(tmpdir.join('apclinev.log'))
+    with logger.LogWriter(log_fn) as writer:
+        writer.write(parsed[0])
+
+    errors = []
+    cache = datacache.SharedDataCache(log_fn, on_error=errors.append)
+    calls = []
+    def listener():
+        calls.append(cache.num_rows)
+        if len(calls) == 1:
+            raise RuntimeError('listener failed')
+    cache.add_listener(listener)
+
+    def wait_for(cond):
+        end_ts = time.time() + 5
+        while not cond() and time.time() < end_ts:
+            time.sleep(.01)
+        assert cond()
+
+    cache.start(interval=.05)
+    try:
+        wait_for(lambda: len(errors))
+        # the thread keeps refreshing after a failure
+        with logger.LogWriter(log_fn) as writer:
+            writer.write(parsed[1])
+        wait_for(lambda: len(calls) > 1)
+        assert cache.running
+        assert cache.num_rows == 2
+        assert cache.num_failed == 1
+        assert isinstance(cache.last_error, RuntimeError)
+    finally:
+        cache.stop()
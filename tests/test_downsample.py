@@ -0,0 +1,59 @@
+import numpy as np
+
+def build_table(n=100000):
+    from upslogger.table import LogTable
+
+    ts = np.arange(n, dtype=np.int64) + 1500000000
+    rs = np.random.RandomState(1)
+    linev = 120. + rs.normal(0., 1., n)
+    linev[::97] = np.nan
+    freq = 60. + rs.normal(0., .1, n)
+    # spikes that must survive downsampling
+    linev[n // 4] = 200.
+    freq[n // 2] = 40.
+    return LogTable(ts, {'LINEV':linev, 'LINEFREQ':freq}, ['LINEV', 'LINEFREQ'])
+
+def test_minmax(tz_override):
+    from upslogger.downsample import downsample_table
+
+    table = build_table()
+    result = downsample_table(table, 1000)
+    assert len(result) <= 2 * 1000 + 4
+    assert np.all(np.diff(result.timestamps) > 0)
+    for name in table.fields:
+        assert np.nanmax(result[name]) == np.nanmax(table[name])
+        assert np.nanmin(result[name]) == np.nanmin(table[name])
+    assert result.timestamps[0] == table.timestamps[0]
+    assert result.timestamps[-1] == table.timestamps[-1]
+
+    # only the visible window
+    start, end = table.timestamps[20000], table.timestamps[30000]
+    assert table['LINEV'][25000] == 200.
+    result = downsample_table(table, 500, start=start, end=end)
+    assert result.timestamps[0] >= start
+    assert result.timestamps[-1] <= end
+    assert len(result) <= 2 * 500 + 4
+    assert 200. in result['LINEV'].tolist()
+
+    small = table.take(slice(0, 100))
+    assert len(downsample_table(small, 1000)) == 100
+
+def test_lttb(tz_override):
+    from upslogger.downsample import lttb_indices, downsample_table
+
+    table = build_table(10000)
+    x = table.timestamps
+    y = table['LINEFREQ']
+    idx = lttb_indices(x, y, 500)
+    assert idx.size == 500
+    assert idx[0] == 0 and idx[-1] == x.size - 1
+    assert np.all(np.diff(idx) > 0)
+    assert 40. in y[idx].tolist()
+
+    y = table['LINEV']
+    idx = lttb_indices(x, y, 500)
+    assert not np.isnan(y[idx]).any()
+
+    result = downsample_table(table, 500, method='lttb')
+    assert len(result) <= 1000
+    assert 200. in result['LINEV'].tolist()
@@ -0,0 +1,69 @@
+import threading
+
+def test_export_coalesce():
+    from upslogger.exporter import ExportPool, QUEUED, COALESCED
+
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def export(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+
+    pool = ExportPool(max_workers=2)
+    pool.register('plotly', export)
+    pool.start()
+
+    assert pool.submit('plotly', 0) == QUEUED
+    assert started.wait(5)
+    # requests made while the first run is busy merge into one follow-up run
+    assert pool.submit('plotly', 1) == QUEUED
+    assert pool.submit('plotly', 2) == COALESCED
+    assert pool.submit('plotly', 3) == COALESCED
+    release.set()
+    assert pool.wait(5)
+    pool.stop()
+
+    assert calls == [0, 3]
+    stats = pool.get_stats()['plotly']
+    assert stats['submitted'] == 4
+    assert stats['runs'] == 2
+    assert stats['coalesced'] == 2
+
+def test_export_errors_and_backpressure():
+    from upslogger.exporter import ExportPool, QUEUED, DROPPED
+
+    errors = []
+    dropped = []
+
+    def fail():
+        raise ValueError('upload failed')
+
+    pool = ExportPool(
+        max_workers=1, max_queued=1,
+        on_error=lambda task, e: errors.append((task.kind, e)),
+        on_backpressure=lambda task: dropped.append(task.kind),
+    )
+    pool.register('epochjs', fail)
+    pool.register('plotly', lambda: None)
+
+    # workers not started yet, so the queue fills up
+    assert pool.submit('epochjs') == QUEUED
+    assert pool.submit('plotly') == DROPPED
+    assert dropped == ['plotly']
+
+    pool.start()
+    assert pool.wait(5)
+    assert pool.submit('plotly') == QUEUED
+    assert pool.wait(5)
+    pool.stop()
+
+    assert len(errors) == 1
+    assert errors[0][0] == 'epochjs'
+    stats = pool.get_stats()
+    assert stats['epochjs']['failed'] == 1
+    assert 'upload failed' in stats['epochjs']['last_error']
+    assert stats['plotly']['dropped'] == 1
+    assert stats['plotly']['runs'] == 1
@@ -0,0 +1,65 @@
+
+def test_field_registry():
+    from upslogger.fields import (
+        Field, DateFieldBase, LineV, LineFreq, FieldRegistry, register_field,
+    )
+
+    registry = FieldRegistry()
+    assert registry.get('LINEV') is LineV
+    assert registry.get('LINEFREQ') is LineFreq
+    assert registry.get('STARTTIME') is DateFieldBase
+    assert registry.get('UPSNAME') is Field
+    assert registry.get('UPSNAME', None) is None
+
+    class BattV(Field):
+        name = 'BATTV'
+        @classmethod
+        def parse_string(cls, s):
+            return float(s.lower().strip('volts'))
+
+    register_field(BattV)
+    try:
+        field = Field.from_string('13.5 Volts', 'BATTV')
+        assert isinstance(field, BattV)
+        assert field.value == 13.5
+    finally:
+        from upslogger.fields import FIELD_REGISTRY
+        FIELD_REGISTRY._registered.pop('BATTV')
+        FIELD_REGISTRY.clear_cache()
+
+def test_field_registry_late_subclass():
+    from upslogger.fields import Field, FIELD_REGISTRY
+
+    assert FIELD_REGISTRY.get('LATEFIELD') is Field
+    assert type(Field.from_string('1.5', 'LATEFIELD')) is Field
+
+    # defined after a lookup already missed
+    class LateField(Field):
+        name = 'LATEFIELD'
+        @classmethod
+        def parse_string(cls, s):
+            return float(s)
+
+    assert FIELD_REGISTRY.get('LATEFIELD') is LateField
+    field = Field.from_string('1.5', 'LATEFIELD')
+    assert isinstance(field, LateField)
+    assert field.value == 1.5
+    decoder = FIELD_REGISTRY.get_row_decoder(['LATEFIELD'])
+    assert isinstance(decoder.decode(['2'])['LATEFIELD'], LateField)
+
+def test_row_decoder(tz_override):
+    from upslogger.fields import FIELD_REGISTRY, Field
+
+    fields = ['DATE', 'LINEV', 'LINEFREQ', 'UPSNAME']
+    decoder = FIELD_REGISTRY.get_row_decoder(fields)
+    assert FIELD_REGISTRY.get_row_decoder(list(fields)) is decoder
+
+    vals = ['2017-08-03 14:10:00 -0500', '110.0 Volts', '-']
+    d = decoder.decode(vals)
+    for name, val in zip(fields, vals + ['-']):
+        expected = Field.from_string(val, name)
+        assert type(d[name]) is type(expected)
+        assert d[name].name == name
+        assert d[name].value == expected.value
+    assert d['LINEFREQ'].value is None
+    assert d['UPSNAME'].value is None
@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+
+BENCHMARKS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+
+def test_genlog(tz_override, tmpdir, monkeypatch):
+    monkeypatch.syspath_prepend(BENCHMARKS_PATH)
+    import genlog
+    from upslogger import logger
+
+    # spans the 2017 DST change in US/Eastern
+    start_ts = 1489302000 - 3600
+    fn = str(tmpdir.join('gen.log'))
+    genlog.write_log(fn, 5000, start_ts=start_ts, interval=2, gap_ratio=.05, chunk_rows=1500)
+    with open(fn, 'r') as f:
+        lines = f.read().splitlines()
+    assert lines[0] == '#fields:\tDATE\tLINEV\tLINEFREQ'
+    assert lines[1].startswith('2017-03-12 01:00:00 -0500')
+    assert lines[-1].split('\t')[0].endswith('-0400')
+    assert any('\t-' in line for line in lines)
+
+    table = logger.parse_logfile_table(fn)
+    expected = genlog.generate_table(1500, start_ts, interval=2, gap_ratio=.05)
+    assert len(table) == 5000
+    assert np.all(np.diff(table.timestamps) == 2)
+    assert table.timestamps[0] == start_ts
+    for name in ['LINEV', 'LINEFREQ']:
+        col = table[name][:1500]
+        assert np.array_equal(np.isnan(col), np.isnan(expected[name]))
+        assert np.allclose(col[~np.isnan(col)], expected[name][~np.isnan(col)])
+
+    bin_fn = str(tmpdir.join('gen.bin'))
+    genlog.write_log(bin_fn, 5000, 'binary', start_ts=start_ts, interval=2, gap_ratio=.05,
+                     chunk_rows=1500)
+    bin_table = logger.parse_logfile_table(bin_fn)
+    assert bin_table.timestamps.tolist() == table.timestamps.tolist()
@@ -0,0 +1,91 @@
+import os
+import json
+
+import pytest
+
+def read_json(dirname, key):
+    from upslogger.jsexport import LocalTarget
+    return json.loads(LocalTarget(dirname).get(key).decode('UTF-8'))
+
+def test_chunked_export(tz_override, existing_logfile, tmpdir):
+    from upslogger import logger
+    from upslogger.apcdata import prepare_js_data
+    from upslogger.jsexport import ChunkedExporter, LocalTarget
+
+    parsed = logger.parse_logfile(str(existing_logfile))
+    log_fn = str(tmpdir.join('apclinev.log'))
+    out_dir = str(tmpdir.join('epochjs'))
+    t0 = parsed[0]['DATE'].timestamp
+    assert t0 % 30 == 0
+
+    with logger.LogWriter(log_fn) as writer:
+        for d in parsed[:45]:
+            writer.write(d)
+
+    exporter = ChunkedExporter(LocalTarget(out_dir), log_fn, chunk_seconds=30)
+    assert exporter.export()
+    # one complete chunk, the head and the manifest
+    assert exporter.num_uploads == 3
+    manifest = read_json(out_dir, 'manifest.json')
+    assert [c['start'] for c in manifest['chunks']] == [t0]
+    assert manifest['chunks'][0]['rows'] == 30
+    assert manifest['head']['start'] == t0 + 30
+    assert manifest['head']['rows'] == 15
+
+    first_chunk = os.path.join(out_dir, 'chunks', '{}.json.gz'.format(t0))
+    first_mtime = os.stat(first_chunk).st_mtime_ns
+
+    # nothing new, nothing uploaded
+    assert not exporter.export()
+    assert exporter.num_uploads == 3
+
+    with logger.LogWriter(log_fn) as writer:
+        for d in parsed[45:]:
+            writer.write(d)
+
+    assert exporter.export()
+    # two newly completed chunks, the head and the manifest
+    assert exporter.num_uploads == 7
+    assert os.stat(first_chunk).st_mtime_ns == first_mtime
+
+    manifest = read_json(out_dir, 'manifest.json')
+    assert [c['start'] for c in manifest['chunks']] == [t0, t0 + 30, t0 + 60]
+    assert manifest['head']['rows'] == 11
+    assert sum(c['rows'] for c in manifest['chunks']) + manifest['head']['rows'] == len(parsed)
+
+    for entry in manifest['chunks'] + [manifest['head']]:
+        expected = prepare_js_data(log_fn, entry['start'], entry['end'] - 1)
+        assert read_json(out_dir, entry['key']) == list(expected.values())
+
+    # state is picked up from the target's manifest
+    exporter = ChunkedExporter(LocalTarget(out_dir), log_fn, chunk_seconds=30)
+    assert not exporter.export()
+    assert exporter.num_uploads == 0
+
+def test_chunked_export_retry(tz_override, existing_logfile, tmpdir):
+    from upslogger import logger
+    from upslogger.jsexport import ChunkedExporter, LocalTarget
+
+    log_fn = str(existing_logfile)
+    out_dir = str(tmpdir.join('epochjs'))
+
+    class FailingTarget(LocalTarget):
+        fail_key = 'manifest.json'
+        def put(self, key, data):
+            if key == self.fail_key:
+                self.fail_key = None
+                raise IOError('upload failed')
+            return super(FailingTarget, self).put(key, data)
+
+    exporter = ChunkedExporter(FailingTarget(out_dir), log_fn, chunk_seconds=30)
+    with pytest.raises(IOError):
+        exporter.export()
+    assert exporter.export()
+
+    # the retry doesn't list the chunks of the failed run twice
+    manifest = read_json(out_dir, 'manifest.json')
+    starts = [c['start'] for c in manifest['chunks']]
+    assert len(starts) == 3
+    assert starts == sorted(set(starts))
+    total = sum(c['rows'] for c in manifest['chunks']) + manifest['head']['rows']
+    assert total == len(logger.parse_logfile(log_fn))
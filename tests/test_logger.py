@@ -72,3 +72,188 @@ def test_log_parser(tz_override, existing_logfile, tmpdir):
                 linefreq = 59.0
             else:
                 linefreq += .1
+
+def test_log_parser_table(tz_override, existing_logfile):
+    from upslogger.logger import parse_logfile, parse_logfile_table
+    from upslogger import timezone
+
+    parsed = parse_logfile(str(existing_logfile))
+    table = parse_logfile_table(str(existing_logfile))
+
+    assert len(table) == len(parsed)
+    assert table.fields == ['LINEV', 'LINEFREQ']
+    for i, d in enumerate(parsed):
+        assert table.timestamps[i] == timezone.to_timestamp(d['DATE'].value)
+        assert table['LINEV'][i] == d['LINEV'].value
+        assert table['LINEFREQ'][i] == d['LINEFREQ'].value
+
+def test_log_parser_table_missing(tz_override, tmpdir):
+    import numpy as np
+    from upslogger.logger import parse_logfile_table
+
+    lines = [
+        '#fields:\tDATE\tLINEV\tLINEFREQ',
+        '2017-08-03 14:10:00 -0500\t110.0\t59.0',
+        '2017-08-03 14:10:01 -0500\t-\t59.1',
+        '2017-08-03 14:10:02 -0500\t110.2',
+    ]
+    fn = tmpdir.join('missing.log')
+    fn.write('\n'.join(lines))
+
+    table = parse_logfile_table(str(fn))
+    assert len(table) == 3
+    assert np.isnan(table['LINEV'][1])
+    assert np.isnan(table['LINEFREQ'][2])
+    ts, y = table.get_series('LINEV')
+    assert ts.tolist() == [table.timestamps[0], table.timestamps[2]]
+    assert y.tolist() == [110.0, 110.2]
+
+def test_prepare_js_data(tz_override, existing_logfile):
+    from upslogger.apcdata import prepare_js_data
+    from upslogger.logger import parse_logfile
+    from upslogger import timezone
+
+    parsed = parse_logfile(str(existing_logfile))
+    js_data = prepare_js_data(str(existing_logfile))
+
+    assert set(js_data.keys()) == {'LINEV', 'LINEFREQ'}
+    for key, js_field in js_data.items():
+        assert js_field['label'] == key.title()
+        assert len(js_field['values']) == len(parsed)
+        for d, val in zip(parsed, js_field['values']):
+            assert val['time'] == timezone.to_timestamp(d['DATE'].value)
+            assert val['y'] == d[key].value
+
+def test_iter_logfile(tz_override, existing_logfile, monkeypatch):
+    from upslogger import logger
+    from upslogger import timezone
+
+    # force several chunked reads and table chunks
+    monkeypatch.setattr(logger, 'LOG_READ_SIZE', 100)
+    monkeypatch.setattr(logger, 'LOG_CHUNK_ROWS', 7)
+
+    parsed = logger.parse_logfile(str(existing_logfile))
+    rows = list(logger.iter_logfile(str(existing_logfile)))
+    assert len(rows) == len(parsed) == 101
+    for d1, d2 in zip(parsed, rows):
+        for key in logger.LOG_FIELDS:
+            assert d1[key].value == d2[key].value
+
+    start = parsed[10]['DATE'].value
+    end = parsed[20]['DATE'].value
+    rows = list(logger.iter_logfile(str(existing_logfile), start, end))
+    assert [d['DATE'].value for d in rows] == [d['DATE'].value for d in parsed[10:21]]
+
+    tables = list(logger.iter_logfile_tables(
+        str(existing_logfile), start=timezone.to_timestamp(start),
+    ))
+    assert len(tables) > 1
+    assert max(len(t) for t in tables) == 7
+    table = logger.parse_logfile_table(str(existing_logfile), start, end)
+    assert table.timestamps.tolist() == [timezone.to_timestamp(d['DATE'].value) for d in rows]
+
+def test_log_writer(tz_override, existing_logfile, tmpdir):
+    from upslogger import logger
+
+    parsed = logger.parse_logfile(str(existing_logfile))
+    fn = str(tmpdir.join('writer.log'))
+
+    flushed = []
+    on_flush = lambda: flushed.append(len(logger.parse_logfile_table(fn)))
+    writer = logger.LogWriter(fn, flush_rows=10, fsync='flush', on_flush=on_flush)
+    with writer:
+        for i, d in enumerate(parsed[:25]):
+            writer.write(d)
+            assert len(writer.buffer) == (i + 1) % 10
+        assert len(logger.parse_logfile_table(fn)) == 20
+    assert not writer.is_open
+    assert len(logger.parse_logfile_table(fn)) == 25
+    assert flushed == [10, 20, 25]
+
+    writer = logger.LogWriter(fn, flush_rows=1000, flush_interval=0)
+    with writer:
+        writer.write(parsed[25])
+        assert not len(writer.buffer)
+
+    with open(existing_logfile, 'r') as f:
+        expected = f.read().splitlines()[:27]
+    with open(fn, 'r') as f:
+        assert f.read().splitlines() == expected
+
+def test_log_writer_recover(tz_override, existing_logfile, tmpdir):
+    from upslogger import logger
+
+    parsed = logger.parse_logfile(str(existing_logfile))
+    with open(existing_logfile, 'r') as f:
+        lines = f.read().splitlines()
+
+    # torn final line is dropped
+    fn = str(tmpdir.join('torn.log'))
+    with open(fn, 'w') as f:
+        f.write('\n'.join(lines[:10]))
+        f.write('\n{}'.format(lines[10][:15]))
+    logger.log_linev(parsed[9], fn)
+    with open(fn, 'r') as f:
+        assert f.read().splitlines() == lines[:11]
+
+    # complete final line without a newline is kept
+    fn = str(tmpdir.join('no_newline.log'))
+    with open(fn, 'w') as f:
+        f.write('\n'.join(lines[:10]))
+    logger.log_linev(parsed[9], fn)
+    with open(fn, 'r') as f:
+        assert f.read().splitlines() == lines[:11]
+
+    # torn binary record
+    fn = str(tmpdir.join('torn.bin'))
+    for d in parsed[:10]:
+        logger.log_linev(d, fn)
+    with open(fn, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    logger.log_linev(parsed[10], fn)
+    table = logger.parse_logfile_table(fn)
+    assert len(table) == 11
+    assert table.timestamps[-1] == parsed[10]['DATE'].timestamp
+
+def test_prepare_js_data_columnar(tz_override, existing_logfile, monkeypatch):
+    from upslogger import logger
+    from upslogger.apcdata import prepare_js_data
+    from upslogger.jsexport import decode_delta_times
+
+    monkeypatch.setattr(logger, 'LOG_CHUNK_ROWS', 7)
+
+    points = prepare_js_data(str(existing_logfile))
+    columns = prepare_js_data(str(existing_logfile), layout='columnar')
+    deltas = prepare_js_data(str(existing_logfile), layout='columnar', delta_times=True)
+
+    assert set(columns.keys()) == set(points.keys())
+    for key, js_field in points.items():
+        times = [v['time'] for v in js_field['values']]
+        values = [v['y'] for v in js_field['values']]
+        assert columns[key]['label'] == js_field['label']
+        assert columns[key]['times'] == times
+        assert columns[key]['values'] == values
+        assert deltas[key]['time_encoding'] == 'delta'
+        assert deltas[key]['times'][0] == times[0]
+        assert set(deltas[key]['times'][1:]) == {1}
+        assert decode_delta_times(deltas[key]['times']) == times
+        assert deltas[key]['values'] == values
+
+    js_ts = prepare_js_data(str(existing_logfile), layout='columnar', dt_dype='js_ts')
+    assert js_ts['LINEV']['times'] == [t * 1000 for t in columns['LINEV']['times']]
+
+def test_log_table_builder():
+    import numpy as np
+    from upslogger.table import LogTableBuilder
+
+    builder = LogTableBuilder(['LINEV'])
+    assert len(builder.build()) == 0
+    builder.append(1, [110.])
+    builder.extend(np.array([2, 3]), [np.array([111., np.nan])])
+    builder.append(4, [112.])
+    assert len(builder) == 4
+    table = builder.build()
+    assert table.timestamps.dtype == np.int64
+    assert table.timestamps.tolist() == [1, 2, 3, 4]
+    assert np.array_equal(table['LINEV'], [110., 111., np.nan, 112.], equal_nan=True)
+    assert len(builder.build()) == 4
@@ -0,0 +1,54 @@
+def test_logindex(tz_override, existing_logfile, tmpdir, monkeypatch):
+    from upslogger import logger, logindex
+    from upslogger.logindex import LogIndex, rebuild_index
+    from upslogger import timezone
+
+    monkeypatch.setattr(logindex, 'INDEX_STRIDE', 256)
+
+    parsed = logger.parse_logfile(str(existing_logfile))
+    fn = str(tmpdir.join('indexed.log'))
+    for d in parsed:
+        logger.log_linev(d, fn)
+
+    index = LogIndex(fn)
+    assert index.exists
+    index.load()
+    assert len(index._offsets) > 5
+    assert index._offsets[0] == len('\t'.join(['#fields:'] + logger.LOG_FIELDS)) + 1
+    with open(fn, 'rb') as f:
+        for ts, offset in zip(index._timestamps, index._offsets):
+            f.seek(offset)
+            line = f.readline().decode('UTF-8')
+            assert timezone.dt_str_to_timestamp(line.split('\t')[0]) == ts
+
+    timestamps = [timezone.to_timestamp(d['DATE'].value) for d in parsed]
+    for i in [0, 1, 10, 50, 99, 100]:
+        offset = index.find_offset(timestamps[i])
+        if offset is not None:
+            j = index._offsets.index(offset)
+            assert index._timestamps[j] < timestamps[i]
+        table = logger.parse_logfile_table(fn, start=timestamps[i])
+        assert table.timestamps.tolist() == timestamps[i:]
+        rows = list(logger.iter_logfile(fn, start=timestamps[i], end=timestamps[i]))
+        assert len(rows) == 1
+
+    rebuilt = rebuild_index(fn)
+    assert rebuilt._timestamps == index._timestamps
+    assert rebuilt._offsets == index._offsets
+    rebuilt.load()
+    assert rebuilt._offsets == index._offsets
+
+def test_stale_index(tz_override, existing_logfile, tmpdir):
+    from upslogger import logger
+    from upslogger.logindex import LogIndex
+
+    fn = str(tmpdir.join('stale.log'))
+    with open(existing_logfile, 'r') as f:
+        s = f.read()
+    with open(fn, 'w') as f:
+        f.write(s)
+    index = LogIndex(fn)
+    index.add_entry(0, len(s) + 100)
+
+    table = logger.parse_logfile_table(fn, start=1)
+    assert len(table) == 101
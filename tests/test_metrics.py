@@ -0,0 +1,83 @@
+try:
+    from urllib.request import urlopen
+except ImportError: # pragma: no cover
+    from urllib2 import urlopen
+
+import pytest
+
+def test_registry():
+    from upslogger.metrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    requests = registry.counter('test_requests_total', 'Requests', ['method'])
+    latency = registry.histogram('test_latency_seconds', 'Latency', buckets=[.1, 1.])
+    assert registry.counter('test_requests_total') is requests
+    with pytest.raises(ValueError):
+        registry.histogram('test_requests_total')
+    with pytest.raises(ValueError):
+        requests.inc()
+
+    requests.labels('get').inc()
+    requests.labels(method='get').inc(2)
+    requests.labels('post').inc()
+    for value in [.05, .1, .5, 5.]:
+        latency.observe(value)
+    with latency.time() as timer:
+        pass
+    assert timer.duration >= 0
+
+    lines = registry.render().splitlines()
+    assert '# TYPE test_requests_total counter' in lines
+    assert 'test_requests_total{method="get"} 3' in lines
+    assert 'test_requests_total{method="post"} 1' in lines
+    assert '# TYPE test_latency_seconds histogram' in lines
+    assert 'test_latency_seconds_bucket{le="0.1"} 3' in lines
+    assert 'test_latency_seconds_bucket{le="1"} 4' in lines
+    assert 'test_latency_seconds_bucket{le="+Inf"} 5' in lines
+    assert 'test_latency_seconds_count 5' in lines
+
+    summary = registry.get_summary_lines()
+    assert any(line.startswith('test_latency_seconds count=5 ') for line in summary)
+    assert 'test_requests_total{method="get"} 3' in summary
+
+def test_http_endpoint():
+    from upslogger.metrics import MetricsRegistry, start_http_server
+
+    registry = MetricsRegistry()
+    registry.counter('test_polls_total', 'Polls').inc(7)
+    server = start_http_server(0, registry=registry)
+    try:
+        r = urlopen('http://{}:{}/metrics'.format(server.host, server.port))
+        assert r.headers['Content-Type'].startswith('text/plain')
+        body = r.read().decode('UTF-8')
+    finally:
+        server.stop()
+    assert 'test_polls_total 7' in body.splitlines()
+
+def test_instrumentation(tz_override, apcaccess_gen, existing_logfile, tmpdir):
+    from upslogger import logger
+    from upslogger.metrics import REGISTRY
+    from upslogger.nis import NISClient, get_host_label
+
+    host = get_host_label(apcaccess_gen.hostname, apcaccess_gen.hostport)
+    requests = REGISTRY.get('upslogger_nis_request_seconds').labels(host)
+    with NISClient(apcaccess_gen.hostname, apcaccess_gen.hostport) as client:
+        for i in range(3):
+            client.get_status()
+    assert requests.count == 3
+    assert REGISTRY.get('upslogger_nis_connects_total').get_value(host) == 1
+
+    parsed_rows = REGISTRY.get('upslogger_parse_rows_total').get_value()
+    table = logger.parse_logfile_table(str(existing_logfile))
+    assert REGISTRY.get('upslogger_parse_rows_total').get_value() == parsed_rows + len(table)
+    rows = logger.parse_logfile(str(existing_logfile))
+    assert len(rows) == len(table)
+    assert REGISTRY.get('upslogger_parse_rows_total').get_value() == parsed_rows + 2 * len(table)
+
+    flushes = REGISTRY.get('upslogger_writer_flush_seconds').labels()
+    num_flushes = flushes.count
+    with logger.LogWriter(str(tmpdir.join('metrics.log')), flush_rows=5) as writer:
+        for d in logger.parse_logfile(str(existing_logfile))[:20]:
+            writer.write(d)
+    assert flushes.count == num_flushes + 4
+    assert 'upslogger_writer_flush_seconds_count' in REGISTRY.render()
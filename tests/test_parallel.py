@@ -0,0 +1,74 @@
+import datetime
+
+import numpy as np
+
+def assert_tables_equal(t1, t2):
+    assert t1.fields == t2.fields
+    assert t1.timestamps.tolist() == t2.timestamps.tolist()
+    for name in t1.fields:
+        assert np.array_equal(t1[name], t2[name], equal_nan=True)
+
+def test_split_logfile(tz_override, existing_logfile):
+    from upslogger.parallel import split_logfile
+
+    fields, ranges = split_logfile(str(existing_logfile), chunk_bytes=200)
+    assert fields == ['DATE', 'LINEV', 'LINEFREQ']
+    with open(str(existing_logfile), 'rb') as f:
+        data = f.read()
+    assert ranges[0][0] == data.index(b'\n') + 1
+    assert ranges[-1][1] == len(data)
+    assert len(ranges) > 5
+    for (i0, i1), (j0, j1) in zip(ranges[:-1], ranges[1:]):
+        assert i1 == j0
+        assert data[i1 - 1:i1] == b'\n'
+
+def test_parse_parallel(tz_override, existing_logfile, tmpdir, monkeypatch):
+    from upslogger import logger, logindex
+    from upslogger.parallel import parse_logfile_parallel
+
+    src_table = logger.parse_logfile_table(str(existing_logfile))
+    for processes in [1, 2]:
+        table = parse_logfile_parallel(str(existing_logfile), processes=processes, chunk_bytes=200)
+        assert_tables_equal(table, src_table)
+
+    # indexed range reads only split the indexed span
+    monkeypatch.setattr(logindex, 'INDEX_STRIDE', 256)
+    fn = str(tmpdir.join('indexed.log'))
+    for d in logger.parse_logfile(str(existing_logfile)):
+        logger.log_linev(d, fn)
+    ts = src_table.timestamps
+    for i0, i1 in [(0, 10), (20, 60), (90, 100), (50, 50)]:
+        table = parse_logfile_parallel(fn, ts[i0], ts[i1], processes=2, chunk_bytes=300)
+        assert_tables_equal(table, src_table.slice_time(ts[i0], ts[i1]))
+    table = parse_logfile_parallel(fn, ts[-1] + 1, processes=2)
+    assert len(table) == 0
+    assert table.fields == src_table.fields
+
+def test_parse_parallel_segments(tz_override, tmpdir):
+    from test_segments import build_rows
+    from upslogger import logger
+    from upslogger.segments import SegmentedLog
+    from upslogger.parallel import parse_logfile_parallel, build_tasks
+
+    dirname = str(tmpdir.join('segments'))
+    rows = build_rows(
+        tz_override['local'], datetime.datetime(2017, 8, 3, 12, 0, 0),
+        72, datetime.timedelta(hours=1),
+    )
+    seg_log = SegmentedLog(dirname, 'daily', compress=True)
+    for d in rows:
+        seg_log.write(d)
+    seg_log.close()
+
+    # compressed segments split on their (here single) blocks
+    tasks = build_tasks(dirname, chunk_bytes=256)
+    assert [task[1].endswith('.gz') for task in tasks[:4]] == [True] * 3 + [False]
+    assert [task[0] for task in tasks] == ['range'] * len(tasks)
+    assert len(tasks) > 4
+
+    src_table = logger.parse_logfile_table(dirname)
+    table = parse_logfile_parallel(dirname, processes=2, chunk_bytes=256)
+    assert_tables_equal(table, src_table)
+    ts = src_table.timestamps
+    table = parse_logfile_parallel(dirname, ts[20], ts[40], processes=2)
+    assert_tables_equal(table, src_table.slice_time(ts[20], ts[40]))
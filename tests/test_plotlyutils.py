@@ -0,0 +1,53 @@
+import os
+import json
+
+import numpy as np
+
+def test_figure_builder(tz_override, existing_logfile, tmpdir, monkeypatch):
+    from upslogger import logger
+    from upslogger import plotlyutils
+
+    uploads = []
+    monkeypatch.setattr(plotlyutils.py, 'iplot', lambda fig, filename: uploads.append(fig))
+
+    parsed = logger.parse_logfile(str(existing_logfile))
+    log_fn = str(tmpdir.join('apclinev.log'))
+    with logger.LogWriter(log_fn) as writer:
+        for d in parsed[:50]:
+            writer.write(d)
+
+    builder = plotlyutils.FigureBuilder(log_fn, max_points=20)
+    fig = builder.get_figure()
+    assert builder.num_builds == 1
+    assert builder.get_figure() is fig
+    assert builder.num_builds == 1
+
+    table = logger.parse_logfile_table(log_fn)
+    for trace, name in zip(fig['data'], ['LINEV', 'LINEFREQ']):
+        y = np.asarray(trace['y'])
+        assert y.size <= 20
+        assert y.max() == np.nanmax(table[name])
+        assert y.min() == np.nanmin(table[name])
+
+    assert builder.upload()
+    # unchanged log, nothing to upload
+    assert not builder.upload()
+    assert len(uploads) == 1
+
+    with logger.LogWriter(log_fn) as writer:
+        for d in parsed[50:]:
+            writer.write(d)
+    assert builder.upload()
+    assert builder.num_builds == 2
+    assert len(uploads) == 2
+
+    json_fn = str(tmpdir.join('figure.json'))
+    assert plotlyutils.to_plotly(log_fn, max_points=20, output_filename=json_fn)
+    with open(json_fn, 'r') as f:
+        data = json.loads(f.read())
+    assert [trace['name'] for trace in data['data']] == ['Line Voltage', 'Line Frequency']
+
+    html_fn = str(tmpdir.join('figure.html'))
+    assert builder.write(html_fn)
+    assert os.path.exists(html_fn)
+    assert not os.path.exists(str(tmpdir.join('figure.tmp.html')))
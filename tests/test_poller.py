@@ -0,0 +1,73 @@
+import os
+import socket
+import asyncio
+
+import pytest
+
+from conftest import ApcAccessGenerator
+
+@pytest.fixture
+def apcaccess_fleet():
+    gens = [ApcAccessGenerator(LINEV=110. + i) for i in range(3)]
+    yield gens
+    for g in gens:
+        g.stop()
+
+def test_fleet_poller(tz_override, apcaccess_fleet, tmpdir):
+    from upslogger.poller import FleetPoller, UPSHost
+    from upslogger.logger import parse_logfile_table
+
+    # a port with nothing listening
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    dead_port = sock.getsockname()[1]
+    sock.close()
+
+    hosts = [
+        UPSHost.from_string('ups{} {}:{}'.format(i, g.hostname, g.hostport))
+        for i, g in enumerate(apcaccess_fleet)
+    ]
+    dead_host = UPSHost.from_string('127.0.0.1:{}'.format(dead_port))
+    assert dead_host.name == '127.0.0.1_{}'.format(dead_port)
+    hosts.append(dead_host)
+
+    log_dir = str(tmpdir.join('fleet'))
+    poller = FleetPoller(hosts, interval=.1, concurrency=2, timeout=.5, log_dir=log_dir)
+    asyncio.run(poller.run(duration=1.))
+
+    for i, (host, g) in enumerate(zip(hosts, apcaccess_fleet)):
+        assert host.num_polls >= 5
+        assert host.num_errors == 0
+        # one persistent connection per host
+        assert g.server.num_requests == host.num_polls
+        table = parse_logfile_table(poller.get_log_filename(host))
+        assert len(table) == host.num_polls
+        assert set(table['LINEV'].tolist()) == {110. + i}
+
+    assert dead_host.num_polls == 0
+    assert dead_host.num_errors >= 1
+    assert not os.path.exists(poller.get_log_filename(dead_host))
+
+def test_fleet_poller_errors(tz_override, apcaccess_fleet, tmpdir):
+    from upslogger.poller import FleetPoller, UPSHost
+
+    hosts = [
+        UPSHost.from_string('ups{} {}:{}'.format(i, g.hostname, g.hostport))
+        for i, g in enumerate(apcaccess_fleet)
+    ]
+    log_dir = str(tmpdir.join('fleet'))
+    poller = FleetPoller(hosts, interval=.1, timeout=.5, log_dir=log_dir)
+
+    # a failing write is counted against the host, polling carries on
+    def handle_status(host, status):
+        if host is hosts[0]:
+            raise OSError('disk full')
+    poller.handle_status = handle_status
+    asyncio.run(poller.run(duration=1.))
+
+    assert hosts[0].num_polls >= 5
+    assert hosts[0].num_errors == hosts[0].num_polls
+    assert isinstance(hosts[0].last_error, OSError)
+    for host in hosts[1:]:
+        assert host.num_polls >= 5
+        assert host.num_errors == 0
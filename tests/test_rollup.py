@@ -0,0 +1,59 @@
+import datetime
+
+import numpy as np
+
+from test_segments import build_rows
+
+def test_rollup(tz_override, tmpdir):
+    from upslogger import logger
+    from upslogger.rollup import RollupSet
+
+    fn = str(tmpdir.join('rollup.log'))
+    rows = build_rows(
+        tz_override['local'], datetime.datetime(2017, 8, 3, 12, 0, 0),
+        3000, datetime.timedelta(seconds=10),
+    )
+    rows[5]['LINEV'].value = None
+    for d in rows[:1000]:
+        logger.log_linev(d, fn)
+    rollups = RollupSet(fn)
+    rollups.update()
+    for d in rows[1000:]:
+        logger.log_linev(d, fn)
+    # state is restored from disk
+    rollups = RollupSet(fn)
+    rollups.update()
+
+    table = logger.parse_logfile_table(fn)
+    for tier in rollups.tiers:
+        stats = tier.get_table()
+        buckets = table.timestamps // tier.width * tier.width
+        expected_ts = np.unique(buckets)
+        assert stats.timestamps.tolist() == expected_ts.tolist()
+        for i, ts in enumerate(expected_ts):
+            y = table['LINEV'][buckets == ts]
+            y = y[~np.isnan(y)]
+            assert stats['LINEV_count'][i] == y.size
+            assert np.isclose(stats['LINEV_min'][i], y.min())
+            assert np.isclose(stats['LINEV_max'][i], y.max())
+            assert np.isclose(stats['LINEV_mean'][i], y.mean())
+
+    one_shot = RollupSet(fn)
+    one_shot.rebuild()
+    for tier1, tier2 in zip(rollups.tiers, one_shot.tiers):
+        t1, t2 = tier1.get_table(), tier2.get_table()
+        assert t1.timestamps.tolist() == t2.timestamps.tolist()
+        assert np.allclose(t1['LINEV_mean'], t2['LINEV_mean'])
+
+    # 3000 rows at 10s: 500 minutes, 9 hours
+    assert rollups.choose_tier(resolution=5000) == 'raw'
+    assert rollups.choose_tier(resolution=400) == '1m'
+    assert rollups.choose_tier(resolution=5) == '1h'
+    tier_name, span = rollups.read_span(resolution=5)
+    assert tier_name == '1h'
+    assert span.fields == ['LINEV', 'LINEFREQ']
+    assert len(span) == len(rollups.tiers_by_name['1h'].get_table())
+
+    from upslogger.apcdata import prepare_js_data
+    js_data = prepare_js_data(fn, resolution=5)
+    assert len(js_data['LINEV']['values']) == len(span)
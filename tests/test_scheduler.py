@@ -0,0 +1,97 @@
+import pytest
+
+class FakeClock(object):
+    def __init__(self, now=1000., wall_now=1500000000.25):
+        self.now = now
+        self.wall_offset = wall_now - now
+    def __call__(self):
+        return self.now
+    def wall_clock(self):
+        return self.now + self.wall_offset
+    def sleep(self, duration):
+        assert duration > 0
+        self.now += duration
+
+def test_scheduler_cadence():
+    from upslogger.scheduler import Scheduler
+
+    clock = FakeClock()
+    scheduler = Scheduler(clock, clock.wall_clock, clock.sleep)
+    calls = {'fast':[], 'slow':[]}
+
+    def fast():
+        calls['fast'].append(clock.wall_clock())
+        clock.now += .1
+
+    def slow():
+        calls['slow'].append(clock.wall_clock())
+
+    scheduler.add_job('fast', fast, 1., align=True)
+    scheduler.add_job('slow', slow, 5.)
+    scheduler.run(duration=20.)
+
+    # aligned to whole seconds and not pushed back by the job's own runtime
+    assert calls['fast'][0] == 1500000001.
+    for i, ts in enumerate(calls['fast']):
+        assert ts == pytest.approx(1500000001. + i)
+    assert len(calls['fast']) == 20
+    assert len(calls['slow']) == 5
+
+    stats = scheduler.get_stats()
+    assert stats['fast']['runs'] == 20
+    assert stats['fast']['missed'] == 0
+    assert stats['fast']['max_duration'] == pytest.approx(.1)
+
+def test_scheduler_missed_ticks():
+    from upslogger.scheduler import Scheduler
+
+    clock = FakeClock()
+    scheduler = Scheduler(clock, clock.wall_clock, clock.sleep)
+    calls = []
+
+    def stall():
+        calls.append(clock.now)
+        if len(calls) == 2:
+            clock.now += 3.5
+
+    scheduler.add_job('sample', stall, 1.)
+    scheduler.run(duration=10.)
+
+    start = calls[0]
+    # ticks at +2, +3 and +4 were skipped, the grid is kept
+    assert [ts - start for ts in calls[:3]] == pytest.approx([0., 1., 5.])
+    stats = scheduler.get_stats()['sample']
+    assert stats['missed'] == 3
+    assert stats['runs'] == len(calls)
+    assert stats['max_jitter'] == pytest.approx(0.)
+
+def test_scheduler_failing_job():
+    from upslogger.scheduler import Scheduler
+
+    clock = FakeClock()
+    errors = []
+    scheduler = Scheduler(
+        clock, clock.wall_clock, clock.sleep,
+        on_error=lambda job, exc: errors.append((job.name, exc)),
+    )
+    calls = []
+
+    def flaky():
+        calls.append(clock.now)
+        if len(calls) % 2:
+            raise ValueError('bad sample')
+
+    scheduler.add_job('flaky', flaky, 1.)
+    scheduler.add_job('other', lambda: None, 1.)
+    scheduler.run(duration=9.5)
+
+    # the failing job and its neighbours keep their cadence
+    assert len(calls) == 10
+    stats = scheduler.get_stats()
+    assert stats['flaky']['runs'] == 10
+    assert stats['flaky']['failed'] == 5
+    assert isinstance(stats['flaky']['last_error'], ValueError)
+    assert stats['other']['runs'] == 10
+    assert stats['other']['failed'] == 0
+    assert [name for name, exc in errors] == ['flaky'] * 5
+    assert 'failed=5' in scheduler.format_stats()
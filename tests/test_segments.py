@@ -0,0 +1,110 @@
+import os
+import datetime
+import json
+
+def build_rows(tz, start_dt, num_rows, step):
+    from upslogger.fields import DateFieldBase, LineV, LineFreq
+    dt = tz.localize(start_dt)
+    linev = 110.0
+    rows = []
+    for i in range(num_rows):
+        rows.append({
+            'DATE':DateFieldBase(dt, 'DATE'),
+            'LINEV':LineV(round(linev, 1), 'LINEV'),
+            'LINEFREQ':LineFreq(60.0, 'LINEFREQ'),
+        })
+        dt += step
+        linev += .1
+    return rows
+
+def test_segments(tz_override, tmpdir, monkeypatch):
+    from upslogger import logger
+    from upslogger.segments import SegmentedLog
+    from upslogger import timezone
+
+    dirname = str(tmpdir.join('segments'))
+    rows = build_rows(
+        tz_override['local'], datetime.datetime(2017, 8, 3, 12, 0, 0),
+        72, datetime.timedelta(hours=1),
+    )
+    seg_log = SegmentedLog(dirname, 'daily', compress=True)
+    for d in rows:
+        seg_log.write(d)
+    seg_log.close()
+
+    filenames = sorted(os.listdir(dirname))
+    segments = [fn for fn in filenames if fn.endswith('.gz')]
+    assert len(segments) == 3
+    assert 'apclinev-20170806.log' in filenames
+
+    with open(os.path.join(dirname, 'manifest.json'), 'r') as f:
+        manifest = json.loads(f.read())
+    assert manifest['period'] == 'daily'
+    assert set(manifest['segments'].keys()) == set(segments)
+    entry = manifest['segments']['apclinev-20170804.log.gz']
+    assert entry['rows'] == 24
+    assert entry['fields']['LINEFREQ']['min'] == entry['fields']['LINEFREQ']['max'] == 60.
+
+    timestamps = [timezone.to_timestamp(d['DATE'].value) for d in rows]
+    table = logger.parse_logfile_table(dirname)
+    assert table.timestamps.tolist() == timestamps
+
+    # only segments overlapping the range are opened
+    opened = []
+    orig_iter = logger.iter_logfile_tables
+    def iter_logfile_tables(filename, *args, **kwargs):
+        if not os.path.isdir(filename):
+            opened.append(os.path.basename(filename))
+        return orig_iter(filename, *args, **kwargs)
+    monkeypatch.setattr(logger, 'iter_logfile_tables', iter_logfile_tables)
+    table = logger.parse_logfile_table(dirname, timestamps[20], timestamps[40])
+    assert table.timestamps.tolist() == timestamps[20:41]
+    assert opened == ['apclinev-20170804.log.gz', 'apclinev-20170805.log.gz']
+
+    parsed = logger.parse_logfile(dirname, timestamps[20], timestamps[40])
+    assert [d['LINEV'].value for d in parsed] == [d['LINEV'].value for d in rows[20:41]]
+
+    summary = SegmentedLog(dirname).get_summary()
+    assert summary['rows'] == len(rows)
+    assert summary['first'] == timestamps[0]
+    assert summary['last'] == timestamps[-1]
+    assert round(summary['fields']['LINEV']['min'], 1) == 110.0
+    assert round(summary['fields']['LINEV']['max'], 1) == round(110.0 + .1 * 71, 1)
+
+def test_segments_late_sample(tz_override, tmpdir, monkeypatch):
+    from upslogger import logger, logindex
+    from upslogger.segments import SegmentedLog
+
+    # segments well past one parse batch and index stride
+    monkeypatch.setattr(logindex, 'INDEX_STRIDE', 4096)
+    dirname = str(tmpdir.join('segments'))
+    rows = build_rows(
+        tz_override['local'], datetime.datetime(2017, 8, 3, 19, 0, 0),
+        2 * 8640, datetime.timedelta(seconds=10),
+    )
+    seg_log = SegmentedLog(dirname, 'daily', compress=True, writer_kwargs={'flush_rows':500})
+    for d in rows[:-10]:
+        seg_log.write(d)
+    # late samples for the closed (compressed) first day and for the open one
+    assert not seg_log.write(rows[5])
+    assert not seg_log.write(rows[-20])
+    for d in rows[-10:]:
+        assert seg_log.write(d)
+    seg_log.close()
+    assert seg_log.num_late == 2
+
+    filenames = sorted(os.listdir(dirname))
+    assert 'apclinev-20170804.log' not in filenames
+    assert 'apclinev-20170804.log.gz' in filenames
+    timestamps = [d['DATE'].timestamp for d in rows]
+    table = logger.parse_logfile_table(dirname)
+    assert table.timestamps.tolist() == timestamps
+    for i in [5, len(rows) - 20]:
+        table = logger.parse_logfile_table(dirname, timestamps[i], timestamps[i])
+        assert table.timestamps.tolist() == [timestamps[i]]
+
+    # a restart picks up the open segment's last timestamp
+    seg_log = SegmentedLog(dirname, compress=True)
+    assert not seg_log.write(rows[-5])
+    seg_log.close()
+    assert len(logger.parse_logfile_table(dirname)) == len(rows)
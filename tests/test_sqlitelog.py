@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pytest
+
+def test_sqlitelog(tz_override, existing_logfile, tmpdir):
+    from upslogger import logger, sqlitelog
+
+    parsed = logger.parse_logfile(str(existing_logfile))
+    fn = str(tmpdir.join('apclinev.sqlite'))
+    with logger.LogWriter(fn, flush_rows=10) as writer:
+        for d in parsed:
+            writer.write(d)
+    assert sqlitelog.is_sqlite(fn)
+    assert logger.get_log_format(fn) == 'sqlite'
+
+    src_table = logger.parse_logfile_table(str(existing_logfile))
+    table = logger.parse_logfile_table(fn)
+    assert table.fields == ['LINEV', 'LINEFREQ']
+    assert table.timestamps.tolist() == src_table.timestamps.tolist()
+    for name in table.fields:
+        assert np.allclose(table[name], src_table[name], equal_nan=True)
+
+    rows = logger.parse_logfile(fn)
+    assert len(rows) == len(parsed)
+    for d1, d2 in zip(parsed, rows):
+        assert d1['DATE'].value == d2['DATE'].value
+        assert d1['LINEV'].value == d2['LINEV'].value
+
+    ts = src_table.timestamps
+    table = logger.parse_logfile_table(fn, start=ts[10], end=ts[20])
+    assert table.timestamps.tolist() == ts[10:21].tolist()
+    tables = list(logger.iter_logfile_tables(fn, chunk_rows=40))
+    assert [len(t) for t in tables] == [40, 40, len(ts) - 80]
+
+    with sqlitelog.SQLiteLog(fn) as db:
+        assert db.get_hosts() == [sqlitelog.DEFAULT_HOST]
+        assert db.get_range() == (ts[0], ts[-1])
+        mode = db.conn.execute('PRAGMA journal_mode').fetchone()[0]
+    assert mode == 'wal'
+
+def test_aggregate(tz_override, existing_logfile, tmpdir):
+    from upslogger import logger, sqlitelog
+    from upslogger.rollup import aggregate_table, RollupSet
+
+    fn = str(tmpdir.join('apclinev.sqlite'))
+    logger.convert_logfile(str(existing_logfile), fn)
+    src_table = logger.parse_logfile_table(str(existing_logfile))
+
+    bucket_ts, stats = aggregate_table(src_table, 3600)
+    table = sqlitelog.aggregate(fn, 3600)
+    assert table.timestamps.tolist() == bucket_ts.tolist()
+    for name in src_table.fields:
+        mn, mx, total, count = stats[name]
+        assert np.allclose(table['{}_min'.format(name)], mn, equal_nan=True)
+        assert np.allclose(table['{}_max'.format(name)], mx, equal_nan=True)
+        assert table['{}_count'.format(name)].tolist() == count.tolist()
+
+    # the log spans 100 seconds: one hourly bucket, two minute buckets
+    tier_name, table = RollupSet(fn).read_span(resolution=2)
+    assert tier_name == '1m'
+    assert table.fields == src_table.fields
+    assert len(table) == 2
+    tier_name, table = RollupSet(fn).read_span(resolution=len(src_table) + 1)
+    assert tier_name == 'raw'
+    assert len(table) == len(src_table)
+
+def test_import_hosts(tz_override, existing_logfile, tmpdir):
+    from upslogger import logger, sqlitelog
+    from upslogger.rollup import RollupSet
+
+    fn = str(tmpdir.join('fleet.sqlite'))
+    logger.convert_logfile(str(existing_logfile), fn, 'sqlite', host='ups1')
+    logger.convert_logfile(str(existing_logfile), fn, 'sqlite', host='ups2')
+    src_table = logger.parse_logfile_table(str(existing_logfile))
+
+    with sqlitelog.SQLiteLog(fn) as db:
+        assert db.get_hosts() == ['ups1', 'ups2']
+    # interleaved hosts are never returned as one series
+    with pytest.raises(sqlitelog.SQLiteLogError):
+        logger.parse_logfile_table(fn)
+    table = logger.parse_logfile_table(fn, host='ups2')
+    assert table.timestamps.tolist() == src_table.timestamps.tolist()
+
+    rollups = RollupSet(fn)
+    with pytest.raises(sqlitelog.SQLiteLogError):
+        rollups.read_span(resolution=2)
+    tier_name, table = rollups.read_span(resolution=2, host='ups1')
+    assert tier_name == '1m'
+    assert len(table) == 2
+    tier_name, table = rollups.read_span(host='ups2')
+    assert tier_name == 'raw'
+    assert len(table) == len(src_table)
+    rollups.update()
+    assert not rollups.exists
+    assert not any(os.path.exists(tier.filename) for tier in rollups.tiers)
+
+    # samples appended by the logger land next to the imported ones
+    d = logger.parse_logfile(str(existing_logfile))[-1]
+    logger.log_linev(d, fn, host='ups1')
+    assert len(logger.parse_logfile(fn, host='ups1')) == len(src_table) + 1
+    assert len(logger.parse_logfile(fn, host='ups2')) == len(src_table)
@@ -0,0 +1,57 @@
+import os
+
+def write_lines(fn, lines, mode='a'):
+    with open(str(fn), mode) as f:
+        f.write(''.join(lines))
+
+def test_tail(tz_override, existing_logfile, tmpdir):
+    from upslogger.tail import LogTail
+    from upslogger.logger import parse_logfile_table
+
+    with open(existing_logfile, 'r') as f:
+        lines = f.read().splitlines(True)
+    fn = tmpdir.join('tail.log')
+    cursor_fn = tmpdir.join('tail.cursor')
+
+    write_lines(fn, lines[:50], 'w')
+    tail = LogTail(str(fn), str(cursor_fn))
+    table = tail.read()
+    assert len(table) == 49
+    assert tail.offset == os.path.getsize(str(fn))
+    assert not len(tail.read())
+
+    # partial final line is held back until complete
+    partial = lines[50][:10]
+    write_lines(fn, lines[50:60] + [partial])
+    table = tail.read()
+    assert len(table) == 10
+
+    write_lines(fn, [lines[60][10:]] + lines[61:])
+    # cursor is restored by a new instance
+    tail = LogTail(str(fn), str(cursor_fn))
+    table = tail.read()
+    full_table = parse_logfile_table(str(fn))
+    assert len(table) == len(lines) - 60
+    assert table.timestamps.tolist() == full_table.timestamps[59:].tolist()
+    assert table['LINEV'].tolist() == full_table['LINEV'][59:].tolist()
+
+def test_tail_rotate(tz_override, existing_logfile, tmpdir):
+    from upslogger.tail import LogTail
+
+    with open(existing_logfile, 'r') as f:
+        lines = f.read().splitlines(True)
+    fn = tmpdir.join('tail.log')
+
+    write_lines(fn, lines, 'w')
+    tail = LogTail(str(fn))
+    assert len(tail.read()) == len(lines) - 1
+
+    # truncation
+    write_lines(fn, lines[:10], 'w')
+    assert len(tail.read()) == 9
+
+    # rotation (new inode)
+    rotated_fn = tmpdir.join('tail.log.1')
+    os.rename(str(fn), str(rotated_fn))
+    write_lines(fn, lines[:20], 'w')
+    assert len(tail.read()) == 19
@@ -1,4 +1,5 @@
 import datetime
+import pytest
 
 def test_timezone(tz_override):
     from upslogger import timezone
@@ -55,3 +56,80 @@ def test_timezone(tz_override):
                 parsed_dt = timezone.parse_dt_str(dt_str, tz)
                 assert parsed_dt == dt
                 assert parsed_dt.tzinfo.zone == tz
+
+def _strptime_timestamp(dt_str):
+    import calendar
+    from upslogger import timezone
+    try:
+        dt = timezone._parse_dt_str_utc(dt_str)
+    except (ValueError, IndexError):
+        return None
+    return calendar.timegm(dt.timetuple())
+
+def _check_dt_strs(dt_strs):
+    from upslogger import timezone
+
+    expected = [_strptime_timestamp(s) for s in dt_strs]
+    for dt_str, ts in zip(dt_strs, expected):
+        if ts is None:
+            with pytest.raises((ValueError, IndexError)):
+                timezone.dt_str_to_timestamp(dt_str)
+        else:
+            assert timezone.dt_str_to_timestamp(dt_str) == ts, dt_str
+    result = timezone.dt_strs_to_timestamps(dt_strs)
+    for dt_str, ts, parsed in zip(dt_strs, expected, result.tolist()):
+        if ts is None:
+            assert parsed == timezone.INVALID_TIMESTAMP, dt_str
+        else:
+            assert parsed == ts, dt_str
+    return expected
+
+def test_dt_str_to_timestamp():
+    dt_strs = []
+    # month ends and leap days, including the century rules
+    for year in [1900, 1970, 2000, 2016, 2017, 2100]:
+        for month in range(1, 13):
+            for day in [1, 28, 29, 30, 31, 32]:
+                for time_str in ['00:00:00', '23:59:59']:
+                    dt_strs.append('{:04d}-{:02d}-{:02d} {}'.format(year, month, day, time_str))
+    dt_strs = [
+        '{} {}'.format(s, offset) if i % 2 else '{}Z{}'.format(s, offset)
+        for s in dt_strs
+        for i, offset in enumerate(['+0000', '-0500', '+0530', '-0930', '+1400'])
+    ]
+    expected = _check_dt_strs(dt_strs)
+    assert expected.count(None) > 0
+    assert _strptime_timestamp('2016-02-29 23:59:59 -0100') == 1456790400 + 3599
+
+def test_dt_str_to_timestamp_malformed():
+    dt_strs = [
+        '2017-01-01 00:00:00 +0000',
+        '2017-01-01T00:00:00 +0000',
+        '2017/01/01 00:00:00 +0000',
+        '2017-01-01 00-00-00 +0000',
+        '2017-01-01 24:00:00 +0000',
+        '2017-01-01 00:60:00 +0000',
+        '2017-01-01 00:00:60 +0000',
+        '2017-13-01 00:00:00 +0000',
+        '2017-00-10 00:00:00 +0000',
+        '2017-01-00 00:00:00 +0000',
+        '0000-01-01 00:00:00 +0000',
+        '+017-01-01 00:00:00 +0000',
+        '2017-01-01 -1:00:00 +0000',
+        '2017-01-01  1:00:00 +0000',
+        '2017-01-01 00:00:00 +00:0',
+        # not the fixed layout, handled (or rejected) by strptime
+        '2017-01-01 00:00:00 *0000',
+        '2017-01-01 00:00:00 UTC',
+        '2017-1-1 0:00:00 +0000',
+        '2017-01-01 00:00:00 +000',
+        '2017-01-01 00:00:00',
+        '2017-01-01',
+        '',
+        '-',
+        u'2017-01-01 00:00:0١ +0000',
+    ]
+    expected = _check_dt_strs(dt_strs)
+    assert expected[0] == 1483228800
+    assert expected[1:15] == [None] * 14
+    assert expected[15:17] == [1483228800] * 2
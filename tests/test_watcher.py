@@ -0,0 +1,72 @@
+import os
+import time
+import threading
+
+import pytest
+
+@pytest.fixture(params=[True, False], ids=['inotify', 'poll'])
+def use_inotify(request):
+    from upslogger.watcher import inotify_available
+    if request.param and not inotify_available():
+        pytest.skip('inotify not available')
+    return request.param
+
+def test_file_watcher(tmpdir, use_inotify):
+    from upslogger.watcher import FileWatcher
+
+    fn = str(tmpdir.join('apclinev.log'))
+    other_fn = str(tmpdir.join('other.log'))
+    with open(fn, 'w') as f:
+        f.write('a\n')
+
+    with FileWatcher(fn, poll_interval=.01, use_inotify=use_inotify) as watcher:
+        assert watcher.mode == ('inotify' if use_inotify else 'poll')
+        assert not watcher.wait(.05)
+
+        with open(other_fn, 'w') as f:
+            f.write('other\n')
+        assert not watcher.wait(.05)
+
+        def append():
+            time.sleep(.05)
+            with open(fn, 'a') as f:
+                f.write('b\n')
+        t = threading.Thread(target=append)
+        start_ts = time.time()
+        t.start()
+        assert watcher.wait(5)
+        assert time.time() - start_ts < 1
+        t.join()
+
+        # rotation
+        os.rename(fn, '{}.1'.format(fn))
+        with open(fn, 'w') as f:
+            f.write('c\n')
+        assert watcher.wait(1)
+
+def test_cache_push(tz_override, existing_logfile, tmpdir, monkeypatch, use_inotify):
+    from upslogger import logger
+    from upslogger import datacache
+
+    monkeypatch.setattr(datacache, '_CACHES', {})
+    parsed = logger.parse_logfile(str(existing_logfile))
+    log_fn = str(tmpdir.join('apclinev.log'))
+    with logger.LogWriter(log_fn) as writer:
+        writer.write(parsed[0])
+
+    cache = datacache.get_shared_cache(log_fn, refresh_interval=None)
+    updated = threading.Event()
+    cache.add_listener(updated.set)
+    # a long fallback interval, so only the watcher can make this fast
+    cache.start(interval=2., use_inotify=use_inotify)
+    if not use_inotify:
+        cache.watcher.poll_interval = .05
+    try:
+        start_ts = time.time()
+        with logger.LogWriter(log_fn) as writer:
+            writer.write(parsed[1])
+        assert updated.wait(5)
+        assert time.time() - start_ts < 1
+        assert cache.num_rows == 2
+    finally:
+        cache.stop()
@@ -3,8 +3,6 @@
 import os
 import io
 import sys
-import time
-import socket
 import errno
 import datetime
 import subprocess
@@ -12,10 +10,23 @@ import shlex
 import argparse
 import json
 
-from upslogger.logger import LOG_FILENAME, LOG_FIELDS, log_linev, parse_logfile
-from upslogger import timezone
-from upslogger.fields import Field, DateFieldBase
-from upslogger.plotlyutils import PlotlyRateLimitError, to_plotly
+from upslogger.logger import (
+    LOG_FILENAME, LOG_FORMATS, LOG_FORMAT, log_linev, iter_logfile_tables, convert_logfile,
+    get_log_data, LogWriter, FSYNC_POLICIES,
+)
+from upslogger.logindex import rebuild_index
+from upslogger.segments import SegmentedLog, LOG_DIRNAME, PERIODS
+from upslogger.compression import COMPRESSIONS, compress_file
+from upslogger.rollup import RollupSet
+from upslogger.scheduler import Scheduler
+from upslogger.exporter import ExportPool
+from upslogger.jsexport import (
+    JS_LAYOUTS, add_table_js_data, add_table_js_columns, build_js_columns,
+    ChunkedExporter, LocalTarget, S3Target,
+)
+from upslogger.nis import NISClient, parse_status_lines
+from upslogger.plotlyutils import PlotlyRateLimitError, MAX_POINTS, to_plotly
+from upslogger.metrics import REGISTRY, start_http_server
 
 PY3 = sys.version_info.major >= 3
 
@@ -23,6 +34,18 @@ APCACCESS_AVAILABLE = True
 APC_HOSTNAME = 'localhost'
 APC_HOSTPORT = 3551
 
+NIS_CLIENTS = {}
+
+APC_STATUS_SECONDS = REGISTRY.histogram(
+    'upslogger_apc_status_seconds', 'Time to read the UPS status', ['method'],
+)
+APC_STATUS_ERRORS = REGISTRY.counter(
+    'upslogger_apc_status_errors_total', 'Failed UPS status reads', ['method'],
+)
+APC_FALLBACKS = REGISTRY.counter(
+    'upslogger_apcaccess_fallback_total', 'apcaccess not found, switched to NIS over TCP',
+)
+
 def get_apc_status_subprocess(hostname=None, port=None):
     if hostname is None:
         hostname = APC_HOSTNAME
@@ -32,107 +55,85 @@ def get_apc_status_subprocess(hostname=None, port=None):
     s = subprocess.check_output(shlex.split(cmd_str))
     if PY3:
         s = s.decode('UTF-8')
-    d = {}
-    for line in s.splitlines():
-        if ':' in line:
-            key = line.split(':')[0].strip(' ')
-            val = ':'.join(line.split(':')[1:]).strip(' ')
-            field = Field.from_string(val, key)
-            d[key] = field
-    return d
+    return parse_status_lines(s.splitlines())
 
-def get_apc_status_tcp(hostname=None, port=None):
+def get_nis_client(hostname=None, port=None):
     if hostname is None:
         hostname = APC_HOSTNAME
     if port is None:
         port = APC_HOSTPORT
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.connect((hostname, port))
-    sock.sendall(b'\x00\x06status')
-    resp = sock.recv(1024)
-    d = {}
-    for line in resp.split(b'\x00'):
-        line = line[1:].strip(b'\n')
-        if PY3:
-            line = line.decode('UTF-8')
-        if ':' in line:
-            key = line.split(':')[0].strip(' ')
-            val = ':'.join(line.split(':')[1:]).strip(' ')
-            field = Field.from_string(val, key)
-            d[key] = field
-    return d
+    key = (hostname, port)
+    client = NIS_CLIENTS.get(key)
+    if client is None:
+        client = NIS_CLIENTS[key] = NISClient(hostname, port)
+    return client
+
+def get_apc_status_tcp(hostname=None, port=None):
+    client = get_nis_client(hostname, port)
+    return client.get_status()
+
+def _get_apc_status_timed(method, func, hostname, port):
+    try:
+        with APC_STATUS_SECONDS.labels(method).time():
+            return func(hostname, port)
+    except Exception:
+        APC_STATUS_ERRORS.labels(method).inc()
+        raise
 
 def get_apc_status(hostname=None, port=None):
     global APCACCESS_AVAILABLE
     if not APCACCESS_AVAILABLE:
-        return get_apc_status_tcp(hostname, port)
+        return _get_apc_status_timed('tcp', get_apc_status_tcp, hostname, port)
     try:
-        d = get_apc_status_subprocess(hostname, port)
+        d = _get_apc_status_timed('subprocess', get_apc_status_subprocess, hostname, port)
     except OSError as e:
         if e.errno == errno.ENOENT:
             APCACCESS_AVAILABLE = False
-            d = get_apc_status_tcp(hostname, port)
+            APC_FALLBACKS.inc()
+            d = _get_apc_status_timed('tcp', get_apc_status_tcp, hostname, port)
         else: # pragma: no cover
             raise
     return d
 
 def get_apc_linev(hostname=None, port=None):
     d = get_apc_status(hostname, port)
-    r = {}
-    for name in LOG_FIELDS:
-        if name not in d:
-            return None
-    dt = d.get('DATE')
-    if dt is None or dt.value is None:
-        dt = timezone.now('local')
-        d['DATE'] = DateFieldBase(dt, 'DATE')
-    return d
+    return get_log_data(d)
 
 
-def prepare_js_data(filename=None, **kwargs):
+def prepare_js_data(filename=None, start=None, end=None, resolution=None, **kwargs):
     dt_type = kwargs.pop('dt_dype', 'posix_ts')
     x_data_key = kwargs.pop('x_data_key', 'time')
     y_data_key = kwargs.pop('y_data_key', 'y')
+    layout = kwargs.pop('layout', 'points')
+    delta_times = kwargs.pop('delta_times', False)
+    if layout not in JS_LAYOUTS:
+        raise ValueError('Unknown layout: {}'.format(layout))
 
-    parsed = parse_logfile(filename)
+    if resolution is not None:
+        tier_name, table = RollupSet(filename).read_span(start, end, resolution)
+        tables = [table] if table is not None else []
+    else:
+        tables = iter_logfile_tables(filename, start, end)
     js_data = {}
-    for d in parsed:
-        dt_field = d['DATE']
-        if dt_type == 'posix_ts':
-            x = timezone.to_timestamp(dt_field.value)
-        elif dt_type == 'js_ts':
-            x = timezone.to_timestamp(dt_field.value) * 1000
-        elif dt_type == 'isostr':
-            x = str(dt_field)
-        else:
-            x = str(dt_field)
-        for field in d.values():
-            if field.name == 'DATE':
-                continue
-            if field.value is None:
-                continue
-            if field.name not in js_data:
-                js_data[field.name] = {
-                    'label':field.name.title(),
-                    'values':[],
-                }
-            js_data[field.name]['values'].append({
-                x_data_key:x,
-                y_data_key:field.value
-            })
+    if layout == 'columnar':
+        for table in tables:
+            add_table_js_columns(js_data, table, dt_type)
+        return build_js_columns(js_data, delta_times)
+    for table in tables:
+        add_table_js_data(js_data, table, dt_type, x_data_key, y_data_key)
     return js_data
 
-def to_aws_epochjs(bucket_name, key_name, filename=None):
+def to_aws_epochjs(bucket_name, key_name, filename=None, resolution=None):
     import boto3
     s3 = boto3.resource('s3')
     bucket = s3.Bucket(bucket_name)
     obj = bucket.Object(key_name)
 
-    js_data = prepare_js_data(filename)
+    js_data = prepare_js_data(filename, resolution=resolution)
     js_data = list(js_data.values())
 
     s = json.dumps(js_data)
-    fh = io.BytesIO(bytes(s))
+    fh = io.BytesIO(s.encode('UTF-8'))
     obj.upload_fileobj(
         fh,
         ExtraArgs={
@@ -142,59 +143,183 @@ def to_aws_epochjs(bucket_name, key_name, filename=None):
     )
     fh.close()
 
+def build_epochjs_exporter(parsed_args):
+    if parsed_args.epochjs_dir:
+        target = LocalTarget(parsed_args.epochjs_dir)
+    else:
+        target = S3Target(parsed_args.aws_bucket, parsed_args.aws_keyname)
+    return ChunkedExporter(
+        target, parsed_args.logfile, int(parsed_args.epochjs_chunk_hours * 3600),
+        layout=parsed_args.epochjs_layout, delta_times=parsed_args.epochjs_delta,
+    )
+
 
 def log_linev_interval(parsed_args):
-    log_seconds = int(parsed_args.time_interval) * 60
+    log_seconds = float(parsed_args.time_interval) * 60
     pl_enable = parsed_args.plotly
     pl_seconds = parsed_args.plotly_interval * 60
     epochjs_enable = parsed_args.epochjs
     epochjs_seconds = parsed_args.epochjs_interval
-    print('Logging every {} minutes.  Press CTRL-C to quit'.format(parsed_args.time_interval))
-    wait_interval = 1
-    now = time.time()
-    next_log_ts = now
-    next_plot_ts = now
-    next_epochjs_ts = now
-    while True:
+    if parsed_args.rollups:
+        rollups = RollupSet(parsed_args.logfile)
+    else:
+        rollups = None
+    writer_kwargs = dict(
+        flush_rows=parsed_args.flush_rows,
+        flush_interval=parsed_args.flush_interval,
+        fsync=parsed_args.fsync,
+        # rollups only need updating once rows are actually in the log
+        on_flush=rollups.update if rollups is not None else None,
+    )
+    if parsed_args.rotate:
+        writer = SegmentedLog(
+            parsed_args.logfile, parsed_args.rotate, parsed_args.log_format,
+            compress=parsed_args.compress_segments, writer_kwargs=writer_kwargs,
+            compression=parsed_args.compression,
+        )
+    else:
+        writer = LogWriter(
+            parsed_args.logfile, parsed_args.log_format, host=parsed_args.host, **writer_kwargs
+        )
+    scheduler = Scheduler()
+    export_pool = ExportPool(max_workers=parsed_args.export_workers)
+
+    def log_sample():
+        data = get_apc_linev()
+        if data is not None:
+            writer.write(data)
+
+    def update_plotly():
         try:
-            now = time.time()
-            if now >= next_log_ts:
-                data = get_apc_linev()
-                log_linev(data, parsed_args.logfile)
-                next_log_ts += log_seconds
-            if pl_enable and now >= next_plot_ts:
-                try:
-                    to_plotly(parsed_args.logfile)
-                except PlotlyRateLimitError:
-                    print('{}: plotly rate limit'.format(datetime.datetime.now()))
-                next_plot_ts += pl_seconds
-            if epochjs_enable and now >= next_epochjs_ts:
-                to_aws_epochjs(parsed_args.aws_bucket, parsed_args.aws_keyname, parsed_args.logfile)
-            time.sleep(wait_interval)
-        except KeyboardInterrupt:
-            break
+            to_plotly(
+                parsed_args.logfile, resolution=parsed_args.resolution,
+                max_points=parsed_args.plotly_max_points,
+                output_filename=parsed_args.plotly_output,
+            )
+        except PlotlyRateLimitError:
+            print('{}: plotly rate limit'.format(datetime.datetime.now()))
+
+    if epochjs_enable:
+        js_exporter = build_epochjs_exporter(parsed_args)
+
+    def update_epochjs():
+        js_exporter.export()
+
+    scheduler.add_job('sample', log_sample, log_seconds, align=parsed_args.align)
+    if pl_enable:
+        export_pool.register('plotly', update_plotly)
+        scheduler.add_job('plotly', lambda: export_pool.submit('plotly'), pl_seconds)
+    if epochjs_enable:
+        export_pool.register('epochjs', update_epochjs)
+        scheduler.add_job('epochjs', lambda: export_pool.submit('epochjs'), epochjs_seconds)
+    if writer_kwargs['flush_interval']:
+        scheduler.add_job('flush', writer.maybe_flush, writer_kwargs['flush_interval'])
+    if parsed_args.metrics_interval:
+        scheduler.add_job('metrics', REGISTRY.log_summary, parsed_args.metrics_interval * 60)
+    metrics_server = None
+    if parsed_args.metrics_port is not None:
+        metrics_server = start_http_server(parsed_args.metrics_port, parsed_args.metrics_host)
+    print('Logging every {} minutes.  Press CTRL-C to quit'.format(parsed_args.time_interval))
+    export_pool.start()
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        export_pool.stop(wait=False)
+        if metrics_server is not None:
+            metrics_server.stop()
+    print(scheduler.format_stats())
+    for kind, stats in sorted(export_pool.get_stats().items()):
+        print('{} export: runs={runs} coalesced={coalesced} dropped={dropped} failed={failed}'.format(
+            kind, **stats
+        ))
 
 if __name__ == '__main__':
     p = argparse.ArgumentParser()
     p.add_argument('-f', '--logfile', dest='logfile')
     p.add_argument('-t', '--time-interval', dest='time_interval',
-                   help='Log every "t" minutes')
+                   help='Log every "t" minutes (fractions allowed)')
+    p.add_argument('--no-align', dest='align', action='store_false',
+                   help="Don't align samples to multiples of the log interval")
     p.add_argument('--plotly', dest='plotly', action='store_true')
     p.add_argument('--plotly-interval', dest='plotly_interval', type=int, default=30,
                    help='Update plotly every "t" minutes')
+    p.add_argument('--plotly-max-points', dest='plotly_max_points', type=int,
+                   default=MAX_POINTS,
+                   help='Decimate each plotly trace to at most this many points')
+    p.add_argument('--plotly-output', dest='plotly_output',
+                   help='Write the plotly figure to a local .html or .json file instead')
     p.add_argument('--epochjs', dest='epochjs', action='store_true',
                    help='Upload epochjs data to aws')
-    p.add_argument('--epochjs-interval', dest='epochjs_interval', type=int, default=10)
+    p.add_argument('--epochjs-interval', dest='epochjs_interval', type=float, default=10,
+                   help='Upload epochjs data every "t" seconds')
+    p.add_argument('--epochjs-dir', dest='epochjs_dir',
+                   help='Write chunked epochjs data to this directory instead of aws')
+    p.add_argument('--epochjs-chunk-hours', dest='epochjs_chunk_hours', type=float, default=24,
+                   help='Time span of each immutable epochjs chunk')
+    p.add_argument('--epochjs-layout', dest='epochjs_layout', choices=JS_LAYOUTS,
+                   default='points',
+                   help='"points" for epoch.js style {time, y} objects, "columnar" for arrays')
+    p.add_argument('--epochjs-delta', dest='epochjs_delta', action='store_true',
+                   help='Delta encode the timestamps of columnar epochjs data')
+    p.add_argument('--export-workers', dest='export_workers', type=int, default=2,
+                   help='Number of background threads for plotly/epochjs exports')
     p.add_argument('--aws-bucket', dest='aws_bucket')
     p.add_argument('--aws-keyname', dest='aws_keyname')
+    p.add_argument('--metrics-port', dest='metrics_port', type=int,
+                   help='Serve Prometheus metrics over http on this port')
+    p.add_argument('--metrics-host', dest='metrics_host', default='127.0.0.1')
+    p.add_argument('--metrics-interval', dest='metrics_interval', type=float, default=60,
+                   help='Print a metrics summary every "t" minutes (0 to disable)')
+    p.add_argument('--log-format', dest='log_format', choices=LOG_FORMATS,
+                   help='Storage format for new log files (default: {})'.format(LOG_FORMAT))
+    p.add_argument('--flush-rows', dest='flush_rows', type=int, default=1,
+                   help='Write buffered rows to the log after this many samples')
+    p.add_argument('--flush-interval', dest='flush_interval', type=float,
+                   help='Write buffered rows at least every "t" seconds')
+    p.add_argument('--fsync', dest='fsync', choices=FSYNC_POLICIES, default='never',
+                   help='When to fsync the log file')
+    p.add_argument('--rotate', dest='rotate', choices=PERIODS,
+                   help='Write time-based log segments into the "logfile" directory')
+    p.add_argument('--compress-segments', dest='compress_segments', action='store_true',
+                   help='Compress closed log segments in the background')
+    p.add_argument('--compression', dest='compression', choices=COMPRESSIONS, default='gzip')
+    p.add_argument('--compress', dest='compress', metavar='FILE',
+                   help='Compress a closed (or rotated) log file into indexed blocks and exit')
+    p.add_argument('--rollups', dest='rollups', action='store_true',
+                   help='Maintain 1m/1h/1d rollup tables while logging')
+    p.add_argument('--resolution', dest='resolution', type=int,
+                   help='Export from the coarsest rollup tier with at least this many points')
+    p.add_argument('--rebuild-index', dest='rebuild_index', action='store_true',
+                   help='Rebuild the time index for the log file and exit')
+    p.add_argument('--convert', dest='convert', nargs=2, metavar=('SRC', 'DST'),
+                   help='Convert SRC log to DST (tsv <-> binary, or import into sqlite) and exit')
+    p.add_argument('--host', dest='host',
+                   help='Host name to store samples under in sqlite logs')
     args = p.parse_args()
-    if args.epochjs:
+    if args.rotate and not args.logfile:
+        args.logfile = LOG_DIRNAME
+    if args.rebuild_index:
+        rebuild_index(args.logfile or LOG_FILENAME)
+        sys.exit(0)
+    if args.convert:
+        convert_logfile(args.convert[0], args.convert[1], args.log_format, args.host)
+        sys.exit(0)
+    if args.compress:
+        print(compress_file(os.path.expanduser(args.compress), args.compression))
+        sys.exit(0)
+    if args.epochjs and not args.epochjs_dir:
         if not args.aws_bucket or not args.aws_keyname:
             raise Exception('aws-bucket and aws-keyname parameters required')
     if args.plotly and not args.time_interval:
-        to_plotly(args.logfile)
+        to_plotly(
+            args.logfile, resolution=args.resolution, max_points=args.plotly_max_points,
+            output_filename=args.plotly_output,
+        )
     if args.epochjs and not args.time_interval:
-        to_aws_epochjs(args.aws_bucket, args.aws_keyname, args.logfile)
+        build_epochjs_exporter(args).export()
     if args.time_interval:
         log_linev_interval(args)
     elif args.logfile:
@@ -0,0 +1,130 @@
+import os
+import io
+import struct
+
+import numpy as np
+
+from upslogger.table import LogTable
+from upslogger import timezone
+
+BINLOG_MAGIC = b'UPSBLOG\x00'
+BINLOG_VERSION = 1
+BINLOG_EXT = '.bin'
+
+# magic, version, num_fields, data offset
+_HEADER_STRUCT = struct.Struct('<8sHHI')
+
+class BinaryLogError(Exception):
+    pass
+
+def is_binlog(filename):
+    if not os.path.isfile(filename):
+        return False
+    with open(filename, 'rb') as f:
+        return f.read(len(BINLOG_MAGIC)) == BINLOG_MAGIC
+
+def get_record_dtype(fields):
+    dtype = []
+    for name in fields:
+        if name == 'DATE':
+            dtype.append((name, '<i8'))
+        else:
+            dtype.append((name, '<f4'))
+    return np.dtype(dtype)
+
+def build_header(fields):
+    names = '\t'.join(fields).encode('UTF-8')
+    data_offset = _HEADER_STRUCT.size + len(names)
+    # align records to 8 bytes
+    padding = -data_offset % 8
+    data_offset += padding
+    header = _HEADER_STRUCT.pack(BINLOG_MAGIC, BINLOG_VERSION, len(fields), data_offset)
+    return header + names + b'\x00' * padding
+
+def read_header(f):
+    f.seek(0)
+    header = f.read(_HEADER_STRUCT.size)
+    if len(header) < _HEADER_STRUCT.size:
+        raise BinaryLogError('Incomplete header')
+    magic, version, num_fields, data_offset = _HEADER_STRUCT.unpack(header)
+    if magic != BINLOG_MAGIC:
+        raise BinaryLogError('Not a binary log file')
+    if version != BINLOG_VERSION:
+        raise BinaryLogError('Unsupported version: {}'.format(version))
+    names = f.read(data_offset - _HEADER_STRUCT.size).rstrip(b'\x00')
+    fields = names.decode('UTF-8').split('\t')
+    if len(fields) != num_fields:
+        raise BinaryLogError('Corrupt header')
+    return fields, data_offset
+
+def pack_records(table, fields):
+    records = np.zeros(len(table), dtype=get_record_dtype(fields))
+    for name in fields:
+        if name == 'DATE':
+            records[name] = table.timestamps
+        else:
+            records[name] = table.get_column(name)
+    return records
+
+def append_table(filename, table, fields=None):
+    if os.path.exists(filename) and os.path.getsize(filename):
+        with io.open(filename, 'rb') as f:
+            file_fields, data_offset = read_header(f)
+        if fields is not None and file_fields != fields:
+            raise BinaryLogError('Field mismatch: {} != {}'.format(file_fields, fields))
+        fields = file_fields
+        mode = 'r+b'
+    else:
+        if fields is None:
+            fields = ['DATE'] + table.fields
+        mode = 'wb'
+    dtype = get_record_dtype(fields)
+    records = pack_records(table, fields)
+    with io.open(filename, mode) as f:
+        if mode == 'wb':
+            f.write(build_header(fields))
+        else:
+            # drop any torn record left by an interrupted write
+            f.seek(0, io.SEEK_END)
+            size = f.tell()
+            f.seek(size - (size - data_offset) % dtype.itemsize)
+            f.truncate()
+        f.write(records.tobytes())
+
+def pack_row(data, fields):
+    record = np.zeros(1, dtype=get_record_dtype(fields))
+    for name in fields:
+        if name == 'DATE':
+            ts = data['DATE'].timestamp
+            if ts is None:
+                ts = timezone.to_timestamp(timezone.now())
+            record[name] = ts
+        else:
+            value = data[name].value
+            record[name] = np.nan if value is None else value
+    return record.tobytes()
+
+def read_records(filename):
+    with io.open(filename, 'rb') as f:
+        fields, data_offset = read_header(f)
+        f.seek(0, io.SEEK_END)
+        size = f.tell()
+    dtype = get_record_dtype(fields)
+    num_records = (size - data_offset) // dtype.itemsize
+    if not num_records:
+        return fields, np.zeros(0, dtype=dtype)
+    records = np.memmap(filename, dtype=dtype, mode='r', offset=data_offset, shape=(num_records,))
+    return fields, records
+
+def read_binlog(filename, start=None, end=None):
+    fields, records = read_records(filename)
+    timestamps = records['DATE']
+    i0, i1 = 0, records.size
+    if start is not None:
+        i0 = np.searchsorted(timestamps, start, side='left')
+    if end is not None:
+        i1 = np.searchsorted(timestamps, end, side='right')
+    records = records[i0:i1]
+    value_fields = [name for name in fields if name != 'DATE']
+    columns = {name:records[name] for name in value_fields}
+    return LogTable(records['DATE'], columns, value_fields)
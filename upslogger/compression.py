@@ -0,0 +1,207 @@
+import os
+import io
+import sys
+import gzip
+import datetime
+import threading
+
+try:
+    import lzma
+except ImportError: # pragma: no cover
+    lzma = None
+
+try:
+    import queue
+except ImportError: # pragma: no cover
+    import Queue as queue
+
+from upslogger.logindex import LogIndex
+from upslogger import timezone
+
+COMPRESSIONS = ['gzip', 'xz']
+COMPRESSION_EXTS = {'gzip':'.gz', 'xz':'.xz'}
+# uncompressed bytes per independently compressed block
+BLOCK_SIZE = 1024 * 1024
+
+def get_compression(filename):
+    for compression, ext in COMPRESSION_EXTS.items():
+        if filename.endswith(ext):
+            return compression
+    return None
+
+def is_compressed(filename):
+    return get_compression(filename) is not None
+
+def strip_compression_ext(filename):
+    compression = get_compression(filename)
+    if compression is None:
+        return filename
+    return filename[:-len(COMPRESSION_EXTS[compression])]
+
+def _check_compression(compression):
+    if compression not in COMPRESSIONS:
+        raise ValueError('Unknown compression: {}'.format(compression))
+    if compression == 'xz' and lzma is None:
+        raise ValueError('xz compression requires the lzma module')
+
+class _GzipReader(gzip.GzipFile):
+    def __init__(self, raw):
+        super(_GzipReader, self).__init__(fileobj=raw, mode='rb')
+        self.raw = raw
+    def close(self):
+        try:
+            super(_GzipReader, self).close()
+        finally:
+            self.raw.close()
+
+if lzma is not None:
+    class _LZMAReader(lzma.LZMAFile):
+        def __init__(self, raw):
+            super(_LZMAReader, self).__init__(raw, mode='rb')
+            self.raw = raw
+        def close(self):
+            try:
+                super(_LZMAReader, self).close()
+            finally:
+                self.raw.close()
+
+def open_file(filename, offset=0):
+    # decompressed byte stream, starting at the block at (compressed) `offset`
+    compression = get_compression(filename)
+    raw = io.open(filename, 'rb')
+    if offset:
+        raw.seek(offset)
+    if compression is None:
+        return raw
+    _check_compression(compression)
+    if compression == 'gzip':
+        return _GzipReader(raw)
+    return _LZMAReader(raw)
+
+def compress_block(data, compression):
+    if compression == 'xz':
+        return lzma.compress(data)
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(data)
+    return buf.getvalue()
+
+def decompress_blocks(data, compression):
+    # whole blocks read from between two index offsets
+    if compression == 'xz':
+        return lzma.decompress(data)
+    with gzip.GzipFile(fileobj=io.BytesIO(data), mode='rb') as f:
+        return f.read()
+
+def _get_block_timestamp(lines):
+    for line in lines:
+        if line.startswith(b'#'):
+            continue
+        try:
+            return timezone.dt_str_to_timestamp(line.decode('UTF-8').split('\t')[0])
+        except (ValueError, IndexError, UnicodeDecodeError):
+            continue
+    return None
+
+def compress_file(filename, compression='gzip', block_size=None, remove=True):
+    # Writes whole lines in independently compressed blocks (gzip members
+    # or xz streams), which any gzip/xz reader sees as one stream. The
+    # first timestamp and offset of every block go into the LogIndex so
+    # date range reads can start at the right block.
+    _check_compression(compression)
+    if block_size is None:
+        block_size = BLOCK_SIZE
+    dst_filename = '{}{}'.format(filename, COMPRESSION_EXTS[compression])
+    tmp_fn = '{}.tmp'.format(dst_filename)
+    entries = []
+    with io.open(filename, 'rb') as fin, io.open(tmp_fn, 'wb') as fout:
+        while True:
+            lines = fin.readlines(block_size)
+            if not len(lines):
+                break
+            ts = _get_block_timestamp(lines)
+            if ts is not None:
+                entries.append((ts, fout.tell()))
+            fout.write(compress_block(b''.join(lines), compression))
+    os.rename(tmp_fn, dst_filename)
+    LogIndex(dst_filename).write_entries(entries)
+    if remove:
+        os.remove(filename)
+        LogIndex(filename).remove()
+    return dst_filename
+
+class BackgroundCompressor(object):
+    def __init__(self, compression='gzip', block_size=None, on_complete=None, on_error=None,
+                 remove=True):
+        _check_compression(compression)
+        self.compression = compression
+        self.block_size = block_size
+        # with remove=False the original is left for on_complete to remove
+        self.remove = remove
+        self.on_complete = on_complete
+        if on_error is None:
+            on_error = self._report_error
+        self.on_error = on_error
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.thread = None
+        self.num_compressed = 0
+        self.num_failed = 0
+    @property
+    def running(self):
+        return self.thread is not None
+    def start(self):
+        if self.running:
+            return
+        self.thread = threading.Thread(target=self._run, name='compressor')
+        self.thread.daemon = True
+        self.thread.start()
+    def stop(self, wait=True):
+        if not self.running:
+            return
+        thread, self.thread = self.thread, None
+        self.queue.put(None)
+        if wait:
+            thread.join()
+    def submit(self, filename):
+        with self.lock:
+            if filename in self.pending:
+                return False
+            self.pending.add(filename)
+        if not self.running:
+            self.start()
+        self.queue.put(filename)
+        return True
+    def wait(self):
+        self.queue.join()
+    def _run(self):
+        while True:
+            filename = self.queue.get()
+            try:
+                if filename is None:
+                    break
+                self._compress(filename)
+            finally:
+                with self.lock:
+                    self.pending.discard(filename)
+                self.queue.task_done()
+    def _compress(self, filename):
+        if not os.path.exists(filename):
+            # already compressed by an earlier submission
+            return
+        try:
+            dst_filename = compress_file(
+                filename, self.compression, self.block_size, remove=self.remove,
+            )
+        except Exception as e:
+            self.num_failed += 1
+            self.on_error(filename, e)
+            return
+        self.num_compressed += 1
+        if self.on_complete is not None:
+            self.on_complete(filename, dst_filename)
+    def _report_error(self, filename, exc):
+        sys.stderr.write('{}: compressing {} failed: {!r}\n'.format(
+            datetime.datetime.now(), filename, exc,
+        ))
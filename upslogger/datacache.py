@@ -0,0 +1,199 @@
+import os
+import sys
+import datetime
+import threading
+
+import numpy as np
+
+from upslogger import logger
+from upslogger.tail import LogTail
+from upslogger.table import LogTable
+from upslogger.watcher import FileWatcher
+
+CACHE_INITIAL_ROWS = 65536
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+class SharedDataCache(object):
+    # Parsed log columns shared by every session in the process. A single
+    # refresh (normally from the background thread) appends new rows,
+    # sessions keep a row cursor and only read what was added after it.
+    def __init__(self, filename=None, on_error=None):
+        if not filename:
+            filename = logger.LOG_FILENAME
+        self.filename = os.path.expanduser(filename)
+        self.lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self.tail = LogTail(self.filename)
+        self.generation = 0
+        self.fields = None
+        self.num_rows = 0
+        self._timestamps = None
+        self._columns = None
+        self.listeners = []
+        self.watcher = None
+        self._thread = None
+        self._stopped = threading.Event()
+        if on_error is None:
+            on_error = self._report_error
+        self.on_error = on_error
+        self.num_failed = 0
+        self.last_error = None
+    def add_listener(self, callback):
+        # called from the refresh thread after rows were added or the cache
+        # was cleared
+        with self.lock:
+            self.listeners.append(callback)
+    def remove_listener(self, callback):
+        with self.lock:
+            if callback in self.listeners:
+                self.listeners.remove(callback)
+    def notify(self):
+        with self.lock:
+            listeners = list(self.listeners)
+        for callback in listeners:
+            callback()
+    def clear(self):
+        with self.lock:
+            self.fields = None
+            self.num_rows = 0
+            self._timestamps = None
+            self._columns = None
+            # sessions holding a cursor from before must reload
+            self.generation += 1
+    def _reserve(self, num_rows):
+        capacity = 0 if self._timestamps is None else self._timestamps.size
+        if num_rows <= capacity:
+            return
+        capacity = max(capacity, CACHE_INITIAL_ROWS)
+        while capacity < num_rows:
+            capacity *= 2
+        timestamps = np.empty(capacity, dtype=np.int64)
+        columns = {name:np.full(capacity, np.nan) for name in self.fields}
+        if self._timestamps is not None:
+            n = self.num_rows
+            timestamps[:n] = self._timestamps[:n]
+            for name in self.fields:
+                columns[name][:n] = self._columns[name][:n]
+        self._timestamps = timestamps
+        self._columns = columns
+    def append_table(self, table):
+        if table is None or not len(table):
+            return 0
+        with self.lock:
+            if self.fields is None:
+                self.fields = list(table.fields)
+            n0 = self.num_rows
+            n1 = n0 + len(table)
+            self._reserve(n1)
+            self._timestamps[n0:n1] = table.timestamps
+            for name in self.fields:
+                self._columns[name][n0:n1] = table.get_column(name)
+            self.num_rows = n1
+        return len(table)
+    def refresh(self):
+        with self._refresh_lock:
+            try:
+                st = os.stat(self.filename)
+            except OSError:
+                return 0
+            cleared = self.tail.check_rotated(st)
+            if cleared:
+                self.tail.reset()
+                self.clear()
+            num_rows = self.append_table(self.tail.read())
+        if cleared or num_rows:
+            self.notify()
+        return num_rows
+    def _get_rows(self, i0, i1):
+        if self.fields is None:
+            return LogTable.empty([])
+        # views into the cache arrays; rows below num_rows never change
+        columns = {name:self._columns[name][i0:i1] for name in self.fields}
+        return LogTable(self._timestamps[i0:i1], columns, self.fields)
+    def get_table(self, start=None, end=None):
+        with self.lock:
+            n = self.num_rows
+            if not n:
+                return self._get_rows(0, 0)
+            timestamps = self._timestamps[:n]
+            i0, i1 = 0, n
+            if start is not None:
+                i0 = np.searchsorted(timestamps, start, side='left')
+            if end is not None:
+                i1 = np.searchsorted(timestamps, end, side='right')
+            return self._get_rows(i0, i1)
+    def get_cursor(self):
+        with self.lock:
+            return (self.generation, self.num_rows)
+    def get_since(self, cursor):
+        # returns (new cursor, rows added since `cursor`). The table is None
+        # if the cache was cleared and the caller has to reload everything
+        with self.lock:
+            generation, row = cursor
+            new_cursor = (self.generation, self.num_rows)
+            if generation != self.generation:
+                return new_cursor, None
+            return new_cursor, self._get_rows(row, self.num_rows)
+    @property
+    def first_ts(self):
+        with self.lock:
+            if not self.num_rows:
+                return None
+            return int(self._timestamps[0])
+    @property
+    def last_ts(self):
+        with self.lock:
+            if not self.num_rows:
+                return None
+            return int(self._timestamps[self.num_rows - 1])
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+    def start(self, interval=1., use_inotify=True):
+        # refreshes as soon as the watcher reports a change, or at least
+        # every `interval` seconds
+        if self.running:
+            return
+        self._stopped.clear()
+        self.watcher = FileWatcher(self.filename, interval, use_inotify)
+        self.watcher.open()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='data-cache')
+        self._thread.daemon = True
+        self._thread.start()
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+    def _run(self, interval):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                # keep refreshing, the next change may well parse
+                self.num_failed += 1
+                self.last_error = e
+                self.on_error(e)
+            self.watcher.wait(interval)
+    def _report_error(self, exc):
+        sys.stderr.write('{}: refreshing {} failed: {!r}\n'.format(
+            datetime.datetime.now(), self.filename, exc,
+        ))
+
+def get_shared_cache(filename=None, refresh_interval=1.):
+    if not filename:
+        filename = logger.LOG_FILENAME
+    filename = os.path.expanduser(filename)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(filename)
+        if cache is None:
+            cache = _CACHES[filename] = SharedDataCache(filename)
+            cache.refresh()
+        if refresh_interval is not None:
+            cache.start(refresh_interval)
+    return cache
@@ -0,0 +1,90 @@
+import numpy as np
+
+from upslogger.table import LogTable
+
+DOWNSAMPLE_METHODS = ['minmax', 'lttb']
+
+def _get_buckets(x, num_buckets, x_range=None):
+    if x_range is None:
+        x0, x1 = x[0], x[-1]
+    else:
+        x0, x1 = x_range
+    span = max(float(x1 - x0), 1.)
+    buckets = ((x - x0) * (num_buckets / span)).astype(np.int64)
+    return np.clip(buckets, 0, num_buckets - 1)
+
+def minmax_indices(x, y, num_buckets, x_range=None):
+    # index of the min and max sample in each of `num_buckets` equal time
+    # buckets, plus the first and last samples. NaN values are never picked
+    valid = np.flatnonzero(~np.isnan(y))
+    if valid.size <= num_buckets * 2:
+        return valid
+    x, y = x[valid], y[valid]
+    # x is sorted, so each bucket is a contiguous run
+    buckets = _get_buckets(x, num_buckets, x_range)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, x.size])
+    idx = [[0, x.size - 1]]
+    for ufunc in [np.minimum, np.maximum]:
+        extremes = np.repeat(ufunc.reduceat(y, starts), counts)
+        matches = np.flatnonzero(y == extremes)
+        _, first = np.unique(buckets[matches], return_index=True)
+        idx.append(matches[first])
+    return valid[np.unique(np.concatenate(idx))]
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets (Steinarsson, 2013)
+    valid = np.flatnonzero(~np.isnan(y))
+    if threshold < 3 or valid.size <= threshold:
+        return valid
+    x = x[valid].astype(np.float64)
+    y = y[valid].astype(np.float64)
+    n = x.size
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    result = np.empty(threshold, dtype=np.int64)
+    result[0] = 0
+    result[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        i0, i1 = edges[i], edges[i + 1]
+        if i + 2 < edges.size:
+            n0, n1 = edges[i + 1], edges[i + 2]
+        else:
+            n0, n1 = n - 1, n
+        avg_x = x[n0:n1].mean()
+        avg_y = y[n0:n1].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[i0:i1] - y[a]) - (x[a] - x[i0:i1]) * (avg_y - y[a])
+        )
+        a = i0 + int(area.argmax())
+        result[i + 1] = a
+    return valid[result]
+
+def get_indices(x, y, num_points, method='minmax', x_range=None):
+    if method == 'minmax':
+        return minmax_indices(x, y, max(num_points // 2, 1), x_range)
+    if method == 'lttb':
+        return lttb_indices(x, y, num_points)
+    raise ValueError('Unknown method: {}'.format(method))
+
+def downsample_table(table, num_points, method='minmax', start=None, end=None, fields=None):
+    # Keeps about `num_points` rows per field, with rows picked by any
+    # field kept for all fields so they can share one time axis
+    if table is None:
+        return None
+    if start is not None or end is not None:
+        table = table.slice_time(start, end)
+    if len(table) <= num_points:
+        return table
+    if fields is None:
+        fields = table.fields
+    x_range = None
+    if start is not None and end is not None:
+        x_range = (start, end)
+    indices = [
+        get_indices(table.timestamps, table[name], num_points, method, x_range)
+        for name in fields if name in table
+    ]
+    if not len(indices):
+        return LogTable.empty(table.fields)
+    return table.take(np.unique(np.concatenate(indices)))
@@ -0,0 +1,163 @@
+import sys
+import time
+import datetime
+import threading
+
+from upslogger.metrics import REGISTRY
+
+try:
+    import queue
+except ImportError: # pragma: no cover
+    import Queue as queue
+
+QUEUED = 'queued'
+COALESCED = 'coalesced'
+DROPPED = 'dropped'
+
+EXPORT_SECONDS = REGISTRY.histogram('upslogger_export_seconds', 'Export run time', ['kind'])
+EXPORT_FAILURES = REGISTRY.counter('upslogger_export_failures_total', 'Failed exports', ['kind'])
+EXPORT_COALESCED = REGISTRY.counter(
+    'upslogger_export_coalesced_total', 'Export requests merged into a pending run', ['kind'],
+)
+EXPORT_DROPPED = REGISTRY.counter(
+    'upslogger_export_dropped_total', 'Export requests dropped with a full queue', ['kind'],
+)
+
+class ExportTask(object):
+    def __init__(self, kind, callback):
+        self.kind = kind
+        self.callback = callback
+        # (args, kwargs) of the latest request not yet picked up by a worker
+        self.pending = None
+        self.running = False
+        self.num_submitted = 0
+        self.num_runs = 0
+        self.num_coalesced = 0
+        self.num_dropped = 0
+        self.num_failed = 0
+        self.last_error = None
+        self.last_duration = None
+    def get_stats(self):
+        return {
+            'submitted':self.num_submitted,
+            'runs':self.num_runs,
+            'coalesced':self.num_coalesced,
+            'dropped':self.num_dropped,
+            'failed':self.num_failed,
+            'last_error':None if self.last_error is None else repr(self.last_error),
+            'last_duration':self.last_duration,
+            'running':self.running,
+        }
+
+class ExportPool(object):
+    def __init__(self, max_workers=2, max_queued=16, on_error=None, on_backpressure=None):
+        self.max_workers = max_workers
+        self.queue = queue.Queue(max_queued)
+        self.lock = threading.Lock()
+        self.tasks = {}
+        self.threads = []
+        if on_error is None:
+            on_error = self._report_error
+        if on_backpressure is None:
+            on_backpressure = self._report_backpressure
+        self.on_error = on_error
+        self.on_backpressure = on_backpressure
+    @property
+    def running(self):
+        return len(self.threads) > 0
+    def register(self, kind, callback):
+        if kind in self.tasks:
+            raise ValueError('Exporter "{}" already registered'.format(kind))
+        task = self.tasks[kind] = ExportTask(kind, callback)
+        return task
+    def start(self):
+        if self.running:
+            return
+        for i in range(self.max_workers):
+            t = threading.Thread(target=self._run_worker, name='export-{}'.format(i))
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+    def stop(self, wait=True):
+        threads, self.threads = self.threads, []
+        for t in threads:
+            self.queue.put(None)
+        if wait:
+            for t in threads:
+                t.join()
+    def submit(self, kind, *args, **kwargs):
+        task = self.tasks[kind]
+        with self.lock:
+            task.num_submitted += 1
+            coalesced = task.pending is not None
+            task.pending = (args, kwargs)
+            if coalesced:
+                task.num_coalesced += 1
+                EXPORT_COALESCED.labels(task.kind).inc()
+                return COALESCED
+            if task.running:
+                # picked up again by the worker when the current run is done
+                return QUEUED
+        return self._enqueue(task)
+    def _enqueue(self, task):
+        try:
+            self.queue.put_nowait(task)
+        except queue.Full:
+            with self.lock:
+                task.pending = None
+                task.num_dropped += 1
+            EXPORT_DROPPED.labels(task.kind).inc()
+            self.on_backpressure(task)
+            return DROPPED
+        return QUEUED
+    def _run_worker(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                break
+            with self.lock:
+                pending, task.pending = task.pending, None
+                task.running = True
+            if pending is not None:
+                self._run_task(task, *pending)
+            with self.lock:
+                task.running = False
+                requeue = task.pending is not None
+            if requeue:
+                self._enqueue(task)
+    def _run_task(self, task, args, kwargs):
+        start_ts = time.time()
+        try:
+            task.callback(*args, **kwargs)
+        except Exception as e:
+            EXPORT_FAILURES.labels(task.kind).inc()
+            task.num_failed += 1
+            task.last_error = e
+            self.on_error(task, e)
+        finally:
+            task.num_runs += 1
+            task.last_duration = time.time() - start_ts
+            EXPORT_SECONDS.labels(task.kind).observe(task.last_duration)
+    def wait(self, timeout=None):
+        # block until nothing is queued or running (used by tests and shutdown)
+        end_ts = None if timeout is None else time.time() + timeout
+        while True:
+            with self.lock:
+                busy = any(t.running or t.pending is not None for t in self.tasks.values())
+            if not busy:
+                return True
+            if end_ts is not None and time.time() >= end_ts:
+                return False
+            time.sleep(.01)
+    def get_stats(self):
+        with self.lock:
+            stats = {kind:task.get_stats() for kind, task in self.tasks.items()}
+        return stats
+    def _report_error(self, task, exc):
+        sys.stderr.write('{}: {} export failed: {!r}\n'.format(
+            datetime.datetime.now(), task.kind, exc,
+        ))
+    def _report_backpressure(self, task):
+        sys.stderr.write('{}: export queue full, dropped {} export ({} total)\n'.format(
+            datetime.datetime.now(), task.kind, task.num_dropped,
+        ))
@@ -1,12 +1,26 @@
 import datetime
+import weakref
 
 from upslogger import timezone
 
 DATE_FIELDS = ['DATE', 'STARTTIME', 'XONBATT', 'XOFFBATT', 'END APC']
+_DATE_FIELD_SET = frozenset(DATE_FIELDS)
 
 
+def _with_metaclass(meta, *bases):
+    # py2/py3 compatible metaclass base (as in six)
+    return meta('FieldBase', bases, {})
 
-class Field(object):
+class FieldMeta(type):
+    # a new subclass can match names that were already looked up (and
+    # missed), so every registry drops its cached lookups
+    registries = weakref.WeakSet()
+    def __init__(cls, name, bases, attrs):
+        super(FieldMeta, cls).__init__(name, bases, attrs)
+        for registry in list(FieldMeta.registries):
+            registry.clear_cache()
+
+class Field(_with_metaclass(FieldMeta, object)):
     name = None
     def __init__(self, value, name=None):
         self.value = value
@@ -30,9 +44,7 @@ class Field(object):
     def from_string(cls, s, name=None):
         _cls = cls
         if name is not None:
-            _cls = cls.find_by_name(name)
-            if _cls is None:
-                _cls = cls
+            _cls = FIELD_REGISTRY.get(name, cls)
         if s == '-':
             s = None
         else:
@@ -51,17 +63,41 @@ class Field(object):
         return self.to_string()
 
 class DateFieldBase(Field):
+    # values are kept as POSIX timestamps and only converted to a
+    # localized datetime when accessed
+    def __init__(self, value, name=None):
+        self._value = None
+        self._timestamp = None
+        super(DateFieldBase, self).__init__(value, name)
+    @property
+    def value(self):
+        if self._value is None and self._timestamp is not None:
+            self._value = timezone.from_timestamp(self._timestamp, 'local')
+        return self._value
+    @value.setter
+    def value(self, value):
+        if isinstance(value, datetime.datetime):
+            self._value = value
+            self._timestamp = None
+        else:
+            self._value = None
+            self._timestamp = value
+    @property
+    def timestamp(self):
+        if self._timestamp is None and self._value is not None:
+            self._timestamp = timezone.to_timestamp(self._value)
+        return self._timestamp
     @classmethod
     def find_by_name(cls, name):
-        if name in DATE_FIELDS:
+        if name in _DATE_FIELD_SET:
             return cls
     @classmethod
     def parse_string(cls, s):
         try:
-            dt = timezone.parse_dt_str(s, 'local')
-        except ValueError:
-            dt = None
-        return dt
+            ts = timezone.dt_str_to_timestamp(s)
+        except (ValueError, IndexError):
+            ts = None
+        return ts
     def to_string(self):
         if self.value is None:
             return '-'
@@ -78,3 +114,65 @@ class LineFreq(Field):
     @classmethod
     def parse_string(cls, s):
         return float(s.lower().strip('hz'))
+
+
+class FieldRegistry(object):
+    def __init__(self):
+        self._registered = {}
+        self._by_name = {}
+        self._decoders = {}
+        FieldMeta.registries.add(self)
+    def register(self, field_cls, name=None):
+        if name is None:
+            name = field_cls.name
+        self._registered[name] = field_cls
+        self.clear_cache()
+    def clear_cache(self):
+        self._by_name.clear()
+        self._decoders.clear()
+    def get(self, name, default=Field):
+        try:
+            field_cls = self._by_name[name]
+        except KeyError:
+            field_cls = self._registered.get(name)
+            if field_cls is None:
+                # resolve once through the subclass tree and remember the
+                # result (until the next subclass is defined)
+                field_cls = Field.find_by_name(name)
+            self._by_name[name] = field_cls
+        if field_cls is None:
+            return default
+        return field_cls
+    def get_row_decoder(self, fields):
+        key = tuple(fields)
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            decoder = self._decoders[key] = RowDecoder(fields, self)
+        return decoder
+
+class RowDecoder(object):
+    def __init__(self, fields, registry=None):
+        if registry is None:
+            registry = FIELD_REGISTRY
+        self.fields = list(fields)
+        self.columns = []
+        for name in self.fields:
+            field_cls = registry.get(name)
+            self.columns.append((name, field_cls, field_cls.parse_string))
+    def decode(self, vals):
+        d = {}
+        num_vals = len(vals)
+        for i, (name, field_cls, parse_string) in enumerate(self.columns):
+            s = vals[i] if i < num_vals else '-'
+            if s == '-':
+                value = None
+            else:
+                value = parse_string(s)
+            d[name] = field_cls(value, name)
+        return d
+
+FIELD_REGISTRY = FieldRegistry()
+
+def register_field(field_cls, name=None):
+    FIELD_REGISTRY.register(field_cls, name)
+    return field_cls
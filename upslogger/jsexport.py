@@ -0,0 +1,257 @@
+import os
+import io
+import copy
+import gzip
+import json
+import time
+import itertools
+
+import numpy as np
+
+from upslogger import logger
+from upslogger import timezone
+from upslogger.table import LogTable
+
+CHUNK_SECONDS = 86400
+JS_LAYOUTS = ['points', 'columnar']
+MANIFEST_KEY = 'manifest.json'
+HEAD_KEY = 'head.json'
+
+def add_table_js_data(js_data, table, dt_type='posix_ts', x_data_key='time', y_data_key='y'):
+    for name in table.fields:
+        ts, values = table.get_series(name)
+        if not ts.size:
+            continue
+        if dt_type == 'posix_ts':
+            x_values = ts.tolist()
+        elif dt_type == 'js_ts':
+            x_values = (ts * 1000).tolist()
+        else:
+            x_values = [
+                timezone.from_timestamp(x, 'local').strftime(timezone.DT_FMT)
+                for x in ts.tolist()
+            ]
+        if name not in js_data:
+            js_data[name] = {
+                'label':name.title(),
+                'values':[],
+            }
+        js_data[name]['values'].extend([
+            {x_data_key:x, y_data_key:y} for x, y in zip(x_values, values.tolist())
+        ])
+    return js_data
+
+def _get_x_array(ts, dt_type):
+    if dt_type == 'posix_ts':
+        return ts
+    if dt_type == 'js_ts':
+        return ts * 1000
+    return [
+        timezone.from_timestamp(x, 'local').strftime(timezone.DT_FMT)
+        for x in ts.tolist()
+    ]
+
+def add_table_js_columns(js_data, table, dt_type='posix_ts'):
+    # collects the arrays per field, build_js_columns() joins them
+    for name in table.fields:
+        ts, values = table.get_series(name)
+        if not ts.size:
+            continue
+        if name not in js_data:
+            js_data[name] = {
+                'label':name.title(),
+                'times':[],
+                'values':[],
+            }
+        js_data[name]['times'].append(_get_x_array(ts, dt_type))
+        js_data[name]['values'].append(values)
+    return js_data
+
+def build_js_columns(js_data, delta_times=False):
+    for name, d in js_data.items():
+        if len(d['times']) and not isinstance(d['times'][0], np.ndarray):
+            if delta_times:
+                raise ValueError('Delta encoding requires numeric timestamps')
+            times = list(itertools.chain.from_iterable(d['times']))
+        else:
+            times = np.concatenate(d['times']) if len(d['times']) else np.empty(0, dtype=np.int64)
+            if delta_times and times.size:
+                times = np.r_[times[:1], np.diff(times)]
+            times = times.tolist()
+        values = np.concatenate(d['values']) if len(d['values']) else np.empty(0)
+        d['times'] = times
+        d['values'] = values.tolist()
+        if delta_times:
+            d['time_encoding'] = 'delta'
+    return js_data
+
+def decode_delta_times(times):
+    return np.cumsum(np.asarray(times, dtype=np.int64)).tolist()
+
+def gzip_bytes(data):
+    fh = io.BytesIO()
+    with gzip.GzipFile(fileobj=fh, mode='wb', mtime=0) as f:
+        f.write(data)
+    return fh.getvalue()
+
+def gunzip_bytes(data):
+    with gzip.GzipFile(fileobj=io.BytesIO(data), mode='rb') as f:
+        return f.read()
+
+class LocalTarget(object):
+    def __init__(self, dirname):
+        self.dirname = os.path.expanduser(dirname)
+    def get_filename(self, key):
+        return os.path.join(self.dirname, key)
+    def put(self, key, data, content_type='application/json', content_encoding='gzip'):
+        fn = self.get_filename(key)
+        if content_encoding == 'gzip':
+            fn = '{}.gz'.format(fn)
+        dirname = os.path.dirname(fn)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        tmp_fn = '{}.tmp'.format(fn)
+        with open(tmp_fn, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_fn, fn)
+    def get(self, key):
+        fn = '{}.gz'.format(self.get_filename(key))
+        if not os.path.exists(fn):
+            return None
+        with open(fn, 'rb') as f:
+            return gunzip_bytes(f.read())
+
+class S3Target(object):
+    def __init__(self, bucket_name, prefix=''):
+        import boto3
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip('/')
+        self.s3 = boto3.client('s3')
+    def get_key(self, key):
+        if not self.prefix:
+            return key
+        return '/'.join([self.prefix, key])
+    def put(self, key, data, content_type='application/json', content_encoding='gzip'):
+        kwargs = dict(
+            Bucket=self.bucket_name,
+            Key=self.get_key(key),
+            Body=data,
+            ContentType=content_type,
+            ACL='public-read',
+        )
+        if content_encoding is not None:
+            kwargs['ContentEncoding'] = content_encoding
+        self.s3.put_object(**kwargs)
+    def get(self, key):
+        try:
+            r = self.s3.get_object(Bucket=self.bucket_name, Key=self.get_key(key))
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        data = r['Body'].read()
+        if r.get('ContentEncoding') == 'gzip':
+            data = gunzip_bytes(data)
+        return data
+
+class ChunkedExporter(object):
+    # Completed time chunks are written once and never touched again, only
+    # the chunk still receiving samples ("head") and the manifest are
+    # rewritten on each export.
+    def __init__(self, target, filename=None, chunk_seconds=CHUNK_SECONDS, **kwargs):
+        self.target = target
+        self.filename = filename
+        self.chunk_seconds = chunk_seconds
+        self.js_kwargs = kwargs
+        self.manifest = None
+        self.num_uploads = 0
+        self.bytes_uploaded = 0
+    def get_chunk_key(self, chunk_start):
+        return 'chunks/{}.json'.format(chunk_start)
+    def load_manifest(self):
+        data = self.target.get(MANIFEST_KEY)
+        manifest = None
+        if data is not None:
+            manifest = json.loads(data.decode('UTF-8'))
+            if manifest.get('chunk_seconds') != self.chunk_seconds:
+                manifest = None
+        if manifest is None:
+            manifest = {
+                'chunk_seconds':self.chunk_seconds,
+                'chunks':[],
+                'head':None,
+                'next_start':None,
+                'updated':None,
+            }
+        return manifest
+    def put_json(self, key, obj):
+        data = gzip_bytes(json.dumps(obj, separators=(',', ':')).encode('UTF-8'))
+        self.target.put(key, data)
+        self.num_uploads += 1
+        self.bytes_uploaded += len(data)
+    def serialize_table(self, table):
+        js_kwargs = self.js_kwargs.copy()
+        layout = js_kwargs.pop('layout', 'points')
+        delta_times = js_kwargs.pop('delta_times', False)
+        if layout == 'columnar':
+            js_data = add_table_js_columns({}, table, **js_kwargs)
+            js_data = build_js_columns(js_data, delta_times)
+        else:
+            js_data = add_table_js_data({}, table, **js_kwargs)
+        return list(js_data.values())
+    def build_entry(self, key, chunk_start, table):
+        return {
+            'key':key,
+            'start':chunk_start,
+            'end':chunk_start + self.chunk_seconds,
+            'rows':len(table),
+            'first':int(table.timestamps[0]),
+            'last':int(table.timestamps[-1]),
+        }
+    def iter_chunks(self, start=None):
+        # yields (chunk_start, table) with whole chunks from the log
+        pending = []
+        pending_start = None
+        for table in logger.iter_logfile_tables(self.filename, start=start):
+            if not len(table):
+                continue
+            chunk_ids = table.timestamps // self.chunk_seconds * self.chunk_seconds
+            bounds = np.flatnonzero(np.r_[True, chunk_ids[1:] != chunk_ids[:-1], True])
+            for i0, i1 in zip(bounds[:-1], bounds[1:]):
+                chunk_start = int(chunk_ids[i0])
+                if pending_start is not None and chunk_start != pending_start:
+                    yield pending_start, LogTable.concat(pending)
+                    pending = []
+                pending_start = chunk_start
+                pending.append(table.take(slice(i0, i1)))
+        if len(pending):
+            yield pending_start, LogTable.concat(pending)
+    def export(self):
+        if self.manifest is None:
+            self.manifest = self.load_manifest()
+        # changes only replace self.manifest once every upload succeeded, so
+        # a failed run is retried from the same state
+        manifest = copy.deepcopy(self.manifest)
+        head = manifest['head']
+        changed = False
+        new_head = None
+        for chunk_start, table in self.iter_chunks(manifest['next_start']):
+            if new_head is not None:
+                # a later chunk exists, so the previous one is complete
+                prev_start, prev_table = new_head
+                key = self.get_chunk_key(prev_start)
+                self.put_json(key, self.serialize_table(prev_table))
+                manifest['chunks'].append(self.build_entry(key, prev_start, prev_table))
+                changed = True
+            new_head = (chunk_start, table)
+        if new_head is not None:
+            chunk_start, table = new_head
+            entry = self.build_entry(HEAD_KEY, chunk_start, table)
+            if entry != head:
+                self.put_json(HEAD_KEY, self.serialize_table(table))
+                manifest['head'] = entry
+                manifest['next_start'] = chunk_start
+                changed = True
+        if changed:
+            manifest['updated'] = int(time.time())
+            self.put_json(MANIFEST_KEY, manifest)
+            self.manifest = manifest
+        return changed
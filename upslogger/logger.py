@@ -1,58 +1,566 @@
 import os
 import io
+import time
+import datetime
 
-from upslogger.fields import Field
+import numpy as np
+
+from upslogger.fields import DateFieldBase, FIELD_REGISTRY
+from upslogger.table import LogTable, LogTableBuilder
+from upslogger.logindex import LogIndex, rebuild_index
+from upslogger import binlog
+from upslogger import sqlitelog
+from upslogger import compression
+from upslogger import timezone
+from upslogger.metrics import REGISTRY
 
 LOG_FILENAME = '~/.apclinev.log'
 LOG_FIELDS = ['DATE', 'LINEV', 'LINEFREQ']
+LOG_FORMATS = ['tsv', 'binary', 'sqlite']
+LOG_FORMAT = 'tsv'
+
+LOG_READ_SIZE = 64 * 1024
+LOG_CHUNK_ROWS = 65536
+LOG_PARSE_BATCH = 4096
+
+NAN = float('nan')
+
+PARSE_ROWS = REGISTRY.counter('upslogger_parse_rows_total', 'Log rows parsed')
+PARSE_SECONDS = REGISTRY.counter('upslogger_parse_seconds_total', 'Time spent parsing log rows')
+WRITER_FLUSH_SECONDS = REGISTRY.histogram(
+    'upslogger_writer_flush_seconds', 'Time to write (and fsync) buffered log rows',
+)
+WRITER_ROWS = REGISTRY.counter('upslogger_writer_rows_total', 'Rows written to logs')
+
+def get_log_data(status):
+    for name in LOG_FIELDS:
+        if name not in status:
+            return None
+    dt = status.get('DATE')
+    if dt is None or dt.value is None:
+        dt = timezone.now('local')
+        status['DATE'] = DateFieldBase(dt, 'DATE')
+    return status
 
-def log_linev(data, filename=None):
+def get_log_format(filename, log_format=None):
+    if os.path.exists(filename) and os.path.getsize(filename):
+        if binlog.is_binlog(filename):
+            return 'binary'
+        if sqlitelog.is_sqlite(filename):
+            return 'sqlite'
+        return 'tsv'
+    if log_format is not None:
+        return log_format
+    if filename.endswith(binlog.BINLOG_EXT):
+        return 'binary'
+    if filename.endswith(sqlitelog.SQLITE_EXT):
+        return 'sqlite'
+    return LOG_FORMAT
+
+FSYNC_POLICIES = ['never', 'flush', 'close']
+
+class LogWriter(object):
+    def __init__(self, filename=None, log_format=None, flush_rows=1,
+                 flush_interval=None, fsync='never', fields=None, host=None, on_flush=None):
+        self.filename = get_filename(filename)
+        self.log_format = log_format
+        # only used by sqlite logs, which can hold samples from several hosts
+        self.host = host
+        if fields is None:
+            fields = LOG_FIELDS
+        self.fields = list(fields)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError('Unknown fsync policy: {}'.format(fsync))
+        self.fsync = fsync
+        # called after buffered rows reach the log
+        self.on_flush = on_flush
+        self.fh = None
+        self.db = None
+        self.index = None
+        self.buffer = []
+        self.last_flush = None
+    @property
+    def is_open(self):
+        return self.fh is not None or self.db is not None
+    def open(self):
+        if self.is_open:
+            return
+        dirname = os.path.dirname(self.filename)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        self.log_format = get_log_format(self.filename, self.log_format)
+        if self.log_format == 'sqlite':
+            synchronous = 'FULL' if self.fsync != 'never' else 'NORMAL'
+            self.db = sqlitelog.SQLiteLog(self.filename, synchronous)
+            self.db.open(self.fields)
+            self.last_flush = time.time()
+            return
+        self.fh = io.open(self.filename, 'a+b')
+        self.fh.seek(0, io.SEEK_END)
+        if self.fh.tell() == 0:
+            if self.log_format == 'binary':
+                header = binlog.build_header(self.fields)
+            else:
+                header = '{}\n'.format('\t'.join(['#fields:'] + self.fields)).encode('UTF-8')
+            self.fh.write(header)
+            self.fh.flush()
+        else:
+            self.recover()
+        if self.log_format != 'binary':
+            self.index = LogIndex(self.filename)
+        self.last_flush = time.time()
+    def recover(self):
+        # drop a torn final row left by a crash or an interrupted write
+        fh = self.fh
+        fh.seek(0, io.SEEK_END)
+        size = fh.tell()
+        if self.log_format == 'binary':
+            fields, data_offset = binlog.read_header(fh)
+            if fields != self.fields:
+                raise binlog.BinaryLogError('Field mismatch: {} != {}'.format(fields, self.fields))
+            itemsize = binlog.get_record_dtype(fields).itemsize
+            torn = (size - data_offset) % itemsize
+            if torn:
+                fh.truncate(size - torn)
+            return
+        # the usual case (a clean last row) costs a one byte read, so
+        # log_linev() can keep opening a writer per sample
+        fh.seek(size - 1)
+        if fh.read(1) == b'\n':
+            return
+        fh.seek(max(size - LOG_READ_SIZE, 0))
+        tail = fh.read()
+        line = tail[tail.rfind(b'\n') + 1:]
+        if self._is_complete_line(line):
+            fh.write(b'\n')
+        else:
+            fh.truncate(size - len(line))
+        fh.flush()
+    def _is_complete_line(self, line):
+        try:
+            line = line.decode('UTF-8')
+        except UnicodeDecodeError:
+            return False
+        if line.startswith('#'):
+            return True
+        vals = line.split('\t')
+        if len(vals) != len(self.fields):
+            return False
+        try:
+            timezone.dt_str_to_timestamp(vals[self.fields.index('DATE')])
+        except (ValueError, IndexError):
+            return False
+        return True
+    def write(self, data):
+        if not self.is_open:
+            self.open()
+        if self.log_format == 'sqlite':
+            s = sqlitelog.pack_row(data, self.fields, self.host)
+        elif self.log_format == 'binary':
+            s = binlog.pack_row(data, self.fields)
+        else:
+            s = '{}\n'.format('\t'.join([str(data[name]) for name in self.fields]))
+            s = s.encode('UTF-8')
+        self.buffer.append((data['DATE'].timestamp, s))
+        if self.should_flush():
+            self.flush()
+    def should_flush(self):
+        if not len(self.buffer):
+            return False
+        if len(self.buffer) >= self.flush_rows:
+            return True
+        if self.flush_interval is not None:
+            return time.time() - self.last_flush >= self.flush_interval
+        return False
+    def maybe_flush(self):
+        if self.should_flush():
+            self.flush()
+    def flush(self):
+        self.last_flush = time.time()
+        if not len(self.buffer) or not self.is_open:
+            return
+        buffer, self.buffer = self.buffer, []
+        with WRITER_FLUSH_SECONDS.time():
+            if self.db is not None:
+                self.db.insert_rows([row for ts, row in buffer], self.fields)
+            else:
+                self._write_buffer(buffer)
+        WRITER_ROWS.inc(len(buffer))
+        if self.on_flush is not None:
+            self.on_flush()
+    def _write_buffer(self, buffer):
+        fh = self.fh
+        fh.seek(0, io.SEEK_END)
+        offset = fh.tell()
+        fh.write(b''.join([s for ts, s in buffer]))
+        fh.flush()
+        if self.fsync == 'flush':
+            os.fsync(fh.fileno())
+        if self.index is not None:
+            for ts, s in buffer:
+                if ts is not None:
+                    self.index.update(ts, offset)
+                offset += len(s)
+    def close(self):
+        if not self.is_open:
+            return
+        try:
+            self.flush()
+            if self.fh is not None and self.fsync != 'never':
+                os.fsync(self.fh.fileno())
+        finally:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+            else:
+                self.fh.close()
+                self.fh = None
+            self.index = None
+    def __enter__(self):
+        self.open()
+        return self
+    def __exit__(self, *args):
+        self.close()
+
+def log_linev(data, filename=None, log_format=None, host=None):
+    with LogWriter(filename, log_format, host=host) as writer:
+        writer.write(data)
+
+def get_filename(filename=None):
     if not filename:
         filename = LOG_FILENAME
-    filename = os.path.expanduser(filename)
-    if not os.path.exists(os.path.dirname(filename)):
-        os.makedirs(os.path.dirname(filename))
+    return os.path.expanduser(filename)
+
+def _get_timestamp(dt):
+    if dt is None:
+        return None
+    if isinstance(dt, datetime.datetime):
+        if dt.tzinfo is None:
+            dt = timezone.make_aware(dt, 'local')
+        return timezone.to_timestamp(dt)
+    return dt
+
+def iter_lines(f, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = LOG_READ_SIZE
+    remainder = ''
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            break
+        lines = (remainder + data).split('\n')
+        remainder = lines.pop()
+        for line in lines:
+            yield line
+    if remainder:
+        yield remainder
+
+def read_header(filename=None):
+    filename = get_filename(filename)
+    fields, f = _open_logfile(filename)
+    f.close()
+    return fields
+
+def _open_logfile(filename, start=None):
+    f = compression.open_file(filename)
+    fields = LogLineParser.parse_header(f.readline().decode('UTF-8'))
+    if fields is None:
+        f.seek(0)
+    if start is not None:
+        offset = LogIndex(filename).find_offset(start)
+        if compression.is_compressed(filename):
+            # index offsets point at compressed blocks, which always start
+            # after the header
+            if offset:
+                f.close()
+                f = compression.open_file(filename, offset)
+        elif offset is not None and offset > f.tell():
+            f.seek(offset)
+    return fields, io.TextIOWrapper(f, encoding='UTF-8')
+
+def _add_header(filename):
+    tmp_fn = '{}.tmp'.format(filename)
+    header = ['#fields:']
+    header.extend(LOG_FIELDS)
+    with open(filename, 'r') as fin:
+        with open(tmp_fn, 'w') as fout:
+            fout.write('\t'.join(header))
+            for line in iter_lines(fin):
+                fout.write('\n')
+                fout.write(line)
+    os.rename(tmp_fn, filename)
+    LogIndex(filename).remove()
+
+def iter_logfile(filename=None, start=None, end=None, host=None):
+    filename = get_filename(filename)
     if not os.path.exists(filename):
-        with open(filename, 'w') as f:
-            header = ['#fields:']
-            header.extend(LOG_FIELDS)
-            header = '\t'.join(header)
-            f.write('{}\n'.format(header))
-    s = '{}\n'.format('\t'.join([str(data[name]) for name in LOG_FIELDS]))
-    with open(filename, 'a') as f:
-        f.write(s)
-
-def parse_logfile(filename=None):
-    if not filename:
-        filename = LOG_FILENAME
-    filename = os.path.expanduser(filename)
+        return
+    start, end = _get_timestamp(start), _get_timestamp(end)
+    if os.path.isdir(filename):
+        from upslogger.segments import SegmentedLog
+        for d in SegmentedLog(filename).iter_rows(start, end):
+            yield d
+        return
+    if binlog.is_binlog(filename):
+        for d in _iter_table_rows(binlog.read_binlog(filename, start, end)):
+            yield d
+        return
+    if sqlitelog.is_sqlite(filename):
+        for table in sqlitelog.iter_tables(filename, start, end, host=host):
+            for d in _iter_table_rows(table):
+                yield d
+        return
+    fields, f = _open_logfile(filename, start)
+    if fields is None:
+        fields = LOG_FIELDS
+    decoder = FIELD_REGISTRY.get_row_decoder(fields)
+    # counted like LogLineParser: rows kept and the time spent decoding
+    num_rows, parse_seconds = 0, 0.
+    try:
+        with f:
+            for line in iter_lines(f):
+                if not line:
+                    continue
+                start_ts = time.time()
+                d = decoder.decode(line.split('\t'))
+                parse_seconds += time.time() - start_ts
+                if start is not None or end is not None:
+                    dt = d.get('DATE')
+                    ts = None if dt is None else dt.timestamp
+                    if ts is None:
+                        continue
+                    if start is not None and ts < start:
+                        continue
+                    if end is not None and ts > end:
+                        break
+                num_rows += 1
+                yield d
+    finally:
+        PARSE_ROWS.inc(num_rows)
+        PARSE_SECONDS.inc(parse_seconds)
+
+def _iter_table_rows(table):
+    field_classes = []
+    for name in table.fields:
+        field_classes.append((name, FIELD_REGISTRY.get(name)))
+    for i0 in range(0, len(table), LOG_CHUNK_ROWS):
+        chunk = table.take(slice(i0, i0 + LOG_CHUNK_ROWS))
+        columns = [chunk[name].tolist() for name in chunk.fields]
+        for i, ts in enumerate(chunk.timestamps.tolist()):
+            d = {'DATE':DateFieldBase(timezone.from_timestamp(ts, 'local'), 'DATE')}
+            for (name, field_cls), col in zip(field_classes, columns):
+                value = col[i]
+                if value != value:
+                    value = None
+                d[name] = field_cls(value, name)
+            yield d
+
+def parse_logfile(filename=None, start=None, end=None, host=None):
+    filename = get_filename(filename)
     if not os.path.exists(filename):
         return None
-    with open(filename, 'r') as f:
-        s = f.read()
-    fields = None
-    l = []
-    for line in s.splitlines():
+    if os.path.isdir(filename) or binlog.is_binlog(filename) or sqlitelog.is_sqlite(filename):
+        return list(iter_logfile(filename, start, end, host))
+    if read_header(filename) is None and not compression.is_compressed(filename):
+        _add_header(filename)
+    return list(iter_logfile(filename, start, end))
+
+def _get_column_parser(field_name):
+    field_cls = FIELD_REGISTRY.get(field_name)
+    parse_string = field_cls.parse_string
+    def parse_value(s):
+        if s == '-':
+            return NAN
+        try:
+            return float(parse_string(s))
+        except (ValueError, TypeError):
+            return NAN
+    return parse_value
+
+def _parse_column(values, parser):
+    try:
+        return np.array(['nan' if s == '-' else s for s in values], dtype=np.float64)
+    except ValueError:
+        return np.array([parser(s) for s in values], dtype=np.float64)
+
+class LogLineParser(object):
+    def __init__(self, fields=None):
         if fields is None:
-            if line.startswith('#fields:'):
-                fields = line.split('\t')[1:]
-        else:
+            fields = LOG_FIELDS
+        self.fields = list(fields)
+        self.num_fields = len(self.fields)
+        self.date_index = self.fields.index('DATE')
+        self.value_fields = [name for name in self.fields if name != 'DATE']
+        self.parsers = [
+            (i, _get_column_parser(name)) for i, name in enumerate(self.fields)
+            if name != 'DATE'
+        ]
+        self.builder = LogTableBuilder(self.value_fields)
+    @staticmethod
+    def parse_header(line):
+        if line.startswith('#fields:'):
+            return line.rstrip('\r\n').split('\t')[1:]
+    def parse_line(self, line, start=None, end=None):
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('#'):
+            return
+        vals = line.split('\t')
+        if len(vals) < self.num_fields:
+            vals.extend(['-'] * (self.num_fields - len(vals)))
+        try:
+            ts = timezone.dt_str_to_timestamp(vals[self.date_index])
+        except (ValueError, IndexError):
+            return
+        if start is not None and ts < start:
+            return ts
+        if end is not None and ts > end:
+            return ts
+        self.builder.append(ts, [parser(vals[i]) for i, parser in self.parsers])
+        return ts
+    def parse_lines(self, lines, start=None, end=None):
+        start_ts = time.time()
+        try:
+            return self._parse_lines(lines, start, end)
+        finally:
+            PARSE_SECONDS.inc(time.time() - start_ts)
+    def _parse_lines(self, lines, start=None, end=None):
+        rows = []
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if not line or line.startswith('#'):
+                continue
             vals = line.split('\t')
-            d = {}
-            for i, field_name in enumerate(fields):
-                try:
-                    val = vals[i]
-                except IndexError:
-                    val = '-'
-                field = Field.from_string(val, field_name)
-                d[field_name] = field
-            l.append(d)
-    if fields is None:
-        fields = ['#fields:']
-        fields.extend(LOG_FIELDS)
-        lines = ['\t'.join(fields)]
-        lines.extend(s.splitlines())
-        with open(filename, 'w') as f:
-            f.write('\n'.join(lines))
-        return parse_logfile(filename)
-    return l
+            if len(vals) < self.num_fields:
+                vals.extend(['-'] * (self.num_fields - len(vals)))
+            rows.append(vals)
+        if not len(rows):
+            return None
+        date_index = self.date_index
+        timestamps = timezone.dt_strs_to_timestamps([vals[date_index] for vals in rows])
+        mask = timestamps != timezone.INVALID_TIMESTAMP
+        if not mask.any():
+            return None
+        last_ts = int(timestamps[mask].max())
+        if start is not None:
+            mask &= timestamps >= start
+        if end is not None:
+            mask &= timestamps <= end
+        if not mask.all():
+            rows = [rows[i] for i in np.flatnonzero(mask).tolist()]
+        columns = [
+            _parse_column([vals[i] for vals in rows], parser) for i, parser in self.parsers
+        ]
+        self.builder.extend(timestamps[mask], columns)
+        PARSE_ROWS.inc(len(rows))
+        return last_ts
+    def build(self):
+        table = self.builder.build()
+        self.builder = LogTableBuilder(self.value_fields)
+        return table
+
+def iter_logfile_tables(filename=None, start=None, end=None, chunk_rows=None, host=None):
+    filename = get_filename(filename)
+    if not os.path.exists(filename):
+        return
+    if chunk_rows is None:
+        chunk_rows = LOG_CHUNK_ROWS
+    start, end = _get_timestamp(start), _get_timestamp(end)
+    if os.path.isdir(filename):
+        from upslogger.segments import SegmentedLog
+        for table in SegmentedLog(filename).iter_tables(start, end, chunk_rows):
+            yield table
+        return
+    if binlog.is_binlog(filename):
+        table = binlog.read_binlog(filename, start, end)
+        for i0 in range(0, max(len(table), 1), chunk_rows):
+            yield table.take(slice(i0, i0 + chunk_rows))
+        return
+    if sqlitelog.is_sqlite(filename):
+        for table in sqlitelog.iter_tables(filename, start, end, chunk_rows, host):
+            yield table
+        return
+    fields, f = _open_logfile(filename, start)
+    parser = LogLineParser(fields)
+    batch_size = min(chunk_rows, LOG_PARSE_BATCH)
+    with f:
+        lines = []
+        for line in iter_lines(f):
+            lines.append(line)
+            if len(lines) < batch_size:
+                continue
+            ts = parser.parse_lines(lines, start, end)
+            lines = []
+            if ts is not None and end is not None and ts > end:
+                break
+            for table in _take_full_chunks(parser, chunk_rows):
+                yield table
+        parser.parse_lines(lines, start, end)
+    for table in _take_full_chunks(parser, chunk_rows):
+        yield table
+    yield parser.build()
+
+def _take_full_chunks(parser, chunk_rows):
+    # a parsed batch can run past chunk_rows, the rows after the last full
+    # chunk go back into the builder
+    if len(parser.builder) < chunk_rows:
+        return
+    table = parser.build()
+    num_full = len(table) // chunk_rows * chunk_rows
+    for i0 in range(0, num_full, chunk_rows):
+        yield table.take(slice(i0, i0 + chunk_rows))
+    rest = table.take(slice(num_full, None))
+    parser.builder.extend(rest.timestamps, [rest[name] for name in rest.fields])
+
+def parse_logfile_table(filename=None, start=None, end=None, host=None):
+    filename = get_filename(filename)
+    if not os.path.exists(filename):
+        return None
+    if binlog.is_binlog(filename):
+        start, end = _get_timestamp(start), _get_timestamp(end)
+        return binlog.read_binlog(filename, start, end)
+    if sqlitelog.is_sqlite(filename):
+        start, end = _get_timestamp(start), _get_timestamp(end)
+        return sqlitelog.read_table(filename, start, end, host)
+    return LogTable.concat(iter_logfile_tables(filename, start, end))
+
+def convert_logfile(src_filename, dst_filename, log_format=None, host=None):
+    src_filename = os.path.expanduser(src_filename)
+    dst_filename = os.path.expanduser(dst_filename)
+    src_format = get_log_format(src_filename)
+    if log_format is None:
+        log_format = get_log_format(dst_filename)
+        if log_format == src_format:
+            log_format = 'tsv' if src_format == 'binary' else 'binary'
+    if log_format == 'sqlite':
+        # imports can add hosts to an existing database
+        with sqlitelog.SQLiteLog(dst_filename) as db:
+            for table in iter_logfile_tables(src_filename):
+                if len(table):
+                    db.append_table(table, host)
+        return
+    if os.path.exists(dst_filename):
+        raise Exception('Destination file exists: {}'.format(dst_filename))
+    tables = iter_logfile_tables(src_filename)
+    if log_format == 'binary':
+        fields = None
+        for table in tables:
+            if fields is None:
+                fields = ['DATE'] + table.fields
+            binlog.append_table(dst_filename, table, fields)
+        return
+    with open(dst_filename, 'w') as f:
+        fields = None
+        for table in tables:
+            if fields is None:
+                fields = ['DATE'] + table.fields
+                f.write('{}\n'.format('\t'.join(['#fields:'] + fields)))
+            columns = [table[name] for name in table.fields]
+            for i, ts in enumerate(table.timestamps.tolist()):
+                vals = [timezone.from_timestamp(ts, 'local').strftime(timezone.DT_FMT)]
+                for col in columns:
+                    value = col[i]
+                    vals.append('-' if np.isnan(value) else str(value))
+                f.write('{}\n'.format('\t'.join(vals)))
+    rebuild_index(dst_filename)
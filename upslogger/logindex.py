@@ -0,0 +1,151 @@
+import os
+import io
+import bisect
+
+from upslogger import timezone
+
+INDEX_STRIDE = 64 * 1024
+INDEX_HEADER = '#index:\tTIMESTAMP\tOFFSET'
+
+class LogIndex(object):
+    def __init__(self, log_filename, stride=None):
+        self.log_filename = log_filename
+        self.index_filename = '{}.idx'.format(log_filename)
+        if stride is None:
+            stride = INDEX_STRIDE
+        self.stride = stride
+        self._timestamps = None
+        self._offsets = None
+        self._last_entry = None
+    @property
+    def exists(self):
+        return os.path.exists(self.index_filename)
+    def load(self):
+        timestamps = []
+        offsets = []
+        if self.exists:
+            with open(self.index_filename, 'r') as f:
+                for line in f:
+                    if line.startswith('#'):
+                        continue
+                    ts, offset = line.rstrip('\n').split('\t')
+                    timestamps.append(int(ts))
+                    offsets.append(int(offset))
+        self._timestamps = timestamps
+        self._offsets = offsets
+        if len(offsets):
+            self._last_entry = (timestamps[-1], offsets[-1])
+    def get_entries(self):
+        if self._offsets is None:
+            self.load()
+        return list(zip(self._timestamps, self._offsets))
+    def get_last_entry(self):
+        if self._last_entry is not None:
+            return self._last_entry
+        if not self.exists:
+            return None
+        with open(self.index_filename, 'rb') as f:
+            f.seek(0, io.SEEK_END)
+            size = f.tell()
+            f.seek(max(size - 256, 0))
+            lines = f.read().decode('UTF-8').splitlines()
+        if not len(lines) or lines[-1].startswith('#'):
+            return None
+        ts, offset = lines[-1].split('\t')
+        self._last_entry = (int(ts), int(offset))
+        return self._last_entry
+    def add_entry(self, ts, offset):
+        ts = int(ts)
+        exists = self.exists
+        with open(self.index_filename, 'a') as f:
+            if not exists:
+                f.write('{}\n'.format(INDEX_HEADER))
+            f.write('{}\t{}\n'.format(ts, offset))
+        self._last_entry = (ts, offset)
+        if self._offsets is not None:
+            self._timestamps.append(ts)
+            self._offsets.append(offset)
+    def update(self, ts, offset):
+        last_entry = self.get_last_entry()
+        if last_entry is not None:
+            last_ts, last_offset = last_entry
+            if offset < last_offset:
+                # log was truncated or replaced
+                self.remove()
+            elif offset - last_offset < self.stride:
+                return False
+        self.add_entry(ts, offset)
+        return True
+    def remove(self):
+        if self.exists:
+            os.remove(self.index_filename)
+        self._timestamps = None
+        self._offsets = None
+        self._last_entry = None
+    def write_entries(self, entries):
+        # replace the index with (timestamp, offset) pairs
+        self.remove()
+        tmp_fn = '{}.tmp'.format(self.index_filename)
+        with open(tmp_fn, 'w') as f:
+            f.write('{}\n'.format(INDEX_HEADER))
+            for ts, offset in entries:
+                f.write('{}\t{}\n'.format(int(ts), offset))
+        os.rename(tmp_fn, self.index_filename)
+    def rebuild(self):
+        self.remove()
+        self._timestamps = []
+        self._offsets = []
+        tmp_fn = '{}.tmp'.format(self.index_filename)
+        last_offset = None
+        with io.open(self.log_filename, 'rb') as fin, open(tmp_fn, 'w') as fout:
+            fout.write('{}\n'.format(INDEX_HEADER))
+            offset = 0
+            for line in fin:
+                line_offset = offset
+                offset += len(line)
+                if line.startswith(b'#'):
+                    continue
+                if last_offset is not None and line_offset - last_offset < self.stride:
+                    continue
+                dt_str = line.decode('UTF-8').split('\t')[0]
+                try:
+                    ts = timezone.dt_str_to_timestamp(dt_str)
+                except (ValueError, IndexError):
+                    continue
+                fout.write('{}\t{}\n'.format(ts, line_offset))
+                self._timestamps.append(ts)
+                self._offsets.append(line_offset)
+                last_offset = line_offset
+        os.rename(tmp_fn, self.index_filename)
+        if len(self._offsets):
+            self._last_entry = (self._timestamps[-1], self._offsets[-1])
+    def find_offset(self, ts):
+        if self._offsets is None:
+            self.load()
+        if not len(self._offsets):
+            return None
+        if self._offsets[-1] >= os.path.getsize(self.log_filename):
+            # stale index
+            return None
+        i = bisect.bisect_left(self._timestamps, ts) - 1
+        if i < 0:
+            return None
+        return self._offsets[i]
+    def find_end_offset(self, ts):
+        # offset of the first indexed row after `ts` (rows past it are later)
+        if self._offsets is None:
+            self.load()
+        if not len(self._offsets):
+            return None
+        if self._offsets[-1] >= os.path.getsize(self.log_filename):
+            return None
+        i = bisect.bisect_right(self._timestamps, ts)
+        if i >= len(self._offsets):
+            return None
+        return self._offsets[i]
+
+def rebuild_index(log_filename, stride=None):
+    log_filename = os.path.expanduser(log_filename)
+    index = LogIndex(log_filename, stride)
+    index.rebuild()
+    return index
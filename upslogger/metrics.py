@@ -0,0 +1,274 @@
+import time
+import bisect
+import datetime
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError: # pragma: no cover
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+# seconds, from a fast local socket up to a slow upload
+DEFAULT_BUCKETS = [.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60.]
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra is not None:
+        pairs.append(extra)
+    if not len(pairs):
+        return ''
+    s = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return '{{{}}}'.format(s)
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Metric(object):
+    metric_type = None
+    def __init__(self, name, description='', label_names=None):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names or [])
+        self.lock = threading.Lock()
+        self.children = {}
+    def labels(self, *args, **kwargs):
+        if kwargs:
+            args = tuple(kwargs[name] for name in self.label_names)
+        if len(args) != len(self.label_names):
+            raise ValueError('{} expects labels {}'.format(self.name, self.label_names))
+        key = tuple(str(v) for v in args)
+        with self.lock:
+            child = self.children.get(key)
+            if child is None:
+                child = self.children[key] = self._build_child()
+        return child
+    def _get_default(self):
+        if len(self.label_names):
+            raise ValueError('{} requires labels {}'.format(self.name, self.label_names))
+        return self.labels()
+    def _build_child(self):
+        raise NotImplementedError()
+    def iter_children(self):
+        with self.lock:
+            items = sorted(self.children.items())
+        return items
+    def render(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.description),
+            '# TYPE {} {}'.format(self.name, self.metric_type),
+        ]
+        for key, child in self.iter_children():
+            lines.extend(self._render_child(key, child))
+        return lines
+
+class _Value(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.
+    def inc(self, amount=1.):
+        with self.lock:
+            self.value += amount
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+class Counter(Metric):
+    metric_type = 'counter'
+    def _build_child(self):
+        return _Value()
+    def inc(self, amount=1.):
+        self._get_default().inc(amount)
+    def get_value(self, *args):
+        return self.labels(*args).value
+    def _render_child(self, key, child):
+        return ['{}{} {}'.format(
+            self.name, _format_labels(self.label_names, key), _format_value(child.value),
+        )]
+
+class Gauge(Counter):
+    metric_type = 'gauge'
+    def set(self, value):
+        self._get_default().set(value)
+
+class _HistogramValue(object):
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.
+        self.min = None
+        self.max = None
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            if i < len(self.counts):
+                self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+    def time(self):
+        return Timer(self)
+    def get_quantile(self, q):
+        # upper bound of the bucket holding the q-th observation
+        with self.lock:
+            if not self.count:
+                return None
+            target = q * self.count
+            total = 0
+            for bound, count in zip(self.buckets, self.counts):
+                total += count
+                if total >= target:
+                    return min(bound, self.max)
+            return self.max
+
+class Timer(object):
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start_ts = None
+        self.duration = None
+    def __enter__(self):
+        self.start_ts = time.time()
+        return self
+    def __exit__(self, *args):
+        self.duration = time.time() - self.start_ts
+        self.histogram.observe(self.duration)
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+    def __init__(self, name, description='', label_names=None, buckets=None):
+        if buckets is None:
+            buckets = DEFAULT_BUCKETS
+        self.buckets = sorted(buckets)
+        super(Histogram, self).__init__(name, description, label_names)
+    def _build_child(self):
+        return _HistogramValue(self.buckets)
+    def observe(self, value):
+        self._get_default().observe(value)
+    def time(self):
+        return Timer(self._get_default())
+    def _render_child(self, key, child):
+        lines = []
+        total = 0
+        with child.lock:
+            counts = list(child.counts)
+            count, value_sum = child.count, child.sum
+        for bound, n in zip(self.buckets, counts):
+            total += n
+            lines.append('{}_bucket{} {}'.format(
+                self.name, _format_labels(self.label_names, key, ('le', _format_value(bound))),
+                total,
+            ))
+        lines.append('{}_bucket{} {}'.format(
+            self.name, _format_labels(self.label_names, key, ('le', '+Inf')), count,
+        ))
+        labels = _format_labels(self.label_names, key)
+        lines.append('{}_sum{} {}'.format(self.name, labels, _format_value(value_sum)))
+        lines.append('{}_count{} {}'.format(self.name, labels, count))
+        return lines
+
+class MetricsRegistry(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError('{} already registered as {}'.format(name, metric.metric_type))
+        return metric
+    def counter(self, name, description='', label_names=None):
+        return self._get_or_create(Counter, name, description, label_names)
+    def gauge(self, name, description='', label_names=None):
+        return self._get_or_create(Gauge, name, description, label_names)
+    def histogram(self, name, description='', label_names=None, buckets=None):
+        return self._get_or_create(Histogram, name, description, label_names, buckets)
+    def get(self, name):
+        return self.metrics.get(name)
+    def render(self):
+        with self.lock:
+            metrics = [self.metrics[name] for name in sorted(self.metrics.keys())]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+    def get_summary_lines(self):
+        with self.lock:
+            metrics = [self.metrics[name] for name in sorted(self.metrics.keys())]
+        lines = []
+        for metric in metrics:
+            for key, child in metric.iter_children():
+                name = '{}{}'.format(metric.name, _format_labels(metric.label_names, key))
+                if isinstance(metric, Histogram):
+                    if not child.count:
+                        continue
+                    lines.append(
+                        '{} count={} mean={:.4f} p50<={:.4f} p99<={:.4f} max={:.4f}'.format(
+                            name, child.count, child.sum / child.count,
+                            child.get_quantile(.5), child.get_quantile(.99), child.max,
+                        )
+                    )
+                else:
+                    lines.append('{} {}'.format(name, _format_value(child.value)))
+        return lines
+    def log_summary(self, fh=None):
+        now = datetime.datetime.now()
+        lines = ['{}: metrics {}'.format(now, line) for line in self.get_summary_lines()]
+        if not len(lines):
+            return
+        if fh is None:
+            print('\n'.join(lines))
+        else:
+            fh.write('\n'.join(lines) + '\n')
+
+REGISTRY = MetricsRegistry()
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+    def do_GET(self):
+        if self.path.split('?')[0] not in ['/', '/metrics']:
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('UTF-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *args):
+        pass
+
+class MetricsServer(object):
+    def __init__(self, port=0, host='127.0.0.1', registry=None):
+        if registry is None:
+            registry = REGISTRY
+        handler = type('MetricsHandler', (MetricsHandler,), {'registry':registry})
+        self.server = HTTPServer((host, port), handler)
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = None
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics-http')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+def start_http_server(port, host='127.0.0.1', registry=None):
+    return MetricsServer(port, host, registry).start()
@@ -0,0 +1,141 @@
+import sys
+import time
+import socket
+import struct
+
+from upslogger.fields import Field
+from upslogger.metrics import REGISTRY
+
+PY3 = sys.version_info.major >= 3
+
+NIS_PORT = 3551
+
+NIS_REQUEST_SECONDS = REGISTRY.histogram(
+    'upslogger_nis_request_seconds', 'NIS command round trip time', ['host'],
+)
+NIS_CONNECTS = REGISTRY.counter(
+    'upslogger_nis_connects_total', 'New NIS connections', ['host'],
+)
+NIS_ERRORS = REGISTRY.counter(
+    'upslogger_nis_errors_total', 'NIS connection and read errors', ['host'],
+)
+
+def get_host_label(hostname, port):
+    return '{}:{}'.format(hostname, port)
+
+class NISError(Exception):
+    pass
+
+class NISConnectionError(NISError):
+    pass
+
+def build_frame(cmd):
+    if PY3 and not isinstance(cmd, bytes):
+        cmd = cmd.encode('UTF-8')
+    return struct.pack('>H', len(cmd)) + cmd
+
+def parse_status_lines(lines):
+    d = {}
+    for line in lines:
+        if ':' in line:
+            key = line.split(':')[0].strip(' ')
+            val = ':'.join(line.split(':')[1:]).strip(' ')
+            field = Field.from_string(val, key)
+            d[key] = field
+    return d
+
+class NISClient(object):
+    def __init__(self, hostname='localhost', port=NIS_PORT, timeout=10.,
+                 min_backoff=1., max_backoff=60.):
+        self.hostname = hostname
+        self.port = port
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.sock = None
+        self.backoff = 0.
+        self.next_connect_ts = None
+    @property
+    def connected(self):
+        return self.sock is not None
+    def connect(self):
+        if self.sock is not None:
+            return
+        now = time.time()
+        if self.next_connect_ts is not None and now < self.next_connect_ts:
+            raise NISConnectionError(
+                'Waiting {:.1f}s to reconnect to {}:{}'.format(
+                    self.next_connect_ts - now, self.hostname, self.port,
+                )
+            )
+        host_label = get_host_label(self.hostname, self.port)
+        try:
+            sock = socket.create_connection((self.hostname, self.port), self.timeout)
+        except (socket.error, socket.timeout) as e:
+            NIS_ERRORS.labels(host_label).inc()
+            if self.backoff:
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+            else:
+                self.backoff = self.min_backoff
+            self.next_connect_ts = time.time() + self.backoff
+            raise NISConnectionError(
+                'Could not connect to {}:{}: {}'.format(self.hostname, self.port, e)
+            )
+        NIS_CONNECTS.labels(host_label).inc()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.backoff = 0.
+        self.next_connect_ts = None
+    def close(self):
+        if self.sock is None:
+            return
+        try:
+            self.sock.close()
+        finally:
+            self.sock = None
+    def _recv_exact(self, num_bytes):
+        chunks = []
+        while num_bytes > 0:
+            chunk = self.sock.recv(num_bytes)
+            if not chunk:
+                raise NISConnectionError('Connection closed by server')
+            chunks.append(chunk)
+            num_bytes -= len(chunk)
+        return b''.join(chunks)
+    def _recv_response(self):
+        lines = []
+        while True:
+            frame_len = struct.unpack('>H', self._recv_exact(2))[0]
+            if frame_len == 0:
+                break
+            line = self._recv_exact(frame_len)
+            if PY3:
+                line = line.decode('UTF-8')
+            lines.append(line.rstrip('\n'))
+        return lines
+    def send_command(self, cmd):
+        # a persistent socket may have been dropped by the server since the
+        # last poll, so retry once on a fresh connection
+        host_label = get_host_label(self.hostname, self.port)
+        for attempt in range(2):
+            reused = self.connected
+            self.connect()
+            start_ts = time.time()
+            try:
+                self.sock.sendall(build_frame(cmd))
+                lines = self._recv_response()
+                NIS_REQUEST_SECONDS.labels(host_label).observe(time.time() - start_ts)
+                return lines
+            except (socket.error, socket.timeout, NISConnectionError) as e:
+                NIS_ERRORS.labels(host_label).inc()
+                self.close()
+                if not reused or attempt > 0:
+                    raise NISConnectionError(
+                        'Error reading from {}:{}: {}'.format(self.hostname, self.port, e)
+                    )
+    def get_status(self):
+        return parse_status_lines(self.send_command('status'))
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
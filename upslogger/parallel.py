@@ -0,0 +1,154 @@
+import os
+import io
+import multiprocessing
+
+import numpy as np
+
+from upslogger import logger
+from upslogger import binlog
+from upslogger import sqlitelog
+from upslogger import compression
+from upslogger.logindex import LogIndex
+from upslogger.table import LogTable
+
+PARALLEL_CHUNK_BYTES = 16 * 1024 * 1024
+
+def find_line_start(f, offset):
+    # first line boundary at or after `offset`
+    if offset <= 0:
+        return 0
+    f.seek(offset - 1)
+    f.readline()
+    return f.tell()
+
+def split_logfile(filename, chunk_bytes=None, start=None, end=None):
+    # (fields, [(offset, end_offset), ...]) with every range holding whole lines
+    if chunk_bytes is None:
+        chunk_bytes = PARALLEL_CHUNK_BYTES
+    size = os.path.getsize(filename)
+    with io.open(filename, 'rb') as f:
+        fields = logger.LogLineParser.parse_header(f.readline().decode('UTF-8'))
+        i0 = f.tell() if fields is not None else 0
+        i1 = size
+        index = LogIndex(filename)
+        if start is not None:
+            offset = index.find_offset(start)
+            if offset is not None and offset > i0:
+                i0 = offset
+        if end is not None:
+            offset = index.find_end_offset(end)
+            if offset is not None and offset < i1:
+                i1 = offset
+        ranges = []
+        while i0 < i1:
+            next_offset = find_line_start(f, min(i0 + chunk_bytes, i1))
+            ranges.append((i0, next_offset))
+            i0 = next_offset
+    return fields, ranges
+
+def split_compressed(filename, chunk_bytes=None, start=None, end=None):
+    # like split_logfile, on the block boundaries of a compressed log.
+    # None if there's no (valid) block index to split with
+    if chunk_bytes is None:
+        chunk_bytes = PARALLEL_CHUNK_BYTES
+    index = LogIndex(filename)
+    offsets = [offset for ts, offset in index.get_entries()]
+    size = os.path.getsize(filename)
+    if not len(offsets) or offsets[-1] >= size:
+        return None
+    if offsets[0] != 0:
+        offsets.insert(0, 0)
+    i0, i1 = 0, size
+    if start is not None:
+        offset = index.find_offset(start)
+        if offset is not None:
+            i0 = offset
+    if end is not None:
+        offset = index.find_end_offset(end)
+        if offset is not None:
+            i1 = offset
+    offsets = [offset for offset in offsets if i0 <= offset < i1]
+    blocks_per_task = max(chunk_bytes // compression.BLOCK_SIZE, 1)
+    bounds = offsets[::blocks_per_task] + [i1]
+    return logger.read_header(filename), list(zip(bounds[:-1], bounds[1:]))
+
+def build_tasks(filename, start=None, end=None, chunk_bytes=None):
+    # one task per byte range of a tsv log (or block range of a compressed
+    # one), or per binary/sqlite file
+    if os.path.isdir(filename):
+        from upslogger.segments import SegmentedLog
+        filenames = list(SegmentedLog(filename).iter_segments(start, end))
+    else:
+        filenames = [filename]
+    tasks = []
+    for fn in filenames:
+        if binlog.is_binlog(fn) or sqlitelog.is_sqlite(fn):
+            split = None
+        elif compression.is_compressed(fn):
+            split = split_compressed(fn, chunk_bytes, start, end)
+        else:
+            split = split_logfile(fn, chunk_bytes, start, end)
+        if split is None:
+            tasks.append(('file', fn, None, None, None, start, end))
+            continue
+        fields, ranges = split
+        for offset, end_offset in ranges:
+            tasks.append(('range', fn, fields, offset, end_offset, start, end))
+    return tasks
+
+def _pack_table(table):
+    # plain arrays pickle as raw buffers, far smaller than rows of dicts
+    values = np.empty((len(table.fields), len(table)), dtype=np.float64)
+    for i, name in enumerate(table.fields):
+        values[i] = table[name]
+    return table.fields, table.timestamps, values
+
+def _unpack_table(packed):
+    fields, timestamps, values = packed
+    columns = {name:values[i] for i, name in enumerate(fields)}
+    return LogTable(timestamps, columns, fields)
+
+def _parse_range(filename, fields, offset, end_offset, start=None, end=None):
+    with io.open(filename, 'rb') as f:
+        f.seek(offset)
+        data = f.read(end_offset - offset)
+    comp = compression.get_compression(filename)
+    if comp is not None:
+        data = compression.decompress_blocks(data, comp)
+    lines = data.decode('UTF-8').split('\n')
+    parser = logger.LogLineParser(fields)
+    batch_size = logger.LOG_PARSE_BATCH
+    for i0 in range(0, len(lines), batch_size):
+        parser.parse_lines(lines[i0:i0 + batch_size], start, end)
+    return parser.build()
+
+def run_task(task):
+    kind, filename, fields, offset, end_offset, start, end = task
+    if kind == 'range':
+        table = _parse_range(filename, fields, offset, end_offset, start, end)
+    else:
+        table = logger.parse_logfile_table(filename, start, end)
+    return _pack_table(table)
+
+def parse_logfile_parallel(filename=None, start=None, end=None, processes=None, chunk_bytes=None):
+    filename = logger.get_filename(filename)
+    if not os.path.exists(filename):
+        return None
+    start, end = logger._get_timestamp(start), logger._get_timestamp(end)
+    tasks = build_tasks(filename, start, end, chunk_bytes)
+    if not len(tasks):
+        # nothing in range, let the serial reader build the empty table
+        return logger.parse_logfile_table(filename, start, end)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if len(tasks) < 2 or processes < 2:
+        results = [run_task(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(min(processes, len(tasks)))
+        try:
+            # map() keeps the task order, so the merged table stays sorted
+            results = pool.map(run_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    return LogTable.concat([_unpack_table(r) for r in results])
@@ -1,8 +1,25 @@
+import os
+import json
+import threading
+
+import numpy as np
 import plotly.plotly as py
 import plotly.graph_objs as go
+import plotly.offline
 from plotly.exceptions import PlotlyRequestError
+from plotly.utils import PlotlyJSONEncoder
+
+from upslogger.logger import iter_logfile_tables, get_filename
+from upslogger.rollup import RollupSet
+from upslogger.downsample import minmax_indices
+
+PLOTLY_FILENAME = 'techarts-apc'
+MAX_POINTS = 5000
 
-from upslogger.logger import parse_logfile
+TRACES = [
+    ('voltage', 'LINEV', 'Line Voltage'),
+    ('frequency', 'LINEFREQ', 'Line Frequency'),
+]
 
 class PlotlyRateLimitError(Exception):
     def __init__(self, original_error):
@@ -12,40 +29,144 @@ class PlotlyRateLimitError(Exception):
     def __str__(self):
         return self.message
 
-def get_graph_objs(filename=None):
-    parsed = parse_logfile(filename)
-    if not parsed:
+def get_file_key(filename=None):
+    # changes whenever the log (or any file in a segment directory) is
+    # appended to, rotated or replaced
+    filename = get_filename(filename)
+    if not os.path.exists(filename):
+        return None
+    if os.path.isdir(filename):
+        entries = []
+        for fn in sorted(os.listdir(filename)):
+            try:
+                st = os.stat(os.path.join(filename, fn))
+            except OSError:
+                # removed since the listing (e.g. a segment just compressed)
+                continue
+            entries.append((fn, st.st_size, st.st_mtime))
+        return tuple(entries)
+    st = os.stat(filename)
+    key = (st.st_ino, st.st_size, st.st_mtime)
+    # sqlite (WAL mode) appends go to the write-ahead log until a checkpoint
+    wal_filename = '{}-wal'.format(filename)
+    try:
+        st = os.stat(wal_filename)
+    except OSError:
+        return key
+    return key + (st.st_size, st.st_mtime)
+
+def decimate_series(x, y, max_points):
+    # min/max per time bucket, so sags and spikes survive
+    if max_points is None or x.size <= max_points:
+        return x, y
+    idx = minmax_indices(x, y, max(max_points // 2 - 1, 1))
+    return x[idx], y[idx]
+
+def get_graph_objs(filename=None, start=None, end=None, resolution=None, max_points=None):
+    if resolution is not None:
+        tier_name, table = RollupSet(filename).read_span(start, end, resolution)
+        tables = [table] if table is not None else []
+    else:
+        tables = iter_logfile_tables(filename, start, end)
+    series = {name:([], []) for key, name, label in TRACES}
+    for table in tables:
+        for name, (x_chunks, y_chunks) in series.items():
+            x, y = table.get_series(name)
+            x_chunks.append(x)
+            y_chunks.append(y)
+    num_rows = 0
+    for name, (x_chunks, y_chunks) in series.items():
+        if not len(x_chunks):
+            return
+        x, y = np.concatenate(x_chunks), np.concatenate(y_chunks)
+        num_rows += x.size
+        series[name] = decimate_series(x, y, max_points)
+    if not num_rows:
         return
 
-    volt_x = []
-    volt_y = []
-    freq_x = []
-    freq_y = []
-    for d in parsed:
-        x = d['DATE'].value
-        vy = d.get('LINEV')
-        fy = d.get('LINEFREQ')
-        if vy is not None and vy.value is not None:
-            volt_x.append(x)
-            volt_y.append(vy.value)
-        if fy is not None and fy.value is not None:
-            freq_x.append(x)
-            freq_y.append(fy.value)
-
-
-    return dict(
-        voltage=go.Scatter(x=volt_x, y=volt_y, name='Line Voltage'),
-        frequency=go.Scatter(x=freq_x, y=freq_y, name='Line Frequency'),
-    )
-
-def to_plotly(filename=None):
-    data = get_graph_objs(filename)
-    fig = dict(data=[data['voltage'], data['frequency']])
-    try:
-        py.iplot(fig, filename='techarts-apc')
-    except PlotlyRequestError as e:
-        tb = str(e).lower()
-        if 'api' in tb and 'limit' in tb:
-            raise PlotlyRateLimitError(e)
+    graph_objs = {}
+    for key, name, label in TRACES:
+        x, y = series[name]
+        graph_objs[key] = go.Scatter(x=x.astype('datetime64[s]'), y=y, name=label)
+    return graph_objs
+
+class FigureBuilder(object):
+    # Builds the figure only when the log changed since the last call
+    def __init__(self, filename=None, resolution=None, max_points=MAX_POINTS):
+        self.filename = filename
+        self.resolution = resolution
+        self.max_points = max_points
+        self.lock = threading.Lock()
+        self.key = None
+        self.figure = None
+        self.uploaded_key = None
+        self.num_builds = 0
+    def get_key(self):
+        return (get_file_key(self.filename), self.resolution, self.max_points)
+    def get_figure(self):
+        key = self.get_key()
+        with self.lock:
+            if key == self.key:
+                return self.figure
+            data = get_graph_objs(
+                self.filename, resolution=self.resolution, max_points=self.max_points,
+            )
+            if data is None:
+                figure = None
+            else:
+                figure = dict(data=[data[k] for k, name, label in TRACES])
+            self.key = key
+            self.figure = figure
+            self.num_builds += 1
+        return figure
+    def to_json(self):
+        figure = self.get_figure()
+        if figure is None:
+            return None
+        return json.dumps(figure, cls=PlotlyJSONEncoder)
+    def write(self, output_filename):
+        # a standalone .html page, or the figure as .json
+        figure = self.get_figure()
+        if figure is None:
+            return False
+        output_filename = os.path.expanduser(output_filename)
+        if output_filename.endswith('.html'):
+            tmp_fn = '{}.tmp.html'.format(output_filename[:-5])
+            plotly.offline.plot(
+                figure, filename=tmp_fn, auto_open=False, include_plotlyjs='cdn',
+            )
         else:
-            raise
+            tmp_fn = '{}.tmp'.format(output_filename)
+            with open(tmp_fn, 'w') as f:
+                f.write(json.dumps(figure, cls=PlotlyJSONEncoder))
+        os.rename(tmp_fn, output_filename)
+        return True
+    def upload(self, plotly_filename=PLOTLY_FILENAME):
+        figure = self.get_figure()
+        if figure is None or self.key == self.uploaded_key:
+            return False
+        try:
+            py.iplot(figure, filename=plotly_filename)
+        except PlotlyRequestError as e:
+            tb = str(e).lower()
+            if 'api' in tb and 'limit' in tb:
+                raise PlotlyRateLimitError(e)
+            else:
+                raise
+        self.uploaded_key = self.key
+        return True
+
+FIGURE_BUILDERS = {}
+
+def get_figure_builder(filename=None, resolution=None, max_points=MAX_POINTS):
+    key = (get_filename(filename), resolution, max_points)
+    builder = FIGURE_BUILDERS.get(key)
+    if builder is None:
+        builder = FIGURE_BUILDERS[key] = FigureBuilder(filename, resolution, max_points)
+    return builder
+
+def to_plotly(filename=None, resolution=None, max_points=MAX_POINTS, output_filename=None):
+    builder = get_figure_builder(filename, resolution, max_points)
+    if output_filename is not None:
+        return builder.write(output_filename)
+    return builder.upload()
@@ -0,0 +1,282 @@
+import os
+import time
+import struct
+import asyncio
+import argparse
+import concurrent.futures
+
+from upslogger import logger
+from upslogger import sqlitelog
+from upslogger.nis import (
+    NIS_PORT, NISConnectionError, build_frame, parse_status_lines, get_host_label,
+    NIS_REQUEST_SECONDS, NIS_CONNECTS, NIS_ERRORS,
+)
+from upslogger.metrics import start_http_server
+
+LOG_DIRNAME = '~/.apclinev-fleet'
+
+class AsyncNISClient(object):
+    def __init__(self, hostname, port=NIS_PORT, timeout=5., min_backoff=1., max_backoff=60.):
+        self.hostname = hostname
+        self.port = port
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.reader = None
+        self.writer = None
+        self.backoff = 0.
+        self.next_connect_ts = None
+    @property
+    def connected(self):
+        return self.writer is not None
+    async def connect(self):
+        if self.writer is not None:
+            return
+        now = time.time()
+        if self.next_connect_ts is not None and now < self.next_connect_ts:
+            raise NISConnectionError(
+                'Waiting {:.1f}s to reconnect to {}:{}'.format(
+                    self.next_connect_ts - now, self.hostname, self.port,
+                )
+            )
+        host_label = get_host_label(self.hostname, self.port)
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.hostname, self.port), self.timeout,
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            NIS_ERRORS.labels(host_label).inc()
+            if self.backoff:
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+            else:
+                self.backoff = self.min_backoff
+            self.next_connect_ts = time.time() + self.backoff
+            raise NISConnectionError(
+                'Could not connect to {}:{}: {!r}'.format(self.hostname, self.port, e)
+            )
+        NIS_CONNECTS.labels(host_label).inc()
+        self.backoff = 0.
+        self.next_connect_ts = None
+    async def close(self):
+        writer = self.writer
+        self.reader = self.writer = None
+        if writer is None:
+            return
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    async def _recv_response(self):
+        lines = []
+        while True:
+            header = await self.reader.readexactly(2)
+            frame_len = struct.unpack('>H', header)[0]
+            if frame_len == 0:
+                break
+            line = await self.reader.readexactly(frame_len)
+            lines.append(line.decode('UTF-8').rstrip('\n'))
+        return lines
+    async def send_command(self, cmd):
+        host_label = get_host_label(self.hostname, self.port)
+        for attempt in range(2):
+            reused = self.connected
+            await self.connect()
+            start_ts = time.time()
+            try:
+                self.writer.write(build_frame(cmd))
+                await self.writer.drain()
+                lines = await asyncio.wait_for(self._recv_response(), self.timeout)
+                NIS_REQUEST_SECONDS.labels(host_label).observe(time.time() - start_ts)
+                return lines
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                NIS_ERRORS.labels(host_label).inc()
+                await self.close()
+                if not reused or attempt > 0 or isinstance(e, asyncio.TimeoutError):
+                    raise NISConnectionError(
+                        'Error reading from {}:{}: {!r}'.format(self.hostname, self.port, e)
+                    )
+    async def get_status(self):
+        lines = await self.send_command('status')
+        return parse_status_lines(lines)
+
+class UPSHost(object):
+    def __init__(self, name, hostname, port=NIS_PORT):
+        self.name = name
+        self.hostname = hostname
+        self.port = port
+        self.num_polls = 0
+        self.num_errors = 0
+        self.last_error = None
+        self.last_latency = None
+    @classmethod
+    def from_string(cls, s):
+        # "name hostname[:port]" or "hostname[:port]"
+        parts = s.split()
+        if len(parts) == 1:
+            name, addr = None, parts[0]
+        else:
+            name, addr = parts[0], parts[1]
+        if ':' in addr:
+            hostname, port = addr.rsplit(':', 1)
+            port = int(port)
+        else:
+            hostname, port = addr, NIS_PORT
+        if name is None:
+            name = '{}_{}'.format(hostname, port)
+        return cls(name, hostname, port)
+    def __repr__(self):
+        return '<UPSHost {self.name}: {self.hostname}:{self.port}>'.format(self=self)
+
+def read_hosts_file(filename):
+    hosts = []
+    with open(os.path.expanduser(filename), 'r') as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            hosts.append(UPSHost.from_string(line))
+    return hosts
+
+class FleetPoller(object):
+    def __init__(self, hosts, interval=1., concurrency=100, timeout=None,
+                 log_dir=None, log_format=None, writer_kwargs=None):
+        self.hosts = hosts
+        self.interval = interval
+        self.concurrency = concurrency
+        if timeout is None:
+            timeout = interval
+        self.timeout = timeout
+        if not log_dir:
+            log_dir = LOG_DIRNAME
+        self.log_dir = os.path.expanduser(log_dir)
+        self.log_format = log_format
+        if writer_kwargs is None:
+            writer_kwargs = {}
+        self.writer_kwargs = writer_kwargs
+        self.writers = {}
+        self.clients = {}
+        self.running = False
+        self._semaphore = None
+        self._executor = None
+    def get_log_filename(self, host):
+        if self.log_format == 'sqlite':
+            # one database for the fleet, rows are tagged with the host name
+            return os.path.join(self.log_dir, 'apclinev{}'.format(sqlitelog.SQLITE_EXT))
+        ext = '.bin' if self.log_format == 'binary' else '.log'
+        return os.path.join(self.log_dir, '{}{}'.format(host.name, ext))
+    def get_client(self, host):
+        client = self.clients.get(host.name)
+        if client is None:
+            client = AsyncNISClient(host.hostname, host.port, self.timeout)
+            self.clients[host.name] = client
+        return client
+    def get_writer(self, host):
+        writer = self.writers.get(host.name)
+        if writer is None:
+            writer = logger.LogWriter(
+                self.get_log_filename(host), self.log_format, host=host.name,
+                **self.writer_kwargs
+            )
+            self.writers[host.name] = writer
+        return writer
+    def handle_status(self, host, status):
+        data = logger.get_log_data(status)
+        if data is None:
+            return
+        self.get_writer(host).write(data)
+    def handle_error(self, host, exc):
+        host.num_errors += 1
+        host.last_error = exc
+    async def poll_host(self, host):
+        client = self.get_client(host)
+        async with self._semaphore:
+            start_ts = time.time()
+            try:
+                status = await asyncio.wait_for(client.get_status(), self.timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # drop the connection, the next poll reconnects
+                await client.close()
+                self.handle_error(host, e)
+                return None
+            host.last_latency = time.time() - start_ts
+        host.num_polls += 1
+        # writes (and fsyncs) run on one worker thread: they stay in order
+        # and sqlite connections are only used by the thread that made them
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(self._executor, self.handle_status, host, status)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.handle_error(host, e)
+        return status
+    async def run_host(self, host):
+        loop = asyncio.get_event_loop()
+        next_ts = loop.time()
+        while self.running:
+            await self.poll_host(host)
+            next_ts += self.interval
+            now = loop.time()
+            if next_ts < now:
+                # skip the ticks missed while this host was slow
+                next_ts += (now - next_ts) // self.interval * self.interval + self.interval
+            await asyncio.sleep(next_ts - now)
+    async def run(self, duration=None):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        if not os.path.exists(self.log_dir):
+            os.makedirs(self.log_dir)
+        self.running = True
+        tasks = [asyncio.ensure_future(self.run_host(host)) for host in self.hosts]
+        try:
+            if duration is not None:
+                await asyncio.sleep(duration)
+            else:
+                await asyncio.gather(*tasks)
+        finally:
+            self.running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for client in self.clients.values():
+                await client.close()
+            loop = asyncio.get_event_loop()
+            for writer in self.writers.values():
+                await loop.run_in_executor(self._executor, writer.close)
+            self._executor.shutdown()
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser()
+    p.add_argument('hosts_file', help='File with one "name hostname[:port]" per line')
+    p.add_argument('-d', '--log-dir', dest='log_dir')
+    p.add_argument('-i', '--interval', dest='interval', type=float, default=1.,
+                   help='Poll every "i" seconds')
+    p.add_argument('-c', '--concurrency', dest='concurrency', type=int, default=100)
+    p.add_argument('--timeout', dest='timeout', type=float)
+    p.add_argument('--log-format', dest='log_format', choices=logger.LOG_FORMATS)
+    p.add_argument('--flush-rows', dest='flush_rows', type=int, default=1)
+    p.add_argument('--flush-interval', dest='flush_interval', type=float)
+    p.add_argument('--fsync', dest='fsync', choices=logger.FSYNC_POLICIES, default='never')
+    p.add_argument('--metrics-port', dest='metrics_port', type=int,
+                   help='Serve Prometheus metrics over http on this port')
+    p.add_argument('--metrics-host', dest='metrics_host', default='127.0.0.1')
+    args = p.parse_args()
+    if args.metrics_port is not None:
+        start_http_server(args.metrics_port, args.metrics_host)
+    poller = FleetPoller(
+        read_hosts_file(args.hosts_file), args.interval, args.concurrency,
+        args.timeout, args.log_dir, args.log_format,
+        writer_kwargs=dict(
+            flush_rows=args.flush_rows, flush_interval=args.flush_interval, fsync=args.fsync,
+        ),
+    )
+    print('Polling {} hosts every {} seconds.  Press CTRL-C to quit'.format(
+        len(poller.hosts), poller.interval,
+    ))
+    try:
+        asyncio.run(poller.run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,220 @@
+import os
+import json
+
+import numpy as np
+
+from upslogger import logger
+from upslogger import binlog
+from upslogger import sqlitelog
+from upslogger.logindex import LogIndex
+from upslogger.table import LogTable
+from upslogger.compression import is_compressed
+
+TIERS = [('1m', 60), ('1h', 3600), ('1d', 86400)]
+ROLLUP_STATS = ['min', 'max', 'mean', 'count']
+
+def aggregate_table(table, width):
+    if not len(table):
+        return np.empty(0, dtype=np.int64), {}
+    buckets = table.timestamps // width * width
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    stats = {}
+    for name in table.fields:
+        y = table[name].astype(np.float64)
+        valid = ~np.isnan(y)
+        stats[name] = [
+            np.fmin.reduceat(y, starts),
+            np.fmax.reduceat(y, starts),
+            np.add.reduceat(np.where(valid, y, 0.), starts),
+            np.add.reduceat(valid.astype(np.int64), starts),
+        ]
+    return buckets[starts], stats
+
+def _merge_stats(a, b):
+    mn = a[0] if b[0] != b[0] else (b[0] if a[0] != a[0] else min(a[0], b[0]))
+    mx = a[1] if b[1] != b[1] else (b[1] if a[1] != a[1] else max(a[1], b[1]))
+    return [mn, mx, a[2] + b[2], a[3] + b[3]]
+
+class RollupTier(object):
+    def __init__(self, name, width, base_filename):
+        self.name = name
+        self.width = width
+        self.filename = '{}.rollup-{}{}'.format(base_filename, name, binlog.BINLOG_EXT)
+        self.fields = None
+        # the bucket still receiving samples: {'ts':int, 'stats':{name:[min, max, sum, count]}}
+        self.open_bucket = None
+    def get_state(self):
+        return {'fields':self.fields, 'open_bucket':self.open_bucket}
+    def set_state(self, state):
+        self.fields = state.get('fields')
+        self.open_bucket = state.get('open_bucket')
+    def stat_fields(self):
+        fields = []
+        for name in self.fields:
+            fields.extend(['{}_{}'.format(name, stat) for stat in ROLLUP_STATS])
+        return fields
+    def _build_table(self, bucket_ts, stats):
+        columns = {}
+        for name in self.fields:
+            mn, mx, total, count = stats[name]
+            count = np.asarray(count, dtype=np.float64)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.where(count > 0, np.asarray(total) / count, np.nan)
+            columns['{}_min'.format(name)] = mn
+            columns['{}_max'.format(name)] = mx
+            columns['{}_mean'.format(name)] = mean
+            columns['{}_count'.format(name)] = count
+        return LogTable(bucket_ts, columns, self.stat_fields())
+    def add_table(self, table):
+        if not len(table):
+            return
+        if self.fields is None:
+            self.fields = list(table.fields)
+        bucket_ts, stats = aggregate_table(table, self.width)
+        rows = []
+        for i, ts in enumerate(bucket_ts.tolist()):
+            row = {name:[float(v[i]) for v in stats[name][:3]] + [int(stats[name][3][i])]
+                   for name in self.fields}
+            rows.append((ts, row))
+        open_bucket = self.open_bucket
+        if open_bucket is not None:
+            if rows[0][0] == open_bucket['ts']:
+                ts, row = rows[0]
+                rows[0] = (ts, {
+                    name:_merge_stats(open_bucket['stats'][name], row[name])
+                    for name in self.fields
+                })
+            else:
+                rows.insert(0, (open_bucket['ts'], open_bucket['stats']))
+                rows.sort(key=lambda r: r[0])
+        completed = rows[:-1]
+        ts, row = rows[-1]
+        self.open_bucket = {'ts':ts, 'stats':row}
+        if len(completed):
+            self._append(completed)
+    def _append(self, rows):
+        bucket_ts = [ts for ts, row in rows]
+        stats = {}
+        for name in self.fields:
+            stats[name] = [[row[name][i] for ts, row in rows] for i in range(4)]
+        table = self._build_table(bucket_ts, stats)
+        binlog.append_table(self.filename, table, ['DATE'] + table.fields)
+    def get_table(self, start=None, end=None, include_open=True):
+        tables = []
+        if binlog.is_binlog(self.filename):
+            table = binlog.read_binlog(self.filename, start, end)
+            if len(table):
+                # buckets repeated by an interrupted update, keep the last
+                rev_ts = table.timestamps[::-1]
+                _, rev_idx = np.unique(rev_ts, return_index=True)
+                if rev_idx.size != len(table):
+                    table = table.take(len(table) - 1 - rev_idx)
+            tables.append(table)
+        if include_open and self.open_bucket is not None:
+            ts = self.open_bucket['ts']
+            in_range = (start is None or ts >= start // self.width * self.width) and \
+                       (end is None or ts <= end)
+            if in_range:
+                stats = {name:[[v] for v in self.open_bucket['stats'][name]] for name in self.fields}
+                open_table = self._build_table([ts], stats)
+                if len(tables) and len(tables[0]) and tables[0].timestamps[-1] == ts:
+                    tables[0] = tables[0].take(slice(0, -1))
+                tables.append(open_table)
+        if not len(tables):
+            if self.fields is None:
+                return None
+            return LogTable.empty(self.stat_fields())
+        return LogTable.concat(tables, self.stat_fields())
+    def get_mean_table(self, start=None, end=None):
+        table = self.get_table(start, end)
+        if table is None:
+            return None
+        columns = {name:table['{}_mean'.format(name)] for name in self.fields}
+        return LogTable(table.timestamps, columns, self.fields)
+
+class RollupSet(object):
+    def __init__(self, log_filename=None):
+        if not log_filename:
+            log_filename = logger.LOG_FILENAME
+        self.log_filename = os.path.expanduser(log_filename)
+        if os.path.isdir(self.log_filename):
+            base_filename = os.path.join(self.log_filename, 'apclinev')
+        else:
+            base_filename = self.log_filename
+        self.state_filename = '{}.rollup.json'.format(base_filename)
+        self.tiers = [RollupTier(name, width, base_filename) for name, width in TIERS]
+        self.tiers_by_name = {tier.name:tier for tier in self.tiers}
+        self.last_ts = None
+        self.load_state()
+    @property
+    def exists(self):
+        return os.path.exists(self.state_filename)
+    def load_state(self):
+        if not self.exists:
+            return
+        with open(self.state_filename, 'r') as f:
+            state = json.loads(f.read())
+        self.last_ts = state['last_ts']
+        for tier in self.tiers:
+            tier.set_state(state['tiers'].get(tier.name, {}))
+    def save_state(self):
+        state = {
+            'last_ts':self.last_ts,
+            'tiers':{tier.name:tier.get_state() for tier in self.tiers},
+        }
+        tmp_fn = '{}.tmp'.format(self.state_filename)
+        with open(tmp_fn, 'w') as f:
+            f.write(json.dumps(state))
+        os.rename(tmp_fn, self.state_filename)
+    def add_table(self, table):
+        if not len(table):
+            return
+        for tier in self.tiers:
+            tier.add_table(table)
+        self.last_ts = int(table.timestamps[-1])
+    def update(self):
+        if not os.path.exists(self.log_filename):
+            return
+        if sqlitelog.is_sqlite(self.log_filename):
+            # read_span aggregates sqlite logs in the database
+            return
+        is_tsv = os.path.isfile(self.log_filename) and not is_compressed(self.log_filename) and \
+                 logger.get_log_format(self.log_filename) == 'tsv'
+        if is_tsv and not LogIndex(self.log_filename).exists:
+            LogIndex(self.log_filename).rebuild()
+        start = None if self.last_ts is None else self.last_ts + 1
+        for table in logger.iter_logfile_tables(self.log_filename, start=start):
+            self.add_table(table)
+        self.save_state()
+    def rebuild(self):
+        for tier in self.tiers:
+            if os.path.exists(tier.filename):
+                os.remove(tier.filename)
+            tier.set_state({})
+        self.last_ts = None
+        self.update()
+    def choose_tier(self, start=None, end=None, resolution=None):
+        if resolution is None or not self.exists:
+            return 'raw'
+        # the coarsest tier that still has at least `resolution` points
+        for tier in reversed(self.tiers):
+            table = tier.get_table(start, end)
+            if table is not None and len(table) >= resolution:
+                return tier.name
+        return 'raw'
+    def read_span(self, start=None, end=None, resolution=None, host=None):
+        if sqlitelog.is_sqlite(self.log_filename):
+            return self._read_sqlite_span(start, end, resolution, host)
+        tier_name = self.choose_tier(start, end, resolution)
+        if tier_name == 'raw':
+            return tier_name, logger.parse_logfile_table(self.log_filename, start, end, host)
+        tier = self.tiers_by_name[tier_name]
+        return tier_name, tier.get_mean_table(start, end)
+    def _read_sqlite_span(self, start=None, end=None, resolution=None, host=None):
+        # the database aggregates on the fly, no rollup files needed
+        with sqlitelog.SQLiteLog(self.log_filename) as db:
+            if resolution is not None:
+                for name, width in reversed(TIERS):
+                    if db.count_buckets(width, start, end, host) >= resolution:
+                        return name, db.get_mean_table(width, start, end, host)
+            return 'raw', db.read_table(start, end, host)
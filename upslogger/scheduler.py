@@ -0,0 +1,189 @@
+import sys
+import time
+import datetime
+
+from upslogger.metrics import REGISTRY
+
+monotonic = getattr(time, 'monotonic', time.time)
+
+JOB_LAG_SECONDS = REGISTRY.histogram(
+    'upslogger_scheduler_lag_seconds', 'Delay between a job deadline and its start', ['job'],
+)
+JOB_SECONDS = REGISTRY.histogram('upslogger_scheduler_job_seconds', 'Job run time', ['job'])
+JOB_MISSED = REGISTRY.counter(
+    'upslogger_scheduler_missed_total', 'Ticks skipped because a job was late', ['job'],
+)
+JOB_FAILED = REGISTRY.counter(
+    'upslogger_scheduler_failed_total', 'Job runs that raised an exception', ['job'],
+)
+
+class Job(object):
+    def __init__(self, name, callback, interval, align=False, offset=0.):
+        self.name = name
+        self.callback = callback
+        self.interval = float(interval)
+        self.align = align
+        self.offset = offset
+        self.next_deadline = None
+        self.num_runs = 0
+        self.num_missed = 0
+        self.num_failed = 0
+        self.last_error = None
+        self.total_jitter = 0.
+        self.max_jitter = 0.
+        self.last_jitter = None
+        self.last_duration = None
+        self.max_duration = 0.
+    def start(self, now, wall_now):
+        if self.align:
+            # first deadline on a wall clock multiple of the interval
+            delay = (self.offset - wall_now) % self.interval
+        else:
+            delay = 0.
+        self.next_deadline = now + delay
+    def is_due(self, now):
+        return self.next_deadline is not None and now >= self.next_deadline
+    def run(self, now, clock):
+        jitter = now - self.next_deadline
+        self.last_jitter = jitter
+        self.total_jitter += jitter
+        self.max_jitter = max(self.max_jitter, jitter)
+        JOB_LAG_SECONDS.labels(self.name).observe(jitter)
+        exc = None
+        try:
+            self.callback()
+        except Exception as e:
+            # one failing job shouldn't stop the others, the caller reports it
+            exc = e
+            self.num_failed += 1
+            self.last_error = e
+            JOB_FAILED.labels(self.name).inc()
+        finally:
+            end_ts = clock()
+            duration = end_ts - now
+            self.last_duration = duration
+            self.max_duration = max(self.max_duration, duration)
+            JOB_SECONDS.labels(self.name).observe(duration)
+            self.num_runs += 1
+            self.advance(end_ts)
+        return exc
+    def advance(self, now):
+        # deadlines stay on the original grid; ticks that passed while
+        # this (or another) job was running are counted and skipped
+        self.next_deadline += self.interval
+        if self.next_deadline <= now:
+            missed = int((now - self.next_deadline) // self.interval) + 1
+            self.num_missed += missed
+            JOB_MISSED.labels(self.name).inc(missed)
+            self.next_deadline += missed * self.interval
+    def get_stats(self):
+        if self.num_runs:
+            mean_jitter = self.total_jitter / self.num_runs
+        else:
+            mean_jitter = None
+        return {
+            'interval':self.interval,
+            'runs':self.num_runs,
+            'missed':self.num_missed,
+            'failed':self.num_failed,
+            'last_error':self.last_error,
+            'mean_jitter':mean_jitter,
+            'max_jitter':self.max_jitter,
+            'last_duration':self.last_duration,
+            'max_duration':self.max_duration,
+        }
+
+class Scheduler(object):
+    def __init__(self, clock=None, wall_clock=None, sleep=None, on_error=None):
+        if clock is None:
+            clock = monotonic
+        if wall_clock is None:
+            wall_clock = time.time
+        if sleep is None:
+            sleep = time.sleep
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.sleep = sleep
+        if on_error is None:
+            on_error = self._report_error
+        self.on_error = on_error
+        self.jobs = []
+        self.jobs_by_name = {}
+        self.running = False
+    def add_job(self, name, callback, interval, align=False, offset=0.):
+        if name in self.jobs_by_name:
+            raise ValueError('Job "{}" already exists'.format(name))
+        if interval <= 0:
+            raise ValueError('Invalid interval for "{}": {}'.format(name, interval))
+        job = Job(name, callback, interval, align, offset)
+        self.jobs.append(job)
+        self.jobs_by_name[name] = job
+        if self.running:
+            job.start(self.clock(), self.wall_clock())
+        return job
+    def start(self):
+        now = self.clock()
+        wall_now = self.wall_clock()
+        for job in self.jobs:
+            job.start(now, wall_now)
+        self.running = True
+    def stop(self):
+        self.running = False
+    def get_next_deadline(self):
+        deadlines = [job.next_deadline for job in self.jobs if job.next_deadline is not None]
+        if not len(deadlines):
+            return None
+        return min(deadlines)
+    def run_pending(self):
+        num_run = 0
+        now = self.clock()
+        for job in sorted(self.jobs, key=lambda j: j.next_deadline):
+            if not job.is_due(now):
+                continue
+            exc = job.run(now, self.clock)
+            if exc is not None:
+                self.on_error(job, exc)
+            num_run += 1
+            now = self.clock()
+        return num_run
+    def run(self, duration=None):
+        if not self.running:
+            self.start()
+        end_ts = None
+        if duration is not None:
+            end_ts = self.clock() + duration
+        while self.running:
+            self.run_pending()
+            next_deadline = self.get_next_deadline()
+            now = self.clock()
+            if end_ts is not None:
+                if now >= end_ts:
+                    break
+                if next_deadline is None or next_deadline > end_ts:
+                    next_deadline = end_ts
+            if next_deadline is None:
+                break
+            if next_deadline > now:
+                self.sleep(next_deadline - now)
+        self.running = False
+    def _report_error(self, job, exc):
+        sys.stderr.write('{}: job "{}" failed: {!r}\n'.format(
+            datetime.datetime.now(), job.name, exc,
+        ))
+    def get_stats(self):
+        return {job.name:job.get_stats() for job in self.jobs}
+    def format_stats(self):
+        lines = []
+        for job in self.jobs:
+            stats = job.get_stats()
+            mean_jitter = stats['mean_jitter'] or 0.
+            lines.append(
+                '{name}: runs={runs} missed={missed} failed={failed} '
+                'jitter mean={mean:.4f}s max={max:.4f}s'.format(
+                    name=job.name, runs=stats['runs'], missed=stats['missed'],
+                    failed=stats['failed'], mean=mean_jitter, max=stats['max_jitter'],
+                )
+            )
+            if stats['last_error'] is not None:
+                lines.append('    last error: {!r}'.format(stats['last_error']))
+        return '\n'.join(lines)
@@ -0,0 +1,318 @@
+import os
+import re
+import json
+import datetime
+import threading
+
+import numpy as np
+
+from upslogger import logger
+from upslogger import binlog
+from upslogger import timezone
+from upslogger.table import LogTable
+from upslogger.metrics import REGISTRY
+from upslogger.logindex import LogIndex
+from upslogger.compression import (
+    compress_file, is_compressed, BackgroundCompressor, COMPRESSION_EXTS,
+)
+
+LOG_DIRNAME = '~/.apclinev'
+SEGMENT_PREFIX = 'apclinev'
+MANIFEST_FILENAME = 'manifest.json'
+PERIODS = ['daily', 'weekly']
+
+SEGMENT_LATE_ROWS = REGISTRY.counter(
+    'upslogger_segment_late_rows_total', 'Samples dropped for arriving out of time order',
+)
+
+SEGMENT_RE = re.compile(r'^(?P<prefix>.+)-(?P<date>\d{8})(?P<ext>\.log|\.bin)(?P<comp>\.gz|\.xz)?$')
+
+def get_period_start(ts, period):
+    dt = datetime.datetime.utcfromtimestamp(ts).date()
+    if period == 'weekly':
+        dt -= datetime.timedelta(days=dt.weekday())
+    elif period != 'daily':
+        raise ValueError('Unknown period: {}'.format(period))
+    return dt
+
+def get_period_end(dt, period):
+    days = 7 if period == 'weekly' else 1
+    return dt + datetime.timedelta(days=days)
+
+def _date_to_timestamp(dt):
+    dt = datetime.datetime(dt.year, dt.month, dt.day)
+    return timezone.to_timestamp(timezone.make_aware(dt, 'UTC'))
+
+def summarize_table(table):
+    d = {'rows':len(table), 'first':None, 'last':None, 'fields':{}}
+    if not len(table):
+        return d
+    d['first'] = int(table.timestamps[0])
+    d['last'] = int(table.timestamps[-1])
+    for name in table.fields:
+        col = table[name]
+        col = col[~np.isnan(col)]
+        if not col.size:
+            d['fields'][name] = None
+            continue
+        d['fields'][name] = {
+            'min':float(col.min()),
+            'max':float(col.max()),
+            'mean':float(col.mean(dtype=np.float64)),
+            'count':int(col.size),
+        }
+    return d
+
+class SegmentedLog(object):
+    def __init__(self, dirname=None, period=None, log_format=None, compress=False,
+                 writer_kwargs=None, compression='gzip', background=True):
+        if not dirname:
+            dirname = LOG_DIRNAME
+        self.dirname = os.path.expanduser(dirname)
+        if log_format is None:
+            log_format = logger.LOG_FORMAT
+        self.log_format = log_format
+        self.compress = compress
+        self.compression = compression
+        self.compressor = None
+        if compress and background:
+            self.compressor = BackgroundCompressor(
+                compression, on_complete=self._on_compressed, remove=False,
+            )
+        self.lock = threading.Lock()
+        if writer_kwargs is None:
+            writer_kwargs = {}
+        self.writer_kwargs = writer_kwargs
+        self.writer = None
+        self.manifest_filename = os.path.join(self.dirname, MANIFEST_FILENAME)
+        self.current_filename = None
+        self.last_ts = None
+        self.num_late = 0
+        self.manifest = self.load_manifest()
+        if period is None:
+            period = self.manifest.get('period', 'daily')
+        if period not in PERIODS:
+            raise ValueError('Unknown period: {}'.format(period))
+        self.period = self.manifest['period'] = period
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_filename):
+            return {'segments':{}}
+        with open(self.manifest_filename, 'r') as f:
+            return json.loads(f.read())
+    def save_manifest(self):
+        with self.lock:
+            self._save_manifest()
+    def _save_manifest(self):
+        tmp_fn = '{}.tmp'.format(self.manifest_filename)
+        with open(tmp_fn, 'w') as f:
+            f.write(json.dumps(self.manifest, indent=2, sort_keys=True))
+        os.rename(tmp_fn, self.manifest_filename)
+    def get_segment_filename(self, ts):
+        dt = get_period_start(ts, self.period)
+        ext = binlog.BINLOG_EXT if self.log_format == 'binary' else '.log'
+        fn = '{}-{}{}'.format(SEGMENT_PREFIX, dt.strftime('%Y%m%d'), ext)
+        return os.path.join(self.dirname, fn)
+    def is_closed(self, filename):
+        name = os.path.basename(filename)
+        names = [name] + [name + ext for ext in COMPRESSION_EXTS.values()]
+        return any(fn in self.manifest['segments'] for fn in names)
+    def iter_segment_filenames(self):
+        if not os.path.exists(self.dirname):
+            return
+        filenames = set(os.listdir(self.dirname))
+        for fn in sorted(filenames):
+            m = SEGMENT_RE.match(fn)
+            if not m:
+                continue
+            if m.group('comp') and fn[:-len(m.group('comp'))] in filenames:
+                # still being compressed, the original is complete
+                continue
+            filename = os.path.join(self.dirname, fn)
+            if not m.group('comp') and not os.path.exists(filename):
+                # compressed (and removed) since the listing, a reader
+                # may be well past listdir() by the time it gets here
+                filename = self._find_compressed(filename)
+                if filename is None:
+                    continue
+            yield filename
+    def _find_compressed(self, filename):
+        exts = [COMPRESSION_EXTS[self.compression]]
+        exts.extend(ext for ext in sorted(COMPRESSION_EXTS.values()) if ext not in exts)
+        for ext in exts:
+            if os.path.exists(filename + ext):
+                return filename + ext
+        return None
+    def get_segment_range(self, filename):
+        m = SEGMENT_RE.match(os.path.basename(filename))
+        dt = datetime.datetime.strptime(m.group('date'), '%Y%m%d').date()
+        return _date_to_timestamp(dt), _date_to_timestamp(get_period_end(dt, self.period))
+    def write(self, data):
+        ts = data['DATE'].timestamp
+        if ts is None:
+            ts = timezone.to_timestamp(timezone.now())
+        fn = self.get_segment_filename(ts)
+        if fn != self.current_filename:
+            with self.lock:
+                closed = self.is_closed(fn)
+            if closed:
+                # a late sample for a period that was already closed (and
+                # maybe compressed); reads need every segment in time order
+                return self._drop_late()
+            self.rotate(fn)
+        if self.last_ts is not None and ts < self.last_ts:
+            return self._drop_late()
+        self.writer.write(data)
+        self.last_ts = ts
+        return True
+    def _drop_late(self):
+        self.num_late += 1
+        SEGMENT_LATE_ROWS.inc()
+        return False
+    def _get_last_timestamp(self, filename):
+        # only the rows after the last index entry need parsing
+        entry = LogIndex(filename).get_last_entry()
+        start = entry[0] if entry is not None else None
+        table = logger.parse_logfile_table(filename, start)
+        if table is None or not len(table):
+            return None
+        return int(table.timestamps[-1])
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+    def maybe_flush(self):
+        if self.writer is not None:
+            self.writer.maybe_flush()
+    def close(self):
+        self._close_writer()
+        if self.compressor is not None:
+            self.compressor.stop()
+    def _close_writer(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+    def rotate(self, filename=None):
+        self._close_writer()
+        if not os.path.exists(self.dirname):
+            os.makedirs(self.dirname)
+        for fn in self.iter_segment_filenames():
+            if fn == filename:
+                continue
+            with self.lock:
+                # the compressor renames manifest entries under the lock
+                listed = os.path.basename(fn) in self.manifest['segments']
+                closed = listed or self.is_closed(fn)
+            if listed:
+                # closed earlier, but compression didn't finish
+                if self.needs_compression(fn):
+                    self.compress_segment(fn)
+                continue
+            if closed:
+                # compressed since the listing
+                continue
+            self.close_segment(fn)
+        self.current_filename = filename
+        self.last_ts = None
+        if filename is not None:
+            if os.path.exists(filename):
+                self.last_ts = self._get_last_timestamp(filename)
+            self.writer = logger.LogWriter(filename, self.log_format, **self.writer_kwargs)
+            self.writer.open()
+    def needs_compression(self, filename):
+        if not self.compress or is_compressed(filename):
+            return False
+        return logger.get_log_format(filename) == 'tsv'
+    def close_segment(self, filename):
+        table = logger.parse_logfile_table(filename)
+        entry = summarize_table(table)
+        entry['closed'] = True
+        with self.lock:
+            self.manifest['segments'][os.path.basename(filename)] = entry
+            self._save_manifest()
+        if self.needs_compression(filename):
+            self.compress_segment(filename)
+        return entry
+    def compress_segment(self, filename):
+        if self.compressor is not None:
+            self.compressor.submit(filename)
+            return
+        self._on_compressed(filename, compress_segment(filename, self.compression, remove=False))
+    def _on_compressed(self, filename, compressed_filename):
+        # the manifest entry follows the file to its new name, the original
+        # is only removed after that (readers fall back to the compressed file)
+        with self.lock:
+            entry = self.manifest['segments'].pop(os.path.basename(filename), None)
+            if entry is not None:
+                self.manifest['segments'][os.path.basename(compressed_filename)] = entry
+            self._save_manifest()
+        os.remove(filename)
+        LogIndex(filename).remove()
+    def iter_segments(self, start=None, end=None):
+        for fn in self.iter_segment_filenames():
+            entry = self.manifest['segments'].get(os.path.basename(fn))
+            if entry is not None:
+                if not entry['rows']:
+                    continue
+                first, last = entry['first'], entry['last']
+            else:
+                first, last = self.get_segment_range(fn)
+            if start is not None and last is not None and last < start:
+                continue
+            if end is not None and first > end:
+                continue
+            yield fn
+    def iter_tables(self, start=None, end=None, chunk_rows=None):
+        for fn in self.iter_segments(start, end):
+            for table in logger.iter_logfile_tables(fn, start, end, chunk_rows):
+                yield table
+    def iter_rows(self, start=None, end=None):
+        for fn in self.iter_segments(start, end):
+            for d in logger.iter_logfile(fn, start, end):
+                yield d
+    def get_summary(self, start=None, end=None):
+        # combined stats from the manifest, reading only segments that
+        # aren't summarized yet
+        tables = []
+        entries = []
+        for fn in self.iter_segments(start, end):
+            entry = self.manifest['segments'].get(os.path.basename(fn))
+            partial = entry is None
+            if not partial:
+                partial = (start is not None and entry['first'] < start) or \
+                          (end is not None and entry['last'] > end)
+            if partial:
+                tables.append(logger.parse_logfile_table(fn, start, end))
+            else:
+                entries.append(entry)
+        if len(tables):
+            entries.append(summarize_table(LogTable.concat(tables)))
+        return merge_summaries(entries)
+
+def merge_summaries(entries):
+    result = {'rows':0, 'first':None, 'last':None, 'fields':{}}
+    for entry in entries:
+        if not entry['rows']:
+            continue
+        result['rows'] += entry['rows']
+        if result['first'] is None or entry['first'] < result['first']:
+            result['first'] = entry['first']
+        if result['last'] is None or entry['last'] > result['last']:
+            result['last'] = entry['last']
+        for name, stats in entry['fields'].items():
+            if stats is None:
+                result['fields'].setdefault(name, None)
+                continue
+            current = result['fields'].get(name)
+            if current is None:
+                result['fields'][name] = stats.copy()
+                continue
+            count = current['count'] + stats['count']
+            current['mean'] = (
+                current['mean'] * current['count'] + stats['mean'] * stats['count']
+            ) / count
+            current['count'] = count
+            current['min'] = min(current['min'], stats['min'])
+            current['max'] = max(current['max'], stats['max'])
+    return result
+
+def compress_segment(filename, compression='gzip', remove=True):
+    return compress_file(filename, compression, remove=remove)
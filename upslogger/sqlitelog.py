@@ -0,0 +1,235 @@
+import os
+import sqlite3
+
+import numpy as np
+
+from upslogger.table import LogTable
+from upslogger import timezone
+
+SQLITE_MAGIC = b'SQLite format 3\x00'
+SQLITE_EXT = '.sqlite'
+DEFAULT_HOST = 'localhost'
+SQLITE_CHUNK_ROWS = 65536
+SQLITE_TIMEOUT = 30.
+
+# rollup stat name -> SQL aggregate
+AGGREGATES = [('min', 'MIN'), ('max', 'MAX'), ('mean', 'AVG'), ('count', 'COUNT')]
+
+class SQLiteLogError(Exception):
+    pass
+
+def is_sqlite(filename):
+    if not os.path.isfile(filename):
+        return False
+    with open(filename, 'rb') as f:
+        return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+
+def _quote(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+def pack_row(data, fields, host=None):
+    if host is None:
+        host = DEFAULT_HOST
+    ts = data['DATE'].timestamp
+    if ts is None:
+        ts = timezone.to_timestamp(timezone.now())
+    row = [host, ts]
+    for name in fields:
+        if name == 'DATE':
+            continue
+        row.append(data[name].value)
+    return tuple(row)
+
+class SQLiteLog(object):
+    def __init__(self, filename, synchronous='NORMAL'):
+        self.filename = os.path.expanduser(filename)
+        self.synchronous = synchronous
+        self.conn = None
+        self._fields = None
+    def open(self, fields=None):
+        if self.conn is not None:
+            return
+        self.conn = sqlite3.connect(self.filename, timeout=SQLITE_TIMEOUT)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous={}'.format(self.synchronous))
+        if fields is not None:
+            self.ensure_fields(fields)
+    def close(self):
+        if self.conn is None:
+            return
+        self.conn.close()
+        self.conn = None
+        self._fields = None
+    def __enter__(self):
+        self.open()
+        return self
+    def __exit__(self, *args):
+        self.close()
+    @property
+    def fields(self):
+        # value fields (without DATE) in column order
+        if self._fields is None:
+            cur = self.conn.execute('PRAGMA table_info(samples)')
+            names = [row[1] for row in cur.fetchall()]
+            if not len(names):
+                return None
+            self._fields = [name for name in names if name not in ('host', 'ts')]
+        return self._fields
+    def ensure_fields(self, fields):
+        value_fields = [name for name in fields if name != 'DATE']
+        existing = self.fields
+        with self.conn:
+            if existing is None:
+                columns = ''.join(', {} REAL'.format(_quote(name)) for name in value_fields)
+                self.conn.execute(
+                    'CREATE TABLE samples (host TEXT NOT NULL, ts INTEGER NOT NULL{})'.format(columns)
+                )
+                self.conn.execute('CREATE INDEX samples_host_ts ON samples (host, ts)')
+                self.conn.execute('CREATE INDEX samples_ts ON samples (ts)')
+            else:
+                for name in value_fields:
+                    if name in existing:
+                        continue
+                    self.conn.execute('ALTER TABLE samples ADD COLUMN {} REAL'.format(_quote(name)))
+        self._fields = None
+    def _build_insert(self, fields):
+        names = ['host', 'ts'] + [_quote(name) for name in fields if name != 'DATE']
+        return 'INSERT INTO samples ({}) VALUES ({})'.format(
+            ', '.join(names), ', '.join(['?'] * len(names)),
+        )
+    def insert_rows(self, rows, fields):
+        # rows from pack_row(), written in a single transaction
+        with self.conn:
+            self.conn.executemany(self._build_insert(fields), rows)
+    def append_table(self, table, host=None):
+        if host is None:
+            host = DEFAULT_HOST
+        self.ensure_fields(table.fields)
+        columns = [table[name].tolist() for name in table.fields]
+        hosts = [host] * len(table)
+        # NaN is stored as NULL by sqlite
+        rows = zip(hosts, table.timestamps.tolist(), *columns)
+        self.insert_rows(rows, table.fields)
+    def _build_where(self, start=None, end=None, host=None):
+        clauses, params = [], []
+        if host is not None:
+            clauses.append('host = ?')
+            params.append(host)
+        if start is not None:
+            clauses.append('ts >= ?')
+            params.append(int(start))
+        if end is not None:
+            clauses.append('ts <= ?')
+            params.append(int(end))
+        if not len(clauses):
+            return '', params
+        return ' WHERE {}'.format(' AND '.join(clauses)), params
+    def _check_host(self, host):
+        # samples from different hosts interleave by timestamp, a read
+        # without a host only makes sense on a single host database
+        if host is not None or self.fields is None:
+            return
+        min_host = self.conn.execute('SELECT MIN(host) FROM samples').fetchone()[0]
+        max_host = self.conn.execute('SELECT MAX(host) FROM samples').fetchone()[0]
+        if min_host != max_host:
+            raise SQLiteLogError('{} holds samples from several hosts {}, a host is required'.format(
+                self.filename, self.get_hosts(),
+            ))
+    def get_hosts(self):
+        if self.fields is None:
+            return []
+        cur = self.conn.execute('SELECT DISTINCT host FROM samples ORDER BY host')
+        return [row[0] for row in cur.fetchall()]
+    def get_range(self, host=None):
+        if self.fields is None:
+            return None, None
+        where, params = self._build_where(host=host)
+        cur = self.conn.execute('SELECT MIN(ts), MAX(ts) FROM samples{}'.format(where), params)
+        return cur.fetchone()
+    def _build_table(self, rows, fields):
+        # NULLs become NaN
+        data = np.array(rows, dtype=np.float64).reshape(len(rows), len(fields) + 1)
+        columns = {name:data[:, i + 1] for i, name in enumerate(fields)}
+        return LogTable(data[:, 0].astype(np.int64), columns, fields)
+    def iter_tables(self, start=None, end=None, host=None, chunk_rows=None):
+        if chunk_rows is None:
+            chunk_rows = SQLITE_CHUNK_ROWS
+        fields = self.fields
+        if fields is None:
+            yield LogTable.empty([])
+            return
+        self._check_host(host)
+        where, params = self._build_where(start, end, host)
+        cur = self.conn.execute('SELECT ts{} FROM samples{} ORDER BY ts'.format(
+            ''.join(', {}'.format(_quote(name)) for name in fields), where,
+        ), params)
+        num_chunks = 0
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not len(rows):
+                break
+            num_chunks += 1
+            yield self._build_table(rows, fields)
+        if not num_chunks:
+            yield LogTable.empty(fields)
+    def read_table(self, start=None, end=None, host=None):
+        return LogTable.concat(self.iter_tables(start, end, host))
+    def count_buckets(self, width, start=None, end=None, host=None):
+        if self.fields is None:
+            return 0
+        self._check_host(host)
+        where, params = self._build_where(start, end, host)
+        cur = self.conn.execute(
+            'SELECT COUNT(DISTINCT ts / ?) FROM samples{}'.format(where), [int(width)] + params,
+        )
+        return cur.fetchone()[0]
+    def aggregate(self, width, start=None, end=None, host=None, stats=None):
+        # one row per `width` second bucket with "{field}_{stat}" columns,
+        # matching the layout of the rollup tiers
+        if stats is None:
+            stats = [stat for stat, func in AGGREGATES]
+        funcs = dict(AGGREGATES)
+        for stat in stats:
+            if stat not in funcs:
+                raise ValueError('Unknown aggregate: {}'.format(stat))
+        fields = self.fields or []
+        out_fields, exprs = [], []
+        for name in fields:
+            for stat in stats:
+                out_fields.append('{}_{}'.format(name, stat))
+                exprs.append('{}({})'.format(funcs[stat], _quote(name)))
+        if not len(fields):
+            return LogTable.empty(out_fields)
+        self._check_host(host)
+        where, params = self._build_where(start, end, host)
+        cur = self.conn.execute(
+            'SELECT ts / ? * ? AS bucket{} FROM samples{} GROUP BY bucket ORDER BY bucket'.format(
+                ''.join(', {}'.format(expr) for expr in exprs), where,
+            ),
+            [int(width), int(width)] + params,
+        )
+        rows = cur.fetchall()
+        if not len(rows):
+            return LogTable.empty(out_fields)
+        return self._build_table(rows, out_fields)
+    def get_mean_table(self, width, start=None, end=None, host=None):
+        table = self.aggregate(width, start, end, host, stats=['mean'])
+        columns = {name:table['{}_mean'.format(name)] for name in self.fields}
+        return LogTable(table.timestamps, columns, self.fields)
+
+def iter_tables(filename, start=None, end=None, chunk_rows=None, host=None):
+    with SQLiteLog(filename) as db:
+        for table in db.iter_tables(start, end, host, chunk_rows):
+            yield table
+
+def read_table(filename, start=None, end=None, host=None):
+    with SQLiteLog(filename) as db:
+        return db.read_table(start, end, host)
+
+def append_table(filename, table, host=None):
+    with SQLiteLog(filename) as db:
+        db.append_table(table, host)
+
+def aggregate(filename, width, start=None, end=None, host=None, stats=None):
+    with SQLiteLog(filename) as db:
+        return db.aggregate(width, start, end, host, stats)
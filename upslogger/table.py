@@ -0,0 +1,109 @@
+import numpy as np
+
+class LogTable(object):
+    # timestamps are int64 POSIX seconds (UTC), all other fields are
+    # floating point (float64 unless given otherwise) with NaN for
+    # missing ('-') values
+    def __init__(self, timestamps, columns, fields=None):
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        if fields is None:
+            fields = list(columns.keys())
+        self.fields = list(fields)
+        self.columns = {}
+        for name in self.fields:
+            col = np.asarray(columns[name])
+            if col.dtype.kind != 'f':
+                col = col.astype(np.float64)
+            self.columns[name] = col
+    @classmethod
+    def empty(cls, fields):
+        columns = {name:np.empty(0, dtype=np.float64) for name in fields}
+        return cls(np.empty(0, dtype=np.int64), columns, fields)
+    @classmethod
+    def concat(cls, tables, fields=None):
+        tables = [t for t in tables if t is not None]
+        if fields is None:
+            if not len(tables):
+                return None
+            fields = tables[0].fields
+        if not len(tables):
+            return cls.empty(fields)
+        timestamps = np.concatenate([t.timestamps for t in tables])
+        columns = {}
+        for name in fields:
+            columns[name] = np.concatenate([t.get_column(name) for t in tables])
+        return cls(timestamps, columns, fields)
+    def __len__(self):
+        return self.timestamps.size
+    def __getitem__(self, key):
+        if key == 'DATE':
+            return self.timestamps
+        return self.columns[key]
+    def __contains__(self, key):
+        return key == 'DATE' or key in self.columns
+    def get_column(self, name):
+        if name in self.columns:
+            return self.columns[name]
+        return np.full(len(self), np.nan)
+    @property
+    def dates(self):
+        return self.timestamps.astype('datetime64[s]')
+    def get_series(self, name):
+        y = self.get_column(name)
+        mask = ~np.isnan(y)
+        return self.timestamps[mask], y[mask]
+    def slice_time(self, start=None, end=None):
+        i0, i1 = 0, len(self)
+        if start is not None:
+            i0 = np.searchsorted(self.timestamps, start, side='left')
+        if end is not None:
+            i1 = np.searchsorted(self.timestamps, end, side='right')
+        return self.take(slice(i0, i1))
+    def take(self, index):
+        columns = {name:col[index] for name, col in self.columns.items()}
+        return LogTable(self.timestamps[index], columns, self.fields)
+    def __repr__(self):
+        return '<LogTable: {} rows, fields={}>'.format(len(self), self.fields)
+
+class LogTableBuilder(object):
+    # single rows collect in lists and whole arrays as numpy chunks,
+    # build() joins everything with one np.concatenate per column
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self._num_rows = 0
+        self._ts_chunks = []
+        self._col_chunks = [[] for _ in self.fields]
+        self._ts_rows = []
+        self._col_rows = [[] for _ in self.fields]
+    def __len__(self):
+        return self._num_rows
+    def append(self, ts, values):
+        self._ts_rows.append(ts)
+        for rows, value in zip(self._col_rows, values):
+            rows.append(value)
+        self._num_rows += 1
+    def _flush_rows(self):
+        if not len(self._ts_rows):
+            return
+        self._ts_chunks.append(np.array(self._ts_rows, dtype=np.int64))
+        for chunks, rows in zip(self._col_chunks, self._col_rows):
+            chunks.append(np.array(rows, dtype=np.float64))
+        self._ts_rows = []
+        self._col_rows = [[] for _ in self.fields]
+    def extend(self, timestamps, columns):
+        # appended rows go first, so the order is kept
+        self._flush_rows()
+        timestamps = np.array(timestamps, dtype=np.int64)
+        self._ts_chunks.append(timestamps)
+        for chunks, values in zip(self._col_chunks, columns):
+            chunks.append(np.array(values, dtype=np.float64))
+        self._num_rows += timestamps.size
+    def build(self):
+        self._flush_rows()
+        if not len(self._ts_chunks):
+            return LogTable.empty(self.fields)
+        timestamps = np.concatenate(self._ts_chunks)
+        columns = {}
+        for name, chunks in zip(self.fields, self._col_chunks):
+            columns[name] = np.concatenate(chunks)
+        return LogTable(timestamps, columns, self.fields)
@@ -0,0 +1,105 @@
+import os
+import json
+
+from upslogger import logger
+from upslogger.logger import LogLineParser
+
+class LogTail(object):
+    read_size = 1024 * 1024
+    def __init__(self, filename=None, cursor_filename=None):
+        if not filename:
+            filename = logger.LOG_FILENAME
+        self.filename = os.path.expanduser(filename)
+        if cursor_filename is not None:
+            cursor_filename = os.path.expanduser(cursor_filename)
+        self.cursor_filename = cursor_filename
+        self.reset()
+        if self.cursor_filename is not None:
+            self.load_cursor()
+    def reset(self):
+        self.offset = 0
+        self.inode = None
+        self.fields = None
+        self.parser = None
+    def _set_fields(self, fields):
+        self.fields = fields
+        self.parser = LogLineParser(fields)
+    def get_cursor(self):
+        return {
+            'filename':self.filename,
+            'offset':self.offset,
+            'inode':self.inode,
+            'fields':self.fields,
+        }
+    def set_cursor(self, cursor):
+        self.reset()
+        if cursor.get('filename', self.filename) != self.filename:
+            return
+        self.offset = cursor['offset']
+        self.inode = cursor['inode']
+        if cursor.get('fields') is not None:
+            self._set_fields(cursor['fields'])
+    def load_cursor(self):
+        if not os.path.exists(self.cursor_filename):
+            return
+        with open(self.cursor_filename, 'r') as f:
+            self.set_cursor(json.loads(f.read()))
+    def save_cursor(self):
+        tmp_fn = '{}.tmp'.format(self.cursor_filename)
+        with open(tmp_fn, 'w') as f:
+            f.write(json.dumps(self.get_cursor()))
+        os.rename(tmp_fn, self.cursor_filename)
+    def seek_end(self):
+        self.reset()
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return
+        self.inode = st.st_ino
+        self._set_fields(logger.read_header(self.filename))
+        self.offset = st.st_size
+    def check_rotated(self, st):
+        if self.inode is not None and st.st_ino != self.inode:
+            return True
+        return st.st_size < self.offset
+    def read(self):
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return None
+        if self.check_rotated(st):
+            self.reset()
+        self.inode = st.st_ino
+        if self.parser is None and self.offset > 0:
+            # cursor without header info, re-read from the beginning
+            self.offset = 0
+        with open(self.filename, 'rb') as f:
+            f.seek(self.offset)
+            remainder = b''
+            while True:
+                data = f.read(self.read_size)
+                if not data:
+                    break
+                data = remainder + data
+                lines = data.split(b'\n')
+                remainder = lines.pop()
+                self._parse_lines(lines)
+                self.offset += len(data) - len(remainder)
+        # a partial final line stays unread until its newline is written
+        if self.parser is None:
+            table = LogLineParser().build()
+        else:
+            table = self.parser.build()
+        if self.cursor_filename is not None:
+            self.save_cursor()
+        return table
+    def _parse_lines(self, lines):
+        if not len(lines):
+            return
+        lines = [line.decode('UTF-8') for line in lines]
+        if self.parser is None:
+            fields = LogLineParser.parse_header(lines[0])
+            self._set_fields(fields)
+            if fields is not None:
+                lines = lines[1:]
+        self.parser.parse_lines(lines)
@@ -1,6 +1,8 @@
 import datetime
+import calendar
 import pytz
 import tzlocal
+import numpy as np
 
 DT_FMT = '%Y-%m-%d %H:%M:%S %z'
 UTC = utc = pytz.utc
@@ -38,7 +40,7 @@ def now(tz=None):
     dt = make_aware(dt, UTC)
     return as_timezone(dt, tz)
 
-def parse_dt_str(dt_str, tz=None):
+def _parse_dt_str_utc(dt_str):
     if 'Z' in dt_str:
         dt_str = ' '.join(dt_str.split('Z'))
     dt_l = dt_str.split(' ')
@@ -51,6 +53,125 @@ def parse_dt_str(dt_str, tz=None):
             dt += offset
         else:
             dt -= offset
+    return dt
+
+def parse_dt_str(dt_str, tz=None):
+    return from_timestamp(dt_str_to_timestamp(dt_str), tz)
+
+def dt_str_to_timestamp(dt_str):
+    # fast path for the fixed DT_FMT layout: "YYYY-MM-DD HH:MM:SS +HHMM"
+    if len(dt_str) == 25 and dt_str[10] == ' ' and dt_str[19] in ' Z':
+        try:
+            day_ts = _DAY_CACHE[dt_str[:10]]
+        except KeyError:
+            day_ts = _parse_day(dt_str[:10])
+        try:
+            offset = _OFFSET_CACHE[dt_str[20:]]
+        except KeyError:
+            offset = _parse_offset(dt_str[20:])
+        hms = dt_str[11:13] + dt_str[14:16] + dt_str[17:19]
+        if day_ts is not None and offset is not None and \
+                dt_str[13] == ':' and dt_str[16] == ':' and _is_digits(hms):
+            h, m, sec = int(hms[:2]), int(hms[2:4]), int(hms[4:])
+            if h < 24 and m < 60 and sec < 60:
+                return day_ts + h * 3600 + m * 60 + sec - offset
+    dt = _parse_dt_str_utc(dt_str)
+    return calendar.timegm(dt.timetuple())
+
+_DAY_CACHE = {}
+_OFFSET_CACHE = {}
+_CACHE_MAX = 4096
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+def _is_digits(s):
+    # ASCII only, int() would also take signs, spaces and other digits
+    return len(s) > 0 and all('0' <= c <= '9' for c in s)
+
+def _parse_day(s):
+    if s[4] != '-' or s[7] != '-' or not _is_digits(s[:4] + s[5:7] + s[8:10]):
+        return None
+    try:
+        d = datetime.date(int(s[:4]), int(s[5:7]), int(s[8:10]))
+    except ValueError:
+        return None
+    if len(_DAY_CACHE) >= _CACHE_MAX:
+        _DAY_CACHE.clear()
+    day_ts = _DAY_CACHE[s] = (d.toordinal() - _EPOCH_ORDINAL) * 86400
+    return day_ts
+
+def _parse_offset(s):
+    if s[0] not in '+-' or not _is_digits(s[1:]):
+        return None
+    offset = int(s[1:3]) * 3600 + int(s[3:5]) * 60
+    if s[0] == '-':
+        offset = -offset
+    if len(_OFFSET_CACHE) >= _CACHE_MAX:
+        _OFFSET_CACHE.clear()
+    _OFFSET_CACHE[s] = offset
+    return offset
+
+INVALID_TIMESTAMP = np.iinfo(np.int64).min
+
+_DIGIT_POS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18, 21, 22, 23, 24]
+
+def _days_from_civil(y, m, d):
+    # proleptic Gregorian date to days since 1970-01-01
+    y = y - (m <= 2)
+    era = np.floor_divide(y, 400)
+    yoe = y - era * 400
+    mp = (m + 9) % 12
+    doy = (153 * mp + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+def dt_strs_to_timestamps(dt_strs):
+    # vectorized dt_str_to_timestamp, unparseable entries are INVALID_TIMESTAMP
+    num = len(dt_strs)
+    result = np.full(num, INVALID_TIMESTAMP, dtype=np.int64)
+    if not num:
+        return result
+    ok = np.zeros(num, dtype=bool)
+    try:
+        b = np.asarray(dt_strs, dtype='S25')
+        b_full = np.asarray(dt_strs, dtype='S26')
+    except UnicodeEncodeError:
+        b = None
+    if b is not None:
+        m = b.view(np.uint8).reshape(num, 25).astype(np.int64)
+        ok = (b_full == b) & (np.char.str_len(b) == 25)
+        ok &= (m[:, 4] == 45) & (m[:, 7] == 45)
+        ok &= (m[:, 10] == 32) & (m[:, 13] == 58) & (m[:, 16] == 58)
+        ok &= (m[:, 19] == 32) | (m[:, 19] == 90)
+        ok &= (m[:, 20] == 43) | (m[:, 20] == 45)
+        digits = m[:, _DIGIT_POS] - 48
+        ok &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+        digits = np.where(ok[:, np.newaxis], digits, 0)
+        year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+        month = digits[:, 4] * 10 + digits[:, 5]
+        day = digits[:, 6] * 10 + digits[:, 7]
+        hour = digits[:, 8] * 10 + digits[:, 9]
+        minute = digits[:, 10] * 10 + digits[:, 11]
+        sec = digits[:, 12] * 10 + digits[:, 13]
+        offset = (digits[:, 14] * 10 + digits[:, 15]) * 3600 + (digits[:, 16] * 10 + digits[:, 17]) * 60
+        offset = np.where(m[:, 20] == 45, -offset, offset)
+        ok &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+        ok &= (hour < 24) & (minute < 60) & (sec < 60)
+        month = np.where(ok, month, 1)
+        days = _days_from_civil(year, month, day)
+        next_month = np.where(month == 12, 1, month + 1)
+        month_len = _days_from_civil(year + (month == 12), next_month, 1) - days + day - 1
+        ok &= day <= month_len
+        ts = days * 86400 + hour * 3600 + minute * 60 + sec - offset
+        result[ok] = ts[ok]
+    for i in np.flatnonzero(~ok).tolist():
+        try:
+            result[i] = dt_str_to_timestamp(dt_strs[i])
+        except (ValueError, IndexError):
+            pass
+    return result
+
+def from_timestamp(ts, tz=None):
+    dt = datetime.datetime.utcfromtimestamp(ts)
     dt = make_aware(dt, UTC)
     return as_timezone(dt, tz)
 
@@ -0,0 +1,152 @@
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# wd, mask, cookie, len
+_EVENT_STRUCT = struct.Struct('iIII')
+
+_LIBC = None
+
+def _get_libc():
+    global _LIBC
+    if _LIBC is None:
+        _LIBC = False
+        if sys.platform.startswith('linux'):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                libc.inotify_init1
+                libc.inotify_add_watch
+            except (OSError, AttributeError):
+                pass
+            else:
+                _LIBC = libc
+    return _LIBC
+
+def inotify_available():
+    return _get_libc() is not False
+
+class FileWatcher(object):
+    # Waits for changes to a single file. The parent directory is watched
+    # with inotify so rotation/re-creation is seen as well. Without inotify
+    # the file's stat() is polled every `poll_interval` seconds
+    read_size = 4096
+    def __init__(self, filename, poll_interval=1., use_inotify=True):
+        self.filename = os.path.abspath(os.path.expanduser(filename))
+        self.dirname, self.basename = os.path.split(self.filename)
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.fd = None
+        self.mode = None
+        self.last_stat = None
+    def open(self):
+        if self.mode is not None:
+            return
+        self.last_stat = self._get_stat()
+        if self.use_inotify and inotify_available():
+            try:
+                self._open_inotify()
+            except OSError:
+                self.close()
+            else:
+                self.mode = 'inotify'
+                return
+        self.mode = 'poll'
+    def _open_inotify(self):
+        libc = _get_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        self.fd = fd
+        path = self.dirname
+        if not isinstance(path, bytes):
+            path = path.encode(sys.getfilesystemencoding())
+        wd = libc.inotify_add_watch(fd, path, WATCH_MASK)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.mode = None
+    def _get_stat(self):
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime)
+    def _read_events(self):
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, self.read_size)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if not data:
+                break
+            offset = 0
+            while offset + _EVENT_STRUCT.size <= len(data):
+                wd, mask, cookie, name_len = _EVENT_STRUCT.unpack_from(data, offset)
+                offset += _EVENT_STRUCT.size
+                name = data[offset:offset + name_len].rstrip(b'\x00')
+                offset += name_len
+                if mask & IN_Q_OVERFLOW:
+                    changed = True
+                elif name.decode(sys.getfilesystemencoding()) == self.basename:
+                    changed = True
+        return changed
+    def wait(self, timeout=None):
+        # True if the file changed before `timeout` seconds passed
+        self.open()
+        if self.mode == 'inotify':
+            return self._wait_inotify(timeout)
+        return self._wait_poll(timeout)
+    def _wait_inotify(self, timeout):
+        end_ts = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = None if end_ts is None else max(end_ts - time.time(), 0)
+            r, w, x = select.select([self.fd], [], [], remaining)
+            if r and self._read_events():
+                self.last_stat = self._get_stat()
+                return True
+            if end_ts is not None and time.time() >= end_ts:
+                return False
+    def _wait_poll(self, timeout):
+        end_ts = None if timeout is None else time.time() + timeout
+        while True:
+            st = self._get_stat()
+            if st != self.last_stat:
+                self.last_stat = st
+                return True
+            if end_ts is None:
+                delay = self.poll_interval
+            else:
+                delay = min(self.poll_interval, end_ts - time.time())
+                if delay <= 0:
+                    return False
+            time.sleep(delay)
+    def __enter__(self):
+        self.open()
+        return self
+    def __exit__(self, *args):
+        self.close()
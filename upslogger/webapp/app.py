@@ -12,26 +12,38 @@ from bokeh.models import ColumnDataSource, HoverTool, Button, CustomJS, Range1d
 from bokeh.models.widgets import DateRangeSlider
 from bokeh.plotting import figure, curdoc
 
-from upslogger.logger import parse_logfile
+from upslogger.datacache import get_shared_cache
+from upslogger.rollup import RollupSet
+from upslogger.downsample import downsample_table
 from upslogger import timezone
 
 
-def get_data():
-    key_map = {'LINEV':'line_voltage', 'LINEFREQ':'frequency'}
-    parsed = parse_logfile()
-    data = {}
-    for d in parsed:
-        x = timezone.as_timezone(d['DATE'].value, 'UTC')
-        ts = timezone.to_timestamp(x)
-        x = x.replace(tzinfo=None)
-        if ts not in data:
-            data[ts] = {'date':x}
-        for parse_key, data_key in key_map.items():
-            value = d.get(parse_key)
-            if value is not None:
-                value = value.value
-            data[ts][data_key] = value
-    return data
+KEY_MAP = {'LINEV':'line_voltage', 'LINEFREQ':'frequency'}
+
+# about the plot width in pixels, each point pair is a min/max
+VIEWPORT_POINTS = 1600
+DOWNSAMPLE_METHOD = 'minmax'
+RANGE_UPDATE_DELAY = 200
+# the log is watched for changes, this is only the polling fallback
+UPDATE_INTERVAL = 1000
+
+# one cache per server process, each session only keeps a cursor into it
+data_cache = get_shared_cache(refresh_interval=UPDATE_INTERVAL / 1000.)
+rollups = RollupSet()
+
+view_state = {
+    'start':None, 'end':None, 'last_ts':None, 'follow':True, 'pending':None,
+    'cursor':None, 'streamed':0, 'setting_range':False,
+}
+
+def get_view_data(start, end):
+    if data_cache.num_rows:
+        table = data_cache.get_table(start, end)
+    else:
+        # the coarsest rollup tier with enough points for the window
+        rollups.load_state()
+        tier_name, table = rollups.read_span(start, end, VIEWPORT_POINTS)
+    return downsample_table(table, VIEWPORT_POINTS, DOWNSAMPLE_METHOD, start, end)
 
 data_src = ColumnDataSource(
     data={
@@ -43,21 +55,69 @@ data_src = ColumnDataSource(
     },
 )
 
+def table_to_source_data(table):
+    result = {
+        'timestamp':table.timestamps,
+        'date':table.dates,
+        'offset_applied':[False] * len(table),
+    }
+    for parse_key, data_key in KEY_MAP.items():
+        result[data_key] = table.get_column(parse_key)
+    return result
+
+def set_view(start, end):
+    # replaces the source with the visible window only
+    view_state['cursor'] = data_cache.get_cursor()
+    view_state['streamed'] = 0
+    table = get_view_data(start, end)
+    view_state['start'], view_state['end'] = start, end
+    last_ts = data_cache.last_ts
+    if last_ts is not None:
+        view_state['last_ts'] = last_ts
+    if table is None:
+        return
+    data_src.data = table_to_source_data(table)
+
 def update_data_src(*args):
-    data = get_data()
-    result = {'timestamp':[]}
-    timestamps = set(data.keys())
-    timestamps -= set(data_src.data['timestamp'])
-    for ts in sorted(timestamps):
-        result['timestamp'].append(ts)
-        for data_key, value in data[ts].items():
-            if data_key not in result:
-                result[data_key] = []
-            result[data_key].append(value)
-    if not len(result['timestamp']):
+    cursor, table = data_cache.get_since(view_state['cursor'])
+    if table is None:
+        # the log was rotated, start over
+        set_view(view_state['start'], view_state['end'])
+        return
+    view_state['cursor'] = cursor
+    if not len(table):
+        return
+    new_last_ts = int(table.timestamps[-1])
+    view_state['last_ts'] = new_last_ts
+    if not view_state['follow']:
         return
-    result['offset_applied'] = [False] * len(result['timestamp'])
-    data_src.stream(result)
+    # slide the window along with the new rows
+    width = view_state['end'] - view_state['start']
+    start = new_last_ts - width
+    table = table.slice_time(start, new_last_ts)
+    num_streamed = view_state['streamed'] + len(table)
+    if num_streamed > VIEWPORT_POINTS:
+        # the source holds downsampled points, so once the raw rows streamed
+        # onto it add up to a full window it's rebuilt (dropping everything
+        # that scrolled out of view)
+        set_view(start, new_last_ts)
+    else:
+        data_src.stream(table_to_source_data(table))
+        view_state['streamed'] = num_streamed
+        view_state['start'], view_state['end'] = start, new_last_ts
+    set_x_range(start, new_last_ts)
+
+def set_x_range(start, end):
+    # range changes made here aren't user pans/zooms, and setting start
+    # then end would briefly report a window ending before the data does
+    view_state['setting_range'] = True
+    try:
+        p1.x_range.update(
+            start=datetime.datetime.utcfromtimestamp(start),
+            end=datetime.datetime.utcfromtimestamp(end),
+        )
+    finally:
+        view_state['setting_range'] = False
 
 hover = HoverTool(
     tooltips=[
@@ -107,12 +167,14 @@ source_js_callback = CustomJS(args=dict(source=data_src), code="""
     for (i=0; i<source.data.date.length; i++){
         if (!source.data.offset_applied[i]){
             source.data.date[i] = source.data.date[i] - utcOffset;
+            source.data.offset_applied[i] = true;
         }
     }
     console.log(source.data);
 
 """)
 data_src.js_on_change('stream', source_js_callback)
+data_src.js_on_change('data', source_js_callback)
 
 btn = Button(label='Update')
 btn.on_click(update_data_src)
@@ -127,17 +189,61 @@ date_widget = DateRangeSlider(
 )
 
 def source_py_callback(attr, old, new):
-    if not len(data_src.data['date']):
-        return
-    min_dt = min(data_src.data['date'])
-    max_dt = max(data_src.data['date'])
-    date_widget.start = min_dt
-    date_widget.end = max_dt
-    date_widget.value = (min_dt, max_dt)
+    # the slider spans all data, not just the visible window
+    if view_state['last_ts'] is not None:
+        date_widget.end = datetime.datetime.utcfromtimestamp(view_state['last_ts'])
 
 
 data_src.on_change('data', source_py_callback)
 
+def _to_timestamp(dt):
+    if isinstance(dt, datetime.datetime):
+        return timezone.to_timestamp(timezone.make_aware(dt.replace(tzinfo=None), 'UTC'))
+    # bokeh sends datetimes as js timestamps (ms)
+    return int(dt // 1000)
+
+def apply_pending_range():
+    pending = view_state['pending']
+    view_state['pending'] = None
+    if pending is None:
+        return
+    start, end = pending
+    last_ts = view_state['last_ts']
+    view_state['follow'] = last_ts is None or end >= last_ts
+    set_view(start, end)
+
+def range_py_callback(attr, old, new):
+    if view_state['setting_range']:
+        return
+    if p1.x_range.start is None or p1.x_range.end is None:
+        return
+    start = _to_timestamp(p1.x_range.start)
+    end = _to_timestamp(p1.x_range.end)
+    if (start, end) == (view_state['start'], view_state['end']):
+        return
+    # pan/zoom fires many events, only load the last one
+    if view_state['pending'] is None:
+        curdoc().add_timeout_callback(apply_pending_range, RANGE_UPDATE_DELAY)
+    view_state['pending'] = (start, end)
+
+p1.x_range.on_change('start', range_py_callback)
+p1.x_range.on_change('end', range_py_callback)
+
+set_view(*[_to_timestamp(dt) for dt in DT_RANGE])
+
+doc = curdoc()
+
+def on_cache_update():
+    # called from the cache's watcher thread, the update itself has to run
+    # on the session's own loop
+    doc.add_next_tick_callback(update_data_src)
+
+def on_session_destroyed(session_context):
+    data_cache.remove_listener(on_cache_update)
+
+data_cache.add_listener(on_cache_update)
+doc.on_session_destroyed(on_session_destroyed)
+
 # date_widget_js_callback = CustomJS(code="""
 #     var d0 = new Date(cb_obj.value[0]),
 #         d1 = new Date(cb_obj.value[1]);